@@ -1,4 +1,5 @@
 # Standard library imports
+import importlib
 import logging
 import os
 
@@ -6,18 +7,19 @@ import os
 import dash
 import dash_bootstrap_components as dbc
 from flask_caching import Cache
-import plotly.io as pio
 
 # Local application imports
-from modules.gitlab import GitLab
+from modules.cache import get_redis
+from modules.gitlab import get_client, instances
+from modules import compression, lazy, metrics, profiling, publisher, retention
 import settings
 
 # Initialize logging mechanism
 logging.basicConfig(level=settings.LOGLEVEL, format=settings.LOGFORMAT)
 logger = logging.getLogger(__name__)
 
-gl = GitLab()
-logger.info("Current GitLab version: {}".format(GitLab.version))
+for instance in instances():
+  logger.info("Current GitLab version ({}): {}".format(instance, get_client(instance).version))
 
 # App instance
 app = dash.Dash(__name__,   
@@ -38,11 +40,43 @@ app.title = settings.APP_NAME
 # }
 CACHE_CONFIG = {
     # try 'filesystem' if you don't want to setup redis
-    'CACHE_TYPE': 'redis',
-    'CACHE_REDIS_URL': settings.REDIS_URL,
+    'CACHE_TYPE': settings.CACHE_TYPE,
     'CACHE_THRESHOLD': 200
 }
+if settings.CACHE_TYPE == 'redis':
+  # Share the process wide connection pool with the chunked dataset cache
+  CACHE_CONFIG['CACHE_REDIS_HOST'] = get_redis()
+elif settings.CACHE_TYPE in ('SimpleCache', 'simple'):
+  # The threshold counts entries, the in-process cache is bounded by bytes as well
+  CACHE_CONFIG['CACHE_TYPE'] = 'modules.cache.SizedCache'
+  CACHE_CONFIG['CACHE_MAX_BYTES'] = settings.CACHE_MAX_BYTES
 cache = Cache()
 cache.init_app(app.server, config=CACHE_CONFIG)
 
-pio.templates.default = "plotly_dark"
\ No newline at end of file
+# Response compression, registered first to run after the metrics and profiling handlers
+compression.init_app(app.server)
+
+# App metrics
+metrics.init_app(app.server)
+profiling.init_app(app)
+# Static snapshots of the monitor and overview
+publisher.init_app(app.server, cache, stylesheets=app.config.external_stylesheets + [app.get_asset_url('styles/01_overrides.css')])
+# Memory accounting per project and resource
+retention.init_app(app.server, cache)
+
+def __plotly_setup(go):
+  lazy.load('plotly.io').templates.default = "plotly_dark"
+
+# plotly is only imported with the first figure, other threads wait for the setup to finish
+lazy.when_imported('plotly.graph_objects', __plotly_setup)
+
+# Dash serializes every response through plotly, which imports orjson (if installed) on first use without a lock,
+# concurrent first requests of a worker saw it partially initialized. orjson itself imports numpy the first time it
+# meets a type it doesn't know, which every layout has, and crashed on a numpy another thread was still importing.
+# Layouts are served before any figure is built, so both are imported with the app
+try:
+  importlib.import_module('orjson')
+except ImportError:
+  pass
+else:
+  lazy.load('numpy')
\ No newline at end of file
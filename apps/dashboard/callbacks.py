@@ -7,39 +7,41 @@ import logging
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from dash import html
-import dash_bootstrap_components as dbc
-import numpy as np
-import pandas as pd
-from pandas import json_normalize
-import plotly.graph_objects as go
+from dash import callback_context, html
 
 # Local application imports
 from app import app
-from modules.gitlab import GitLab
+from modules.gitlab import get_client
+from modules.lazy import lazy_import
+from modules import profiling, projects, regressions, timeseries
 import settings
 from . import layouts, signals
 
 logger = logging.getLogger(__name__)
 
-projects = settings.GITLAB_PROJECT_IDS['projects'] if 'projects' in settings.GITLAB_PROJECT_IDS else None
-if projects is None:
-  raise Exception("No GitLab projects available")
+# Analytics dependencies are imported on first use
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+
+gl = get_client()
 
-gl = GitLab()
+@profiling.timed('to_datetime')
+def to_utc_datetime(series):
+  return pd.to_datetime(pd.to_datetime(series), utc=True)
 
-def normalize_data(data, project_id = None, prevent_update = False):
+@profiling.timed('normalize')
+def normalize_data(data, project = None, prevent_update = False):
   if data is None or len(data) == 0:
     if prevent_update: raise PreventUpdate
     return []
   
-  df = json_normalize(data)
+  df = pd.json_normalize(data)
   
-  if project_id is not None:
+  if project is not None:
     if 'project_id' not in df:
       if prevent_update: raise PreventUpdate
       return None
-    df = df[df['project_id'] == project_id].copy()
+    df = df[signals.project_keys(df) == project].copy()
     if len(df) == 0:
       if prevent_update: raise PreventUpdate
       return None
@@ -48,8 +50,22 @@ def normalize_data(data, project_id = None, prevent_update = False):
 def register_callbacks():
   """Register application callbacks"""
   __register_group_callbacks()
-  [__register_project_callbacks(project['id'], project['ref_name'] if 'ref_name' in project else 'master')
-  for project in projects]
+  __register_navigation_callbacks()
+  __register_project_callbacks()
+
+def __active_project(active_tab):
+  """Project key of the selected tab ('tab-<key>')"""
+  if active_tab is None or not active_tab.startswith('tab-'):
+    return None
+  return active_tab[len('tab-'):]
+
+def __figure_range(graph_id, times, relayout):
+  """Visible x range of a time-series graph, all of times unless the selected project was zoomed into"""
+  triggered = set(trigger['prop_id'] for trigger in callback_context.triggered)
+  if triggered == {'{}.relayoutData'.format(graph_id)} and not timeseries.changes_range(relayout):
+    raise PreventUpdate
+  zoomed = None if 'project-tabs.active_tab' in triggered else timeseries.visible_range(relayout)
+  return zoomed or (times.min(), times.max())
 
 def __register_group_callbacks():
   """Register group specific callbacks"""
@@ -59,6 +75,7 @@ def __register_group_callbacks():
     Output('graph_group_velocity', 'figure'),
     [Input('memory-milestones', 'modified_timestamp')],
     [State('memory-milestones', 'data')])
+  @profiling.timed('figure')
   def __render_velocity(ts, data):
     if ts is None:
       raise PreventUpdate
@@ -102,17 +119,15 @@ def __register_group_callbacks():
     Output('graph_group_issues', 'figure'),
     [Input('memory-milestones', 'modified_timestamp')],
     [State('memory-milestones', 'data')])
+  @profiling.timed('figure')
   def __render_issues(ts, data):
     if ts is None:
       raise PreventUpdate
     milestones = normalize_data(data, prevent_update=True)
 
-    milestones['issue_created'] = pd.to_datetime(milestones['created_at'])
-    milestones['issue_created'] = pd.to_datetime(milestones['issue_created'], utc=True)
-    milestones['issue_updated'] = pd.to_datetime(milestones['updated_at'])
-    milestones['issue_updated'] = pd.to_datetime(milestones['issue_updated'], utc=True)
-    milestones['milestone.started'] = pd.to_datetime(milestones['milestone.start_date'])
-    milestones['milestone.started'] = pd.to_datetime(milestones['milestone.started'], utc=True)
+    milestones['issue_created'] = to_utc_datetime(milestones['created_at'])
+    milestones['issue_updated'] = to_utc_datetime(milestones['updated_at'])
+    milestones['milestone.started'] = to_utc_datetime(milestones['milestone.start_date'])
 
     # Show created issues by milestone
     mask = milestones['issue_created'] > milestones['milestone.started']
@@ -168,56 +183,128 @@ def __register_group_callbacks():
         yaxis_title = 'Count'
       ))
 
-def __register_project_callbacks(project_id, ref_name):
-  """Register project specific callbacks"""
-  logger.info('Register dashboard project ({}) callbacks'.format(project_id))
+  @app.callback(
+    Output('graph_group_burndown', 'figure'),
+    [Input('memory-milestones', 'modified_timestamp')])
+  @profiling.timed('figure')
+  def __render_burndown(ts):
+    if ts is None:
+      raise PreventUpdate
+    sprint = signals.get_burndown()
+    if sprint is None:
+      return layouts.render_empty_plot_layout("Burndown", 450)
+    series = sprint.series()
+    # Sprints without estimates burn down issues
+    unit = 'weight' if any(series['scope_weight']) else 'issues'
+
+    return go.Figure(
+      data=[
+        go.Scatter(
+          name='Scope',
+          x=series['dates'],
+          y=series['scope_{}'.format(unit)],
+          mode='lines',
+          line_shape='hv',
+          line_color='rgb(168, 216, 234)'),
+        go.Scatter(
+          name='Done',
+          x=series['dates'],
+          y=series['done_{}'.format(unit)],
+          mode='lines',
+          line_shape='hv',
+          line_color='rgb(95, 122, 209)'),
+        go.Scatter(
+          name='Remaining',
+          x=series['dates'],
+          y=series['remaining_{}'.format(unit)],
+          mode='lines+markers',
+          line_color='rgb(227, 120, 104)'),
+        go.Scatter(
+          name='Ideal',
+          x=series['dates'],
+          y=series['ideal_{}'.format(unit)],
+          mode='lines',
+          line_dash='dot',
+          line_color='rgb(150, 150, 150)')
+      ],
+      layout=go.Layout(
+        title=go.layout.Title(text="Burndown ({})".format(sprint.milestone['title'])),
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        yaxis_title='Weights' if unit == 'weight' else 'Count'
+      ))
+
+def __register_navigation_callbacks():
+  """Register the project page and tab callbacks"""
+  logger.info('Register dashboard navigation callbacks')
+
+  @app.callback(
+    [Output('project-tabs', 'children'),
+     Output('project-tabs', 'active_tab'),
+     Output('project-page', 'max_value')],
+    [Input('project-page', 'active_page'),
+     Input('session-update-hourly', 'n_intervals')],
+    [State('project-tabs', 'active_tab')])
+  def __render_project_tabs(page, n, active_tab):
+    # Only the projects of the current page get a tab, discovered projects show up on refresh
+    page_projects = projects.get_page(page)
+    tabs = layouts.render_project_tabs(page_projects)
+    tab_ids = [tab.tab_id for tab in tabs]
+    if active_tab not in tab_ids:
+      active_tab = tab_ids[0] if len(tab_ids) > 0 else None
+    return tabs, active_tab, projects.page_count()
+
+def __register_project_callbacks():
+  """Register callbacks of the selected project"""
+  logger.info('Register dashboard project callbacks')
 
   ###############################################################
   ## Deployments
 
   @app.callback(
-    [Output('project-{}-deployments'.format(project_id), 'figure'),
-     Output('project-{}-deployments-details'.format(project_id), 'children')],
-    [Input('memory-deployments', 'modified_timestamp')],
+    [Output('project-deployments', 'figure'),
+     Output('project-deployments-details', 'children')],
+    [Input('memory-deployments', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab'),
+     Input('project-deployments', 'relayoutData')],
     [State('memory-deployments', 'data')])
-  def __render_deployments(ts, data):
-    if ts is None:
+  @profiling.timed('figure')
+  def __render_deployments(ts, active_tab, relayout, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
     if df is None or len(df) == 0:
       return layouts.render_empty_plot_layout("Deployments by date", 400), []
     
-    df['date'] =  pd.to_datetime(df['created_at'])
-    df['date'] =  pd.to_datetime(df['date'], utc=True)
-    df['deployment_date'] = df['date'].dt.date
+    df['date'] = to_utc_datetime(df['created_at'])
+    start, end = __figure_range('project-deployments', df['date'], relayout)
 
     # Drop unnecessary columns
-    df = df[['id', 'deployment_date', 'status', 'environment.name']]
+    df = df[['id', 'date', 'status', 'environment.name']]
 
-    # Show only successful deployments
+    # Deployments per bucket of the visible range
     staging_deployments = df.query('`environment.name`=="staging"')
-    staging_deployments_by_day = staging_deployments.groupby('deployment_date')[['id']].count()
-    staging_deployments_by_day = staging_deployments_by_day.rename(columns = {'id': 'deployment_count'})
+    staging_x, staging_y = timeseries.series(staging_deployments['date'], start=start, end=end)
 
     production_deployments = df.query('`environment.name`=="production"')
-    production_deployments_by_day = production_deployments.groupby('deployment_date')[['id']].count()
-    production_deployments_by_day = production_deployments_by_day.rename(columns = {'id': 'deployment_count'})
+    production_x, production_y = timeseries.series(production_deployments['date'], start=start, end=end)
 
     fig = go.Figure(
       data=[
-        go.Scatter(
+        timeseries.scatter(
           name='Staging',
-          x=staging_deployments_by_day.index, 
-          y=staging_deployments_by_day.deployment_count,
+          x=staging_x,
+          y=staging_y,
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
           fillcolor = 'rgba(168, 216, 234, 0.5)',
         ),
-        go.Scatter(
+        timeseries.scatter(
           name='Production',
-          x=production_deployments_by_day.index, 
-          y=production_deployments_by_day.deployment_count,
+          x=production_x,
+          y=production_y,
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
@@ -229,9 +316,11 @@ def __register_project_callbacks(project_id, ref_name):
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
         yaxis_title='Deployments',
-        height=400
+        height=400,
+        # Keeps the zoom of the project while its data is refreshed
+        uirevision=active_tab
       ))
-    
+
     details = html.Span([
       dbc.Button(
         ["Staging", dbc.Badge(len(staging_deployments), color="light", className="ml-1")],
@@ -247,31 +336,31 @@ def __register_project_callbacks(project_id, ref_name):
   ## Commits
 
   @app.callback(
-    Output('project-{}-commits'.format(project_id), 'figure'),
-    [Input('memory-commits', 'modified_timestamp')],
+    Output('project-commits', 'figure'),
+    [Input('memory-commits', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab'),
+     Input('project-commits', 'relayoutData')],
     [State('memory-commits', 'data')])
-  def __render_commits(ts, data):
-    if ts is None:
+  @profiling.timed('figure')
+  def __render_commits(ts, active_tab, relayout, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
     if df is None or len(df) == 0:
       return layouts.render_empty_plot_layout("Commits by date", 400)
 
-    df['date'] = pd.to_datetime(df['created_at'])
-    df['date'] = pd.to_datetime(df['date'], utc=True)
-    df['commit_date'] = df['date'].dt.date
-
-    # Drop unnecessary columns
-    df = df[['short_id', 'author_name', 'commit_date']]
+    df['date'] = to_utc_datetime(df['created_at'])
+    start, end = __figure_range('project-commits', df['date'], relayout)
 
-    commits_by_day = df.groupby('commit_date')[['short_id']].count()
-    commits_by_day = commits_by_day.rename(columns = {'short_id': 'commit_count'})
+    # Commits per bucket of the visible range
+    commits_x, commits_y = timeseries.series(df['date'], start=start, end=end)
 
     return go.Figure(
-      data=[go.Scatter(
-        x=commits_by_day.index, 
-        y=commits_by_day.commit_count, 
-        text=commits_by_day.commit_count,
+      data=[timeseries.scatter(
+        x=commits_x,
+        y=commits_y,
+        text=commits_y,
         mode='none',
         line_shape='spline',
         fill='tozeroy',
@@ -282,25 +371,28 @@ def __register_project_callbacks(project_id, ref_name):
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
         yaxis_title = 'Commits',
-        height=400
+        height=400,
+        uirevision=active_tab
       ))
 
   ###############################################################
   ## Pipelines
 
   @app.callback(
-    Output('project-{}-pipelines'.format(project_id), 'figure'),
-    [Input('memory-pipelines', 'modified_timestamp')],
+    Output('project-pipelines', 'figure'),
+    [Input('memory-pipelines', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab')],
     [State('memory-pipelines', 'data')])
-  def __render_pipelines(ts, data):
-    if ts is None:
+  @profiling.timed('figure')
+  def __render_pipelines(ts, active_tab, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
     if df is None or len(df) == 0:
       return layouts.render_empty_plot_layout("Pipeline runs by date", 400)
 
-    df['date'] = pd.to_datetime(df['created_at'])
-    df['date'] = pd.to_datetime(df['date'], utc=True)
+    df['date'] = to_utc_datetime(df['created_at'])
     df['pipeline_date'] = df['date'].dt.date
 
     # Drop unnecessary columns
@@ -340,13 +432,15 @@ def __register_project_callbacks(project_id, ref_name):
       ))
 
   @app.callback(
-    Output('project-{}-badges'.format(project_id), 'children'),
-    [Input('memory-pipelines', 'modified_timestamp')],
+    Output('project-badges', 'children'),
+    [Input('memory-pipelines', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab')],
     [State('memory-pipelines', 'data')])
-  def __render_badges(ts, data):
-    if ts is None:
+  def __render_badges(ts, active_tab, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate    
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
 
     retval = []
     sort_by_id = []
@@ -405,30 +499,90 @@ def __register_project_callbacks(project_id, ref_name):
     return retval
 
   @app.callback(
-    Output('project-{}-coverage'.format(project_id), 'figure'),
-    [Input('memory-pipelines', 'modified_timestamp')],
+    Output('project-regressions', 'children'),
+    [Input('memory-pipelines', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab')])
+  def __render_regressions(ts, active_tab):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
+      raise PreventUpdate
+
+    # Maintained from the pipelines of every refresh, nothing is computed from the history here
+    return html.H5([
+      dbc.Badge("regression: {}".format(regressions.describe(regression)), color="danger", className="mr-1")
+      for regression in signals.get_regressions(project)])
+
+  @app.callback(
+    Output('project-dora', 'children'),
+    [Input('memory-deployments', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab')])
+  def __render_dora(ts, active_tab):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
+      raise PreventUpdate
+
+    # Delivery metrics of the last 30 days, maintained incrementally on the server
+    metrics = signals.get_dora().metrics(project, days=30)
+    def value(name, template):
+      return template.format(metrics[name]) if metrics[name] is not None else 'n/a'
+
+    return html.H5(
+      [
+        dbc.Badge("deployments: {:.2f}/day".format(metrics['deployment_frequency']), color="info", className="mr-1"),
+        dbc.Badge("lead time: {}".format(value('lead_time_hours', '{:.1f} h')), color="info", className="mr-1"),
+        dbc.Badge("change failure rate: {}".format(value('change_failure_rate', '{:.0f}%')), color="info", className="mr-1"),
+        dbc.Badge("time to restore: {}".format(value('time_to_restore_hours', '{:.1f} h')), color="info", className="mr-1")
+      ])
+
+  @app.callback(
+    Output('project-freshness', 'children'),
+    [Input('memory-freshness', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab')],
+    [State('memory-freshness', 'data')])
+  def __render_freshness(ts, active_tab, data):
+    project = __active_project(active_tab)
+    if ts is None or data is None or project is None:
+      raise PreventUpdate
+
+    markers = {dataset: data[dataset][project] for dataset in data if project in data[dataset]}
+    if len(markers) == 0:
+      return []
+
+    stale = ['{} ({})'.format(dataset, marker['status']) for dataset, marker in markers.items() if marker['status'] != 'fresh']
+    updated = [pd.to_datetime(marker['updated_at'], utc=True) for marker in markers.values() if marker['status'] == 'fresh']
+
+    text = 'updated: {}'.format(max(updated).strftime('%Y-%m-%d %H:%M UTC')) if len(updated) > 0 else 'updated: never'
+    color = 'secondary'
+    if len(stale) > 0:
+      text = '{}, incomplete: {}'.format(text, ', '.join(stale))
+      color = 'warning'
+    return html.H5(dbc.Badge(text, color=color, className="mr-1"))
+
+  @app.callback(
+    Output('project-coverage', 'figure'),
+    [Input('memory-pipelines', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab'),
+     Input('project-coverage', 'relayoutData')],
     [State('memory-pipelines', 'data')])
-  def __render_coverage(ts, data):
-    if ts is None:
+  @profiling.timed('figure')
+  def __render_coverage(ts, active_tab, relayout, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
     if df is None or len(df) == 0:
       return layouts.render_empty_plot_layout("Coverage by date", 500)
 
-    df['date'] =  pd.to_datetime(df['created_at'])
-    df['date'] =  pd.to_datetime(df['date'], utc=True)
-    df['pipeline_date'] = df['date'].dt.date
+    df['date'] = to_utc_datetime(df['created_at'])
+    start, end = __figure_range('project-coverage', df['date'], relayout)
 
-    # Drop unnecessary columns
-    df = df[['sha', 'pipeline_date', 'status', 'coverage']]
-
-    coverage_by_date = df.groupby('pipeline_date')[['coverage']].agg(np.mean)
-    coverage_by_date = coverage_by_date.rename(columns = {'coverage': 'coverage_agg'})
+    # Mean coverage per bucket of the visible range, single pipelines once zoomed in
+    coverage_x, coverage_y = timeseries.series(df['date'], pd.to_numeric(df['coverage'], errors='coerce'), start, end)
 
     return go.Figure(
-      data=[go.Scatter(
-        x=coverage_by_date.index, 
-        y=coverage_by_date.coverage_agg,
+      data=[timeseries.scatter(
+        x=coverage_x,
+        y=coverage_y,
         mode='none', # lines
         line_shape='spline',
         fill='tozeroy',
@@ -439,72 +593,65 @@ def __register_project_callbacks(project_id, ref_name):
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
         yaxis_title = 'Coverage',
-        height=500
+        height=500,
+        uirevision=active_tab
       ))
 
   @app.callback(
-    Output('project-{}-testreport'.format(project_id), 'figure'),
-    [Input('memory-pipelines', 'modified_timestamp')],
+    Output('project-testreport', 'figure'),
+    [Input('memory-pipelines', 'modified_timestamp'),
+     Input('project-tabs', 'active_tab'),
+     Input('project-testreport', 'relayoutData')],
     [State('memory-pipelines', 'data')])
-  def __render_testreport(ts, data):
-    if ts is None:
+  @profiling.timed('figure')
+  def __render_testreport(ts, active_tab, relayout, data):
+    project = __active_project(active_tab)
+    if ts is None or project is None:
       raise PreventUpdate    
-    df = normalize_data(data, project_id)
+    df = normalize_data(data, project)
     if df is None or len(df) == 0:
       return layouts.render_empty_plot_layout("Tests by date", 500)
 
-    df['date'] =  pd.to_datetime(df['created_at'])
-    df['date'] =  pd.to_datetime(df['date'], utc=True)
-    df['pipeline_date'] = df['date'].dt.date
-
-    # Drop unnecessary columns
-    df = df[['sha', 'pipeline_date', 'total_time', 'total_count', 'success_count', 'failed_count', 'skipped_count', ]]
-
-    total_by_date = df.groupby('pipeline_date')[['total_count']].agg(np.mean)
-    total_by_date = total_by_date.rename(columns = {'total_count': 'value'})
-
-    success_by_date = df.groupby('pipeline_date')[['success_count']].agg(np.mean)
-    success_by_date = success_by_date.rename(columns = {'success_count': 'value'})
+    df['date'] = to_utc_datetime(df['created_at'])
+    start, end = __figure_range('project-testreport', df['date'], relayout)
 
-    skipped_by_date = df.groupby('pipeline_date')[['skipped_count']].agg(np.mean)
-    skipped_by_date = skipped_by_date.rename(columns = {'skipped_count': 'value'})
-
-    failed_by_date = df.groupby('pipeline_date')[['failed_count']].agg(np.mean)
-    failed_by_date = failed_by_date.rename(columns = {'failed_count': 'value'})
+    # Mean test counts per bucket of the visible range, single pipelines once zoomed in
+    tests = {column: timeseries.series(df['date'], df[column], start, end)
+      for column in ['total_count', 'success_count', 'skipped_count', 'failed_count']}
 
     return go.Figure(
       data=[
-        go.Scatter(
+        timeseries.scatter(
           name='Total',
-          x=total_by_date.index, 
-          y=total_by_date.value,
+          x=tests['total_count'][0],
+          y=tests['total_count'][1],
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
           fillcolor = 'rgba(168, 216, 234, 0.5)',
         ),
-        go.Scatter(
+        timeseries.scatter(
           name='Success',
-          x=success_by_date.index, 
-          y=success_by_date.value,
+          x=tests['success_count'][0],
+          y=tests['success_count'][1],
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
           fillcolor = 'rgba(76, 175, 80, 0.5)',
         ),
-        go.Scatter(
+        timeseries.scatter(
           name='Skipped',
-          x=skipped_by_date.index, 
-          y=skipped_by_date.value,
+          x=tests['skipped_count'][0],
+          y=tests['skipped_count'][1],
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
           fillcolor = 'rgba(255, 235, 59, 0.5)',
         ),
-        go.Scatter(
+        timeseries.scatter(
           name='Failed',
-          x=failed_by_date.index, 
-          y=failed_by_date.value,
+          x=tests['failed_count'][0],
+          y=tests['failed_count'][1],
           mode='none', # lines
           line_shape='spline',
           fill='tozeroy',
@@ -516,5 +663,6 @@ def __register_project_callbacks(project_id, ref_name):
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
         yaxis_title = 'Tests',
-        height=500
+        height=500,
+        uirevision=active_tab
       ))
@@ -4,27 +4,24 @@ import uuid
 # Third party imports
 from dash import dcc, html
 import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
 
 # Local application imports
-from modules.gitlab import GitLab
+from modules.gitlab import get_client
 import settings
 
-projects = settings.GITLAB_PROJECT_IDS['projects'] if 'projects' in settings.GITLAB_PROJECT_IDS else None
-if projects is None:
-  raise Exception("No GitLab projects available")
-
-gl = GitLab()
+gl = get_client()
 group_name = gl.get_group_name(settings.GITLAB_GROUP_ID)
 
 def render_empty_plot_layout(title, height):
-  return go.Figure(layout=go.Layout(
-    title=go.layout.Title(text=title),
+  # A plain figure dict, placeholders don't need plotly imported and its template sent along
+  return dict(data=[], layout=dict(
+    title=dict(text=title, x=0.05),
+    font=dict(color='#f2f5fa'),
     paper_bgcolor='rgba(0, 0, 0, 0)',
     plot_bgcolor='rgba(0, 0, 0, 0)',
     height=height,
-    xaxis_visible=False,
-    yaxis_visible=False,
+    xaxis=dict(visible=False),
+    yaxis=dict(visible=False),
     annotations=[
       dict(
         xref='paper',
@@ -39,25 +36,29 @@ def render_empty_plot_layout(title, height):
     ]
   ))
 
-def __tab_layout(project_id):
+def __project_layout():
+  """Panel of the selected project, shared by all tabs so callbacks don't grow with the projects"""
   content = dbc.Card(dbc.CardBody([
     dbc.Row([          
-      dbc.Col(id='project-{}-badges'.format(project_id), width='auto')
+      dbc.Col(id='project-badges', width='auto'),
+      dbc.Col(id='project-regressions', width='auto'),
+      dbc.Col(id='project-dora', width='auto'),
+      dbc.Col(id='project-freshness', width='auto')
     ]),
     
     dbc.Row([
       dbc.Col(dcc.Loading(children=[
         html.Div(dcc.Graph(
-          id='project-{}-deployments'.format(project_id),
+          id='project-deployments',
           figure=render_empty_plot_layout("Deployments by date", 400),
           style={ 'height': '400px' }), style={ 'height': '400px' }),
-          html.Div(id='project-{}-deployments-details'.format(project_id))
+          html.Div(id='project-deployments-details')
         ], type='default'),
         width=4
       ),
       dbc.Col(dcc.Loading(children=[
         html.Div(dcc.Graph(
-          id='project-{}-pipelines'.format(project_id),
+          id='project-pipelines',
           figure=render_empty_plot_layout("Pipelines runs by date", 400), 
           style={ 'height': '400px' }), style={ 'height': '400px' })
         ], type='default'),
@@ -65,7 +66,7 @@ def __tab_layout(project_id):
       ),
       dbc.Col(dcc.Loading(children=[
         html.Div(dcc.Graph(
-          id='project-{}-commits'.format(project_id),
+          id='project-commits',
           figure=render_empty_plot_layout("Commits by date", 400),
           style={ 'height': '400px' }), style={ 'height': '400px' })
         ], type='default'),
@@ -76,7 +77,7 @@ def __tab_layout(project_id):
     dbc.Row([        
       dbc.Col(dcc.Loading(children=[
         html.Div(dcc.Graph(
-          id='project-{}-coverage'.format(project_id),
+          id='project-coverage',
           figure=render_empty_plot_layout("Coverage by date", 500), 
           style={ 'height': '500px' }), style={ 'height': '500px' })
         ], type='default'),
@@ -84,7 +85,7 @@ def __tab_layout(project_id):
       ),          
       dbc.Col(dcc.Loading(children=[
         html.Div(dcc.Graph(
-          id='project-{}-testreport'.format(project_id),
+          id='project-testreport',
           figure=render_empty_plot_layout("Tests by date", 500),
           style={ 'height': '500px' }), style={ 'height': '500px' })
         ], type='default'),
@@ -94,12 +95,11 @@ def __tab_layout(project_id):
   ]))
   return content
 
-def __serve_projects_layout():
+def render_project_tabs(projects):
   tabs = []
   [tabs.append(dbc.Tab(
-    __tab_layout(project['id']),
-    label=gl.get_project_name(project['id']),
-    tab_id='tab-{}'.format(project['id']))) for project in projects]
+    label=get_client(project.get('instance')).get_project_name(project['id']),
+    tab_id='tab-{}'.format(project['key']))) for project in projects]
   return tabs
 
 def __serve_group_layout():
@@ -110,14 +110,21 @@ def __serve_group_layout():
                 id='graph_group_velocity',
                 figure=render_empty_plot_layout("Velocity", 450)))    
               ], type='default'),
-              width=6
+              width=4
             ),
             dbc.Col(dcc.Loading(children=[
               html.Div(dcc.Graph(
                 id='graph_group_issues',
                 figure=render_empty_plot_layout("Issues", 450)))
               ], type='default'),
-              width=6
+              width=4
+            ),
+            dbc.Col(dcc.Loading(children=[
+              html.Div(dcc.Graph(
+                id='graph_group_burndown',
+                figure=render_empty_plot_layout("Burndown", 450)))
+              ], type='default'),
+              width=4
             ),
           ]),
         ]
@@ -131,7 +138,9 @@ serve_layout = [
 
   # Projects
   html.Div(id='project', children=[
-    dbc.Tabs(id='project-tabs', children=__serve_projects_layout()),
+    dbc.Pagination(id='project-page', max_value=1, active_page=1, fully_expanded=False, previous_next=True, className="mt-2"),
+    dbc.Tabs(id='project-tabs', children=[]),
+    __project_layout(),
     dbc.CardBody(dcc.Loading(children=[html.P(id="project-card-content")], type="circle")),
   ]),
 ]
\ No newline at end of file
@@ -1,83 +1,809 @@
-# Standard library imports
-import logging
-
-# Third party imports
-from dash.dependencies import Input, Output, State
-
-# Local application imports
-from app import app, cache
-from modules.gitlab import GitLab
-import settings
-
-logger = logging.getLogger(__name__)
-
-projects = settings.GITLAB_PROJECT_IDS['projects'] if 'projects' in settings.GITLAB_PROJECT_IDS else None
-if projects is None:
-  raise Exception("No GitLab projects available")
-
-gl = GitLab()
-
-#######
-
-@cache.memoize(timeout=3600)
-def __get_milestone_data():
-  logger.info('Get milestone data for dashboard')
-  retval = gl.get_milestones(settings.GITLAB_GROUP_ID)
-  logger.info('Finished composing milestone data for dashboard')
-  return retval
-
-@cache.memoize(timeout=3600)
-def __get_pipeline_data():
-  logger.info('Get pipeline data for dashboard')
-  
-  retval = []
-  [retval.extend(gl.get_pipelines(project['id'], 
-      project['ref_name'] if 'ref_name' in project else 'master'))
-  for project in projects]
-  logger.info('Finished composing pipeline data for dashboard')
-  return retval
-
-@cache.memoize(timeout=3600)
-def __get_deployment_data():
-  logger.info('Get deployment data for dashboard')
-  retval = []
-  for project in projects:
-    retval.extend(gl.get_deployments(project['id']))
-  logger.info('Finished composing deployment data for dashboard')
-  return retval
-
-@cache.memoize(timeout=3600)
-def __get_commit_data():
-  logger.info('Get commit data for dashboard')
-  retval = []
-  for project in projects:
-    ref_name = project['ref_name'] if 'ref_name' in project else 'master'
-    retval.extend(gl.get_commits(project['id'], ref_name))
-  logger.info('Finished composing commit data for dashboard')
-  return retval
-
-#######
-
-@app.callback(
-  Output('memory-pipelines', 'data'),
-  [Input('session-update-hourly', 'n_intervals')])
-def signal_pipelines(n_intervals):
-  return __get_pipeline_data()
-
-@app.callback(
-  Output('memory-commits', 'data'),
-  [Input('session-update-hourly', 'n_intervals')])
-def signal_commits(n_intervals):
-  return __get_commit_data()
-
-@app.callback(
-  Output('memory-deployments', 'data'),
-  [Input('session-update-hourly', 'n_intervals')])
-def signal_deployments(n_intervals):
-  return __get_deployment_data()
-
-@app.callback(
-  Output('memory-milestones', 'data'),
-  [Input('session-update-hourly', 'n_intervals')])
-def signal_milestones(n_intervals):
-  return __get_milestone_data()
\ No newline at end of file
+# Standard library imports
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+import time
+import uuid
+
+# Third party imports
+from dash.dependencies import Input, Output, State
+
+# Local application imports
+from app import app, cache
+from modules.cache import ChunkedCache, get_lock, release_lock
+from modules.gitlab import DEFAULT_INSTANCE, DeadlineExceeded, GitLabError, get_client, project_key, record_project
+from modules.graphql import get_graphql_client
+from modules import burndown, dora, mergerequests, metrics, projects, regressions, retention, snapshot, testhistory
+import settings
+
+logger = logging.getLogger(__name__)
+
+DATASETS = ['pipelines', 'commits', 'deployments', 'milestones']
+
+# Chunk name used for datasets which are not split by project
+GROUP_CHUNK = 'group'
+# Seconds a bulk read is shared between the signal callbacks of one refresh
+BULK_READ_TTL = 10
+# Seconds between checks while another worker collects a dataset
+COLLECTOR_POLL_INTERVAL = 1
+
+def __chunk_projects():
+  """Return the project of every project chunk, looked up once per refresh instead of once per chunk"""
+  return {project['key']: project for project in projects.get_projects()}
+
+def __instance(project):
+  """Return the GitLab instance of a chunk's project, milestones come from the group of the default instance"""
+  return project.get('instance', DEFAULT_INSTANCE) if project is not None else DEFAULT_INSTANCE
+
+def __tag(instance, records):
+  """Mark the records of other instances than the default one with their instance, see record_project"""
+  if instance != DEFAULT_INSTANCE:
+    for record in records:
+      record['instance'] = instance
+  return records
+
+# Fetch a single chunk of a dataset from GitLab, project is None for the group chunk
+chunk_fetchers = {
+  'pipelines': lambda gl, project: gl.get_pipelines(project['id'], project['ref_name']),
+  'commits': lambda gl, project: gl.get_commits(project['id'], project['ref_name']),
+  'deployments': lambda gl, project: gl.get_deployments(project['id']),
+  'milestones': lambda gl, project: gl.get_milestones(settings.GITLAB_GROUP_ID),
+}
+
+def __fetch_pipelines_batch(instance, chunk_projects, deadline):
+  batch = [project for project in chunk_projects.values() if project is not None]
+  graphql = get_graphql_client(instance)
+  # The batch shares the deadline of the refresh like the chunk fetchers
+  with graphql.deadline(deadline - time.monotonic()):
+    fetched = graphql.get_pipelines_many(batch)
+  return {project_key(project_id, instance): __tag(instance, records) for project_id, records in fetched.items()}
+
+# Fetch many chunks of one instance at once, used instead of the chunk fetcher where available
+batch_fetchers = {}
+if settings.GITLAB_DATA_SOURCE == 'graphql':
+  batch_fetchers['pipelines'] = __fetch_pipelines_batch
+
+def __chunks_by_dataset():
+  project_chunks = [project['key'] for project in projects.get_projects()]
+  return {
+    'pipelines': project_chunks,
+    'commits': project_chunks,
+    'deployments': project_chunks,
+    'milestones': [GROUP_CHUNK],
+  }
+
+#######
+## Freshness
+
+def __marker(status, error=None):
+  return {'status': status, 'updated_at': datetime.now(timezone.utc).isoformat(), 'error': error}
+
+def __set_freshness(dataset, markers):
+  key = 'freshness-{}'.format(dataset)
+  current = cache.get(key) or {}
+  current.update(markers)
+  cache.set(key, current, timeout=86400)
+
+def get_freshness():
+  """Return freshness markers as dict of dataset -> {chunk: marker}"""
+  values = cache.get_many(*['freshness-{}'.format(dataset) for dataset in DATASETS])
+  return {dataset: value or {} for dataset, value in zip(DATASETS, values)}
+
+def __fetch_chunk(dataset, client, chunk, project, deadline):
+  if project is None and chunk != GROUP_CHUNK:
+    raise GitLabError('Project {} is not part of the dashboard anymore'.format(chunk))
+  # Deadlines are per thread, every worker thread shares the deadline of the refresh
+  with client.deadline(deadline - time.monotonic()):
+    return {chunk: __tag(client.instance, chunk_fetchers[dataset](client, project))}
+
+def __collect(dataset, chunks):
+  """Fetch chunks of a dataset within the refresh budget
+
+  Chunks which fail or don't finish in time are left out, the returned dict
+  only contains completed chunks.
+  """
+  retval = {}
+  markers = {}
+  started = time.perf_counter()
+  deadline = time.monotonic() + settings.REFRESH_BUDGET
+  chunk_projects = __chunk_projects()
+  by_instance = {}
+  for chunk in chunks:
+    project = chunk_projects.get(chunk)
+    by_instance.setdefault(__instance(project), {})[chunk] = project
+
+  # Every instance is crawled by a pool of its own size, a slow instance doesn't hold back the others
+  executors = []
+  futures = {}
+  for instance, instance_chunks in by_instance.items():
+    client = get_client(instance)
+    if dataset in batch_fetchers:
+      executors.append(ThreadPoolExecutor(max_workers=1))
+      futures[executors[-1].submit(batch_fetchers[dataset], instance, instance_chunks, deadline)] = list(instance_chunks)
+    else:
+      executors.append(ThreadPoolExecutor(max_workers=client.concurrency))
+      for chunk, project in instance_chunks.items():
+        futures[executors[-1].submit(__fetch_chunk, dataset, client, chunk, project, deadline)] = [chunk]
+
+  try:
+    for future in as_completed(futures):
+      fetched = {}
+      status, error = 'failed', 'Not returned by GitLab'
+      try:
+        fetched = future.result()
+      except DeadlineExceeded as e:
+        status, error = 'timeout', str(e)
+      except GitLabError as e:
+        logger.error('Get {} data for {} failed: {}'.format(dataset, ', '.join(futures[future]), e))
+        error = str(e)
+      retval.update(fetched)
+      for chunk in futures[future]:
+        markers[chunk] = __marker('fresh') if chunk in fetched else __marker(status, error)
+  finally:
+    [executor.shutdown(wait=False) for executor in executors]
+
+  # Every project keeps the newest records within its retention policy
+  retval = retention.enforce_many(dataset, retval)
+  skipped = len(chunks) - len(retval)
+  if skipped > 0:
+    logger.warning('Returning partial {} data, {} of {} chunks skipped'.format(dataset, skipped, len(chunks)))
+  metrics.observe_collector_run(dataset, time.perf_counter() - started, [marker['status'] for marker in markers.values()])
+  __set_freshness(dataset, markers)
+  if dataset == 'pipelines':
+    # Only pipelines which finished since the last refresh update the regression statistics and DORA metrics
+    pipelines = [record for records in retval.values() for record in records]
+    regressions.feed(cache, pipelines)
+    feed_dora(pipelines)
+  return retval
+
+#######
+## Collector coordination between workers
+
+def __collector_lock(dataset):
+  # Expires after the refresh budget, a crashed worker doesn't block refreshes for long
+  return get_lock('collector-{}'.format(dataset), timeout=settings.REFRESH_BUDGET + 60)
+
+def __wait_for_collector(dataset, lock):
+  """Wait until the worker holding the collector lock of a dataset is done"""
+  logger.info('Waiting for another worker collecting {} data'.format(dataset))
+  deadline = time.monotonic() + settings.REFRESH_BUDGET + 60
+  while lock.locked() and time.monotonic() < deadline:
+    time.sleep(COLLECTOR_POLL_INTERVAL)
+
+def __collect_records(dataset):
+  metrics.observe_cache_miss(dataset, 'redis')
+  # A partial result is served until it expires, a failing GitLab isn't crawled again on every render
+  result = cache.get('partial-{}'.format(dataset))
+  if result is not None:
+    return result
+  lock = __collector_lock(dataset)
+  owner = lock.acquire(blocking=False)
+  if not owner:
+    __wait_for_collector(dataset, lock)
+    loader = loaders[dataset]
+    result = cache.get(loader.make_cache_key(loader.uncached)) or cache.get('partial-{}'.format(dataset))
+    if result is not None:
+      return result
+    owner = lock.acquire(blocking=False)
+
+  try:
+    chunks = __chunks_by_dataset()[dataset]
+    collected = __collect(dataset, chunks)
+    records = []
+    [records.extend(collected[chunk]) for chunk in chunks if chunk in collected]
+    result = {'records': records, 'complete': len(collected) == len(chunks)}
+    if not result['complete']:
+      # Partial results are memoized briefly, here instead of by the loader
+      cache.set('partial-{}'.format(dataset), result, timeout=settings.PARTIAL_RESULT_TIMEOUT)
+    return result
+  finally:
+    if owner:
+      release_lock(lock)
+
+#######
+
+def __is_complete(result):
+  """Memoize complete datasets for an hour, partial results only for PARTIAL_RESULT_TIMEOUT (see __collect_records)"""
+  return result['complete']
+
+@cache.memoize(timeout=3600, response_filter=__is_complete)
+def __get_milestone_data():
+  logger.info('Get milestone data for dashboard')
+  retval = __collect_records('milestones')
+  logger.info('Finished composing milestone data for dashboard')
+  return retval
+
+@cache.memoize(timeout=3600, response_filter=__is_complete)
+def __get_pipeline_data():
+  logger.info('Get pipeline data for dashboard')
+  retval = __collect_records('pipelines')
+  logger.info('Finished composing pipeline data for dashboard')
+  return retval
+
+@cache.memoize(timeout=3600, response_filter=__is_complete)
+def __get_deployment_data():
+  logger.info('Get deployment data for dashboard')
+  retval = __collect_records('deployments')
+  logger.info('Finished composing deployment data for dashboard')
+  return retval
+
+@cache.memoize(timeout=3600, response_filter=__is_complete)
+def __get_commit_data():
+  logger.info('Get commit data for dashboard')
+  retval = __collect_records('commits')
+  logger.info('Finished composing commit data for dashboard')
+  return retval
+
+#######
+## Chunked cache backend
+
+chunked_cache = ChunkedCache(timeout=3600) if settings.CACHE_BACKEND == 'chunked' else None
+
+__bulk = {'expires': 0, 'data': None}
+__bulk_lock = threading.Lock()
+
+def __load_chunks():
+  """Load the chunks of all datasets in one round trip, shared by the signals of a refresh"""
+  with __bulk_lock:
+    if __bulk['data'] is None or time.monotonic() > __bulk['expires']:
+      __bulk['data'] = chunked_cache.get_many(__chunks_by_dataset())
+      __bulk['expires'] = time.monotonic() + BULK_READ_TTL
+    return __bulk['data']
+
+def __get_chunked_data(dataset):
+  chunks = __load_chunks()[dataset]
+  # Chunks which failed recently are retried after PARTIAL_RESULT_TIMEOUT, not on every render
+  failed = set(cache.get('failed-{}'.format(dataset)) or [])
+  missing = [chunk for chunk, records in chunks.items() if records is None and chunk not in failed]
+
+  metrics.observe_cache_lookup(dataset, 'chunked')
+  if len(missing) > 0:
+    metrics.observe_cache_miss(dataset, 'chunked')
+    lock = __collector_lock(dataset)
+    if lock.acquire(blocking=False):
+      logger.info('Get {} data for dashboard ({} of {} chunks missing)'.format(dataset, len(missing), len(chunks)))
+      try:
+        fetched = __collect(dataset, missing)
+        chunked_cache.set_many(dataset, fetched)
+        cache.set('failed-{}'.format(dataset), [chunk for chunk in missing if chunk not in fetched], timeout=settings.PARTIAL_RESULT_TIMEOUT)
+      finally:
+        release_lock(lock)
+    else:
+      # Another worker fetches the same chunks, read its results once it is done
+      __wait_for_collector(dataset, lock)
+      reloaded = chunked_cache.get_many({dataset: missing})[dataset]
+      fetched = {chunk: records for chunk, records in reloaded.items() if records is not None}
+    with __bulk_lock:
+      chunks.update(fetched)
+    logger.info('Finished composing {} data for dashboard'.format(dataset))
+
+  retval = []
+  [retval.extend(chunks[chunk]) for chunk in chunks if chunks[chunk] is not None]
+  return retval
+
+loaders = {
+  'pipelines': __get_pipeline_data,
+  'commits': __get_commit_data,
+  'deployments': __get_deployment_data,
+  'milestones': __get_milestone_data,
+}
+
+def get_dataset(dataset):
+  """Return a dashboard dataset from the configured cache backend"""
+  if chunked_cache is not None:
+    return __get_chunked_data(dataset)
+  metrics.observe_cache_lookup(dataset, 'redis')
+  return loaders[dataset]()['records']
+
+def get_chunks(dataset):
+  """Return a dashboard dataset split into chunks (one per project, milestones as group chunk)"""
+  if chunked_cache is not None:
+    __get_chunked_data(dataset)
+    return dict(__load_chunks()[dataset])
+
+  records = loaders[dataset]()['records']
+  if dataset == 'milestones':
+    return {GROUP_CHUNK: records}
+  retval = {project['key']: [] for project in projects.get_projects()}
+  for record in records:
+    retval.setdefault(record_project(record), []).append(record)
+  return retval
+
+def project_keys(df):
+  """Return the project key of every record of a DataFrame, see record_project"""
+  keys = df['project_id'].astype(str)
+  if 'instance' in df:
+    other = df['instance'].notna() & (df['instance'] != DEFAULT_INSTANCE)
+    keys[other] = df.loc[other, 'instance'].astype(str) + ':' + keys[other]
+  return keys
+
+def set_chunks(dataset, chunks):
+  """Store chunks of a dashboard dataset, e.g. imported from a snapshot"""
+  if chunked_cache is not None:
+    chunked_cache.set_many(dataset, chunks)
+    with __bulk_lock:
+      __bulk['data'] = None
+    return
+
+  records = []
+  [records.extend(chunks[chunk]) for chunk in chunks if chunks[chunk] is not None]
+  loader = loaders[dataset]
+  value = {'records': records, 'complete': True}
+  cache.set(loader.make_cache_key(loader.uncached), value, timeout=loader.cache_timeout)
+
+def is_cached(dataset):
+  if chunked_cache is not None:
+    return all(records is not None for records in __load_chunks()[dataset].values())
+  loader = loaders[dataset]
+  return cache.get(loader.make_cache_key(loader.uncached)) is not None
+
+#######
+## Warm start
+
+def export_snapshot(path, datasets=DATASETS):
+  return snapshot.export_snapshot(path, {dataset: get_chunks(dataset) for dataset in datasets})
+
+def import_snapshot(path, force=False):
+  """Seed the caches from a snapshot, datasets which are already cached are kept unless forced"""
+  header, chunks_by_dataset = snapshot.import_snapshot(path)
+  imported = []
+  for dataset, chunks in chunks_by_dataset.items():
+    if dataset not in loaders:
+      logger.warning('Skipping unknown snapshot dataset: {}'.format(dataset))
+      continue
+    if not force and is_cached(dataset):
+      continue
+    set_chunks(dataset, chunks)
+    imported.append(dataset)
+  if 'pipelines' in imported:
+    # Seeded pipelines don't pass the collector
+    feed_dora(get_dataset('pipelines'))
+  logger.info('Seeded datasets from snapshot: {}'.format(', '.join(imported) if imported else 'none'))
+  return imported
+
+def warm_caches():
+  logger.info('Warming dashboard caches')
+  for dataset in DATASETS:
+    try:
+      get_dataset(dataset)
+    except Exception as e:
+      logger.exception('Warming {} cache failed: {}'.format(dataset, e))
+  logger.info('Finished warming dashboard caches')
+
+def warm_start():
+  """Seed caches from the configured snapshot and start the background warm up and syncs"""
+  if settings.SNAPSHOT_PATH and os.path.exists(settings.SNAPSHOT_PATH):
+    try:
+      import_snapshot(settings.SNAPSHOT_PATH)
+    except (OSError, ValueError) as e:
+      logger.error('Importing snapshot {} failed: {}'.format(settings.SNAPSHOT_PATH, e))
+
+  start_syncs()
+  if settings.CACHE_WARM_ON_BOOT:
+    thread = threading.Thread(target=warm_caches, name='cache-warmup', daemon=True)
+    thread.start()
+    return thread
+  return None
+
+#######
+## DORA metrics
+
+dora_engine = dora.DoraEngine()
+__dora = {'revision': None}
+__dora_lock = threading.Lock()
+
+def __reload_dora():
+  # The state is only read again after another worker changed it, it keeps the history of earlier runs
+  revision = cache.get('dora-revision')
+  if revision is not None and revision != __dora['revision']:
+    dora_engine.load(cache.get('dora-state'))
+    __dora['revision'] = revision
+
+def feed_dora(pipelines):
+  """Update the shared DORA engine with collected pipelines and the cached commits and deployments, returns the number of new records
+
+  Only records which weren't processed before count, workers update the
+  shared state one at a time.
+  """
+  records = {'commits': get_dataset('commits'), 'deployments': get_dataset('deployments'), 'pipelines': pipelines}
+  lock = get_lock('dora', timeout=60)
+  lock.acquire()
+  try:
+    with __dora_lock:
+      __reload_dora()
+      new = dora_engine.update(**records)
+      if new > 0:
+        __dora['revision'] = uuid.uuid4().hex
+        cache.set('dora-state', dora_engine.state(), timeout=settings.DORA_RETENTION_DAYS * 86400)
+        cache.set('dora-revision', __dora['revision'], timeout=settings.DORA_RETENTION_DAYS * 86400)
+      return new
+  finally:
+    release_lock(lock)
+
+def get_dora():
+  """Return the DORA engine with the latest shared state, see feed_dora"""
+  with __dora_lock:
+    __reload_dora()
+  return dora_engine
+
+#######
+## Regressions
+
+def get_regressions(project):
+  """Return the regressed metrics of a project by key, the detector is seeded from the cached pipelines once"""
+  if not regressions.is_seeded(cache):
+    regressions.feed(cache, get_dataset('pipelines'))
+  return regressions.get_detector(cache).regressions(project)
+
+#######
+## Test history
+
+test_history = testhistory.TestHistory()
+retention.register('test-history', test_history.footprint)
+# Revision of the shared history this process loaded or published last
+__test_history = {'revision': None}
+__test_history_lock = threading.Lock()
+
+def __ingest_test_report(client, pipeline, deadline):
+  # Reports are ingested right away, only the compact history is kept in memory
+  with client.deadline(deadline - time.monotonic()):
+    report = client.get_test_report(pipeline['project_id'], pipeline['id'])
+  return test_history.add(pipeline, report)
+
+def __ingest_test_reports(pipelines):
+  """Ingest the test reports of pipelines within the refresh budget, returns the number of new results"""
+  deadline = time.monotonic() + settings.REFRESH_BUDGET
+  by_instance = {}
+  for pipeline in pipelines:
+    by_instance.setdefault(pipeline.get('instance', DEFAULT_INSTANCE), []).append(pipeline)
+
+  executors = []
+  futures = {}
+  for instance, instance_pipelines in by_instance.items():
+    client = get_client(instance)
+    executors.append(ThreadPoolExecutor(max_workers=client.concurrency))
+    for pipeline in instance_pipelines:
+      futures[executors[-1].submit(__ingest_test_report, client, pipeline, deadline)] = pipeline
+
+  retval = 0
+  ingested = 0
+  try:
+    for future in as_completed(futures):
+      try:
+        retval = retval + future.result()
+        ingested = ingested + 1
+      except DeadlineExceeded:
+        pass
+      except GitLabError as e:
+        logger.error('Get test report of pipeline {} failed: {}'.format(futures[future]['id'], e))
+  finally:
+    [executor.shutdown(wait=False) for executor in executors]
+  skipped = len(pipelines) - ingested
+  if skipped > 0:
+    logger.warning('{} of {} test reports skipped, they are fetched on the next refresh'.format(skipped, len(pipelines)))
+  return retval
+
+def __reload_test_history():
+  # The history is only read again after another worker changed it, not while this one ingests
+  revision = cache.get('test-history-revision')
+  if revision is not None and revision != __test_history['revision']:
+    test_history.load(cache.get('test-history'))
+    __test_history['revision'] = revision
+
+def sync_test_history(force=False):
+  """Ingest the reports of pipelines which finished since the last sync unless another worker synced within the interval, returns True if it synced
+
+  Test reports don't change once a pipeline finished, every report is only
+  fetched once and the history is shared by all workers through the cache.
+  """
+  lock = get_lock('test-history', timeout=settings.REFRESH_BUDGET + 60)
+  if not lock.acquire(blocking=False):
+    return False
+  try:
+    now = time.time()
+    if not force and now - (cache.get('test-history-synced') or 0) < 0.9 * settings.TEST_HISTORY_SYNC_INTERVAL:
+      return False
+    pipelines = get_dataset('pipelines')
+    with __test_history_lock:
+      __reload_test_history()
+    missing = test_history.missing(pipelines)
+    if len(missing) > 0:
+      logger.info('Get {} test reports for the test history'.format(len(missing)))
+      results = __ingest_test_reports(missing)
+      with __test_history_lock:
+        __test_history['revision'] = uuid.uuid4().hex
+        cache.set('test-history', test_history.state(), timeout=0)
+        cache.set('test-history-revision', __test_history['revision'], timeout=0)
+      logger.info('Finished composing test history ({} new results, {results} results of {test_cases} test cases in {bytes} bytes)'.format(
+        results, **test_history.stats()))
+    cache.set('test-history-synced', now, timeout=0)
+    return True
+  finally:
+    release_lock(lock)
+
+def get_test_history():
+  """Return the test history as last synced by any worker, see sync_test_history"""
+  with __test_history_lock:
+    __reload_test_history()
+  return test_history
+
+#######
+## Merge requests
+
+merge_request_store = mergerequests.MergeRequestStore()
+retention.register('merge-requests', merge_request_store.footprint)
+# Revision of the shared store this process loaded or published last
+__merge_requests = {'revision': None}
+__merge_requests_lock = threading.Lock()
+
+def __reload_merge_requests():
+  # The store is only read again after another worker changed it, not while this one ingests
+  revision = cache.get('merge-requests-revision')
+  if revision is not None and revision != __merge_requests['revision']:
+    merge_request_store.load(cache.get('merge-requests'))
+    __merge_requests['revision'] = revision
+
+def __crawl_merge_requests(client, project, deadline):
+  """Ingest the merge requests of a project updated since its last crawl, returns their number
+
+  Merge requests are listed least recently updated first, a crawl which runs
+  out of time keeps what it fetched and continues from there next time.
+  """
+  since = merge_request_store.watermark(project['key']) or \
+    (datetime.now(timezone.utc) - timedelta(days=settings.MERGE_REQUEST_DAYS)).strftime('%Y-%m-%dT%H:%M:%SZ')
+  details = []
+  watermark = None
+  with client.deadline(deadline - time.monotonic()):
+    listed = client.get_merge_requests(project['id'], since=since)
+    try:
+      for merge_request in merge_request_store.changed(project['key'], listed):
+        details.append(client.get_merge_request_details(project['id'], merge_request))
+        watermark = merge_request['updated_at']
+      watermark = listed[-1]['updated_at'] if len(listed) > 0 else None
+    finally:
+      merge_request_store.add(project['key'], details, watermark)
+  return len(details)
+
+def sync_merge_requests(force=False):
+  """Ingest the merge requests updated since the last sync unless another worker synced within the interval, returns True if it synced
+
+  Only merge requests updated after the latest one of a project are listed,
+  their notes and sizes are fetched once per update. The store is shared by
+  all workers through the cache.
+  """
+  lock = get_lock('merge-requests', timeout=settings.REFRESH_BUDGET + 60)
+  if not lock.acquire(blocking=False):
+    return False
+  try:
+    now = time.time()
+    if not force and now - (cache.get('merge-requests-synced') or 0) < 0.9 * settings.MERGE_REQUEST_SYNC_INTERVAL:
+      return False
+    with __merge_requests_lock:
+      __reload_merge_requests()
+    revision = merge_request_store.revision
+    deadline = time.monotonic() + settings.REFRESH_BUDGET
+    by_instance = {}
+    for project in projects.get_projects():
+      by_instance.setdefault(project.get('instance', DEFAULT_INSTANCE), []).append(project)
+
+    executors = []
+    futures = {}
+    for instance, instance_projects in by_instance.items():
+      client = get_client(instance)
+      executors.append(ThreadPoolExecutor(max_workers=client.concurrency))
+      for project in instance_projects:
+        futures[executors[-1].submit(__crawl_merge_requests, client, project, deadline)] = project
+
+    ingested = 0
+    try:
+      for future in as_completed(futures):
+        try:
+          ingested = ingested + future.result()
+        except DeadlineExceeded:
+          logger.warning('Merge requests of project {} are continued on the next sync'.format(futures[future]['key']))
+        except GitLabError as e:
+          logger.error('Get merge requests of project {} failed: {}'.format(futures[future]['key'], e))
+    finally:
+      [executor.shutdown(wait=False) for executor in executors]
+
+    if merge_request_store.revision != revision:
+      with __merge_requests_lock:
+        __merge_requests['revision'] = uuid.uuid4().hex
+        cache.set('merge-requests', merge_request_store.state(), timeout=0)
+        cache.set('merge-requests-revision', __merge_requests['revision'], timeout=0)
+      logger.info('Finished ingesting merge requests ({} new, {merge_requests} merge requests of {projects} projects in {bytes} bytes)'.format(
+        ingested, **merge_request_store.stats()))
+    cache.set('merge-requests-synced', now, timeout=0)
+    return True
+  finally:
+    release_lock(lock)
+
+def get_merge_requests():
+  """Return the merge request store as last synced by any worker, see sync_merge_requests"""
+  with __merge_requests_lock:
+    __reload_merge_requests()
+  return merge_request_store
+
+#######
+## Sprint burndown
+
+# Burndown of the running sprint and the revision of the shared burndown this process loaded or published last
+__burndown = {'sprint': None, 'revision': None}
+__burndown_lock = threading.Lock()
+
+def __reload_burndown():
+  # The burndown is only read again after another worker changed it, not while this one syncs
+  revision = cache.get('burndown-revision')
+  if revision is None or revision == __burndown['revision']:
+    return
+  state = cache.get('burndown')
+  sprint = __burndown['sprint']
+  if state is None:
+    sprint = None
+  elif sprint is None or sprint.milestone['id'] != state['milestone']['id']:
+    sprint = burndown.Burndown(state['milestone'])
+  if sprint is not None:
+    sprint.load(state)
+  __burndown['sprint'] = sprint
+  __burndown['revision'] = revision
+
+def __publish_burndown(sprint):
+  with __burndown_lock:
+    __burndown['sprint'] = sprint
+    __burndown['revision'] = uuid.uuid4().hex
+    cache.set('burndown', sprint.state() if sprint is not None else None, timeout=0)
+    cache.set('burndown-revision', __burndown['revision'], timeout=0)
+
+def __sync_issue_events(client, issue, deadline):
+  with client.deadline(deadline - time.monotonic()):
+    return issue, client.get_issue_events(issue['project_id'], issue['iid'])
+
+def __sync_sprint(client, deadline):
+  """Fold the issue events since the last sync into the burndown of the running sprint and share it if it changed"""
+  with client.deadline(deadline - time.monotonic()):
+    milestone = client.get_active_milestone(settings.GITLAB_GROUP_ID)
+  published = __burndown['sprint']
+  if milestone is None:
+    if published is not None or __burndown['revision'] is None:
+      __publish_burndown(None)
+    return
+  sprint = published
+  if sprint is None or sprint.milestone['id'] != milestone['id']:
+    sprint = burndown.Burndown(milestone)
+  revision = sprint.revision
+
+  # Overlapping syncs are cheap, issues which didn't change since their last sync are skipped
+  started = (datetime.now(timezone.utc) - timedelta(minutes=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+  with client.deadline(deadline - time.monotonic()):
+    if sprint.watermark is None:
+      issues = client.get_group_issues(settings.GITLAB_GROUP_ID, milestone=milestone['title'])
+    else:
+      issues = client.get_group_issues(settings.GITLAB_GROUP_ID, updated_after=sprint.watermark)
+  pending = sprint.pending(issues)
+
+  executor = ThreadPoolExecutor(max_workers=client.concurrency)
+  futures = [executor.submit(__sync_issue_events, client, issue, deadline) for issue in pending]
+  complete = True
+  events = 0
+  try:
+    for future in as_completed(futures):
+      try:
+        issue, issue_events = future.result()
+        events = events + sprint.add(issue, issue_events)
+      except DeadlineExceeded:
+        complete = False
+      except GitLabError as e:
+        complete = False
+        logger.error('Get issue events failed: {}'.format(e))
+  finally:
+    executor.shutdown(wait=False)
+  # Issues which failed are listed again next time, the synced ones are skipped as unchanged.
+  # Without changes to the sprint the watermark is kept, the shared burndown isn't written again.
+  moved = complete and (sprint.watermark is None or len(pending) > 0)
+  if moved:
+    sprint.watermark = started
+  elif not complete:
+    logger.warning('Issue events of {} are continued on the next sync'.format(milestone['title']))
+
+  if sprint is not published or sprint.revision != revision or moved:
+    __publish_burndown(sprint)
+    logger.info('Finished syncing burndown of {} ({} issues, {} new events)'.format(milestone['title'], len(pending), events))
+
+def sync_burndown(force=False):
+  """Sync the burndown of the running sprint unless another worker synced it within the interval, returns True if it synced
+
+  The issues of the sprint are listed once, later only the group's issues
+  updated since the last sync are listed and the events of the ones which
+  belong (or belonged) to the sprint are fetched. The burndown is shared by all
+  workers through the cache.
+  """
+  lock = get_lock('burndown', timeout=settings.REFRESH_BUDGET + 60)
+  if not lock.acquire(blocking=False):
+    return False
+  try:
+    now = time.time()
+    if not force and now - (cache.get('burndown-synced') or 0) < 0.9 * settings.BURNDOWN_SYNC_INTERVAL:
+      return False
+    with __burndown_lock:
+      __reload_burndown()
+    # Milestones come from the group of the default instance
+    try:
+      __sync_sprint(get_client(), time.monotonic() + settings.REFRESH_BUDGET)
+    except DeadlineExceeded:
+      logger.warning('Listing the issues of the sprint is continued on the next sync')
+    except GitLabError as e:
+      logger.error('Syncing the burndown failed: {}'.format(e))
+    cache.set('burndown-synced', now, timeout=0)
+    return True
+  finally:
+    release_lock(lock)
+
+def get_burndown():
+  """Return the burndown of the running sprint as last synced by any worker, None between sprints, see sync_burndown"""
+  with __burndown_lock:
+    __reload_burndown()
+    return __burndown['sprint']
+
+#######
+## Background syncs
+
+# Stores synced in the background of every worker, the first one due syncs and shares the result
+__syncs = {}
+__sync_state = {'thread': None}
+if settings.TEST_HISTORY_ENABLED and 'overview' in settings.APP_PAGES:
+  __syncs['test history'] = (sync_test_history, settings.TEST_HISTORY_SYNC_INTERVAL)
+if settings.MERGE_REQUESTS_ENABLED and 'overview' in settings.APP_PAGES:
+  __syncs['merge requests'] = (sync_merge_requests, settings.MERGE_REQUEST_SYNC_INTERVAL)
+if 'dashboard' in settings.APP_PAGES:
+  __syncs['burndown'] = (sync_burndown, settings.BURNDOWN_SYNC_INTERVAL)
+
+def __run_syncs():
+  while True:
+    for name, (sync, _) in list(__syncs.items()):
+      try:
+        sync()
+      except Exception as e:
+        logger.exception('Syncing {} failed: {}'.format(name, e))
+    time.sleep(min(interval for _, interval in __syncs.values()) / 4)
+
+def start_syncs():
+  """Start the sync loop of this process, once the application is loaded (or the worker forked)"""
+  if __sync_state['thread'] is not None or len(__syncs) == 0:
+    return None
+  __sync_state['thread'] = threading.Thread(target=__run_syncs, name='store-sync', daemon=True)
+  __sync_state['thread'].start()
+  return __sync_state['thread']
+
+#######
+
+@app.callback(
+  Output('memory-pipelines', 'data'),
+  [Input('session-update-hourly', 'n_intervals')])
+def signal_pipelines(n_intervals):
+  return get_dataset('pipelines')
+
+@app.callback(
+  Output('memory-commits', 'data'),
+  [Input('session-update-hourly', 'n_intervals')])
+def signal_commits(n_intervals):
+  return get_dataset('commits')
+
+@app.callback(
+  Output('memory-deployments', 'data'),
+  [Input('session-update-hourly', 'n_intervals')])
+def signal_deployments(n_intervals):
+  return get_dataset('deployments')
+
+@app.callback(
+  Output('memory-milestones', 'data'),
+  [Input('session-update-hourly', 'n_intervals')])
+def signal_milestones(n_intervals):
+  return get_dataset('milestones')
+
+@app.callback(
+  Output('memory-freshness', 'data'),
+  [Input('memory-{}'.format(dataset), 'modified_timestamp') for dataset in DATASETS])
+def signal_freshness(*timestamps):
+  return get_freshness()
@@ -1,4 +1,4 @@
-# Local application imports
-from . import layouts, callbacks
-
+# Local application imports
+from . import layouts, callbacks
+
 layout = layouts.serve_layout
\ No newline at end of file
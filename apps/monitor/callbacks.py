@@ -1,120 +1,145 @@
-# Standard library imports
-from datetime import datetime, timedelta
-import json
-import logging
-
-# Third party imports
-from dash.dependencies import Input, Output, State
-import dash_bootstrap_components as dbc
-from dash import html
-import pandas as pd
-from pandas import json_normalize
-
-# Local application imports
-from app import app
-from modules.gitlab import GitLab
-import settings
-from . import layouts
-
-logger = logging.getLogger(__name__)
-
-projects = settings.GITLAB_PROJECT_IDS['projects'] if 'projects' in settings.GITLAB_PROJECT_IDS else None
-if projects is None:
-  raise Exception("No GitLab projects available")
-
-gl = GitLab()
-
-def register_callbacks():
-  """Register application callbacks"""  
-  [__register_project_callbacks(project['id'], project['ref_name'] if 'ref_name' in project else 'master')
-  for project in projects]
-
-def __get_pipeline_data(project_id, ref_name):
-  logger.info('Get pipeline data for monitor ({})'.format(project_id))  
-  return gl.get_latest_pipeline(project_id, ref_name)
-
-def __get_active_jobs_data(project_id, pipeline_id):
-  logger.info('Get active jobs for monitor ({})'.format(project_id))
-  return gl.get_active_jobs(project_id, pipeline_id)
-
-def __get_inactive_jobs_data(project_id, pipeline_id):
-  logger.info('Get inactive jobs for monitor ({})'.format(project_id))
-  return gl.get_inactive_jobs(project_id, pipeline_id)
-
-def __get_test_report_summary_data(project_id, pipeline_id):
-  logger.info('Get test report data for monitor ({})'.format(project_id))
-  return gl.get_test_report_summary(project_id, pipeline_id)
-
-def __register_project_callbacks(project_id, ref_name):
-  """Register project specific callbacks"""
-  logger.info('Register monitor project ({}) callbacks'.format(project_id))
-
-  @app.callback(
-    [Output('card-{}'.format(project_id), 'children'),
-     Output('card-{}'.format(project_id), 'color')],
-    [Input('session-update-build', 'n_intervals')])
-  def render_card(n):
-    color = 'secondary'
-    data = __get_pipeline_data(project_id, ref_name)    
-
-    if data is None:
-      return layouts.render_empty_card_layout()
-
-    pipeline_id = data['id']
-    name = data['project_name']
-    status = data['status']
-    coverage = data['coverage']
-    duration = data['duration']
-    url = data['web_url']    
-    test_report = []
-
-    if 'success' == status:
-      color = 'success'
-    elif 'running' == status:
-      color = 'warning'
-    elif 'failed' == status:
-      color = 'danger'
-
-    joint_jobs = ''
-    if 'failed' == status or 'canceled' == status:
-      inactive_jobs = __get_inactive_jobs_data(project_id, pipeline_id)      
-      for job in inactive_jobs:
-        job_name = job['name']
-        if joint_jobs == '':
-          joint_jobs = job_name
-        else:
-          joint_jobs = joint_jobs + ', ' + job_name
-    elif 'running' == status or 'manual' == status:
-      active_jobs = __get_active_jobs_data(project_id, pipeline_id)      
-      for job in active_jobs:
-        job_name = job['name']
-        if joint_jobs == '':
-          joint_jobs = job_name
-        else:
-          joint_jobs = joint_jobs + ', ' + job_name
-
-    test_details = ''
-    # if 'failed' == status:
-    #   test_report = __get_test_report_data(project_id, pipeline_id)
-    #   if 'total_count' in test_report and test_report['total_count'] > 0:
-    #     test_details = 'Total ({}): Success ({}), Skipped ({}), Failed ({})'.format(
-    #       test_report['total_count'],
-    #       test_report['success_count'],
-    #       test_report['skipped_count'],
-    #       test_report['failed_count'])
-
-    return [dbc.CardHeader(name),
-            dbc.CardBody([
-              html.H2(status.upper(), className="mb-2", style={'text-align': 'center'}),
-              html.Div(str(timedelta(seconds=duration)), className="mb-2", style={'text-align': 'center'}),
-              html.Div(joint_jobs, className="mb-2", style={'text-align': 'center'}),
-              html.Div(test_details, className="mb-2", style={'text-align': 'center'}),
-              html.Span([
-                dbc.Button(
-                  "Coverage: {:.2f} %".format(coverage),
-                  color="dark", size="sm", className="mr-1", outline=True
-                )]),              
-              ],              
-            ),
-            dbc.CardFooter("{} ({})".format(project_id, ref_name))
-          ], color
\ No newline at end of file
+# Standard library imports
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+
+# Third party imports
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+
+# Local application imports
+from app import app, cache
+from modules.gitlab import DEFAULT_INSTANCE, GitLabError, get_client, project_key
+from modules.graphql import get_graphql_client
+from modules import projects, publisher, regressions
+import settings
+
+logger = logging.getLogger(__name__)
+
+def __pipeline_source(instance):
+  """Source of the latest pipelines, jobs are always requested through REST"""
+  return get_graphql_client(instance) if settings.GITLAB_DATA_SOURCE == 'graphql' else get_client(instance)
+
+def register_callbacks():
+  """Register application callbacks"""  
+  __register_page_callbacks()
+  [__register_card_callbacks(slot) for slot in range(settings.PROJECTS_PAGE_SIZE)]
+  publisher.register('monitor', render_published)
+
+def __get_pipeline_data(instance, project_id, ref_name):
+  logger.info('Get pipeline data for monitor ({})'.format(project_id))  
+  return __pipeline_source(instance).get_latest_pipeline(project_id, ref_name)
+
+def __get_active_jobs_data(instance, project_id, pipeline_id):
+  logger.info('Get active jobs for monitor ({})'.format(project_id))
+  return get_client(instance).get_active_jobs(project_id, pipeline_id)
+
+def __get_inactive_jobs_data(instance, project_id, pipeline_id):
+  logger.info('Get inactive jobs for monitor ({})'.format(project_id))
+  return get_client(instance).get_inactive_jobs(project_id, pipeline_id)
+
+def __get_test_report_summary_data(instance, project_id, pipeline_id):
+  logger.info('Get test report data for monitor ({})'.format(project_id))
+  return get_client(instance).get_test_report_summary(project_id, pipeline_id)
+
+def __register_page_callbacks():
+  @app.callback(
+    Output('monitor-page', 'max_value'),
+    [Input('session-update-hourly', 'n_intervals')])
+  def render_page_count(n):
+    return projects.page_count()
+
+def __register_card_callbacks(slot):
+  """Register the callbacks of a card slot, showing the project at this position of the current page"""
+  logger.info('Register monitor card slot ({}) callbacks'.format(slot))
+
+  @app.callback(
+    Output('card-slot-{}-status'.format(slot), 'data'),
+    [Input('session-update-build', 'n_intervals'),
+     Input('monitor-page', 'active_page')],
+    [State('card-slot-{}-status'.format(slot), 'data')])
+  def update_status(n, page, current):
+    page_projects = projects.get_page(page)
+    status = __project_status(page_projects[slot]) if slot < len(page_projects) else None
+    if status is not None:
+      status['version'] = __version(status)
+    # Unchanged cards send no update at all, the browser keeps rendering the current status
+    if __version(current) == __version(status) and (current is None) == (status is None):
+      raise PreventUpdate
+    return status
+
+  # The card itself is rendered in the browser from the status record (assets/scripts/monitor.js)
+  app.clientside_callback(
+    ClientsideFunction(namespace='monitor', function_name='render_card'),
+    [Output('card-slot-{}'.format(slot), 'children'),
+     Output('card-slot-{}'.format(slot), 'color'),
+     Output('card-slot-{}-col'.format(slot), 'style')],
+    [Input('card-slot-{}-status'.format(slot), 'data')])
+
+def __version(status):
+  if status is None:
+    return None
+  if 'version' in status:
+    return status['version']
+  return hashlib.blake2b(json.dumps(status, sort_keys=True).encode('utf-8'), digest_size=8).hexdigest()
+
+def __project_status(project):
+  """Return the card status of a project within the monitor budget, an empty card if GitLab failed"""
+  instance = project.get('instance', DEFAULT_INSTANCE)
+  try:
+    with get_client(instance).deadline(settings.MONITOR_BUDGET):
+      return get_card_status(project['id'], project['ref_name'], instance)
+  except GitLabError as e:
+    logger.error('Update monitor card ({}) failed: {}'.format(project['id'], e))
+    return {'project_id': project['id'], 'empty': True}
+
+def __joint_job_names(jobs):
+  return ', '.join(job['name'] for job in jobs)
+
+def get_card_status(project_id, ref_name, instance=None):
+  """Return the compact status record a monitor card is rendered from"""
+  data = __get_pipeline_data(instance, project_id, ref_name)
+  if data is None:
+    return {'project_id': project_id, 'empty': True}
+
+  pipeline_id = data['id']
+  status = data['status']
+
+  # Jobs are only requested again once the pipeline changed
+  key = 'jobs-{}-{}'.format(project_id, pipeline_id)
+  stored = get_client(instance).pipelines.get(key)
+  if stored is not None and stored['status'] == status and stored['updated_at'] == data['updated_at']:
+    joint_jobs = stored['jobs']
+  else:
+    joint_jobs = ''
+    if 'failed' == status or 'canceled' == status:
+      joint_jobs = __joint_job_names(__get_inactive_jobs_data(instance, project_id, pipeline_id))
+    elif 'running' == status or 'manual' == status:
+      joint_jobs = __joint_job_names(__get_active_jobs_data(instance, project_id, pipeline_id))
+    get_client(instance).pipelines.set(key, {'status': status, 'updated_at': data['updated_at'], 'jobs': joint_jobs})
+
+  # The regression statistics are fed by the pipeline collector, which sees every finished pipeline
+  regressed = regressions.get_detector(cache).regressions(project_key(project_id, instance), ref_name)
+
+  return {
+    'project_id': project_id,
+    'ref_name': ref_name,
+    'name': data['project_name'],
+    'status': status,
+    'duration': data['duration'],
+    'coverage': data['coverage'],
+    'jobs': joint_jobs,
+    'url': data['web_url'],
+    'regressions': [regressions.describe(regression) for regression in regressed],
+  }
+
+def render_published():
+  """Render the cards of all projects for the published monitor snapshot"""
+  with ThreadPoolExecutor(max_workers=settings.GITLAB_CONCURRENCY) as executor:
+    cards = list(executor.map(__project_status, projects.get_projects()))
+  for card in cards:
+    if not card.get('empty'):
+      card['duration_text'] = str(timedelta(seconds=int(card['duration'] or 0)))
+  return publisher.render_template('published/monitor.html', cards=cards), cards
@@ -1,35 +1,31 @@
-# Third party imports
-from dash import dcc, html
-import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
-
-# Local application imports
-import settings
-
-projects = settings.GITLAB_PROJECT_IDS['projects'] if 'projects' in settings.GITLAB_PROJECT_IDS else None
-if projects is None:
-  raise Exception("No GitLab projects available")
-
-def render_empty_card_layout():
-  return [dbc.CardBody([
-    html.H2("No matching data found", className="mb-2", style={'text-align': 'center'})
-  ])], 'secondary'
-
-def __card_layout(project_id):
-  card_name = 'card-{}'.format(project_id)
-  return dbc.Col(dbc.Card(
-    id=card_name,
-    children=[],
-    color="secondary",
-    inverse=True,
-    className="mt-4"), width=3)
-
-def __serve_cards_layout():
-  cards = []
-  [cards.append(__card_layout(project['id'])) for project in projects]
-  return cards
-
-serve_layout = [
-  html.Div(html.H2(settings.APP_NAME)),    
-  dbc.Container(id='project', children=dbc.Row(__serve_cards_layout()), fluid=True)
+# Third party imports
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+
+# Local application imports
+import settings
+
+def __card_layout(slot):
+  card_name = 'card-slot-{}'.format(slot)
+  return dbc.Col([
+    # Compact status record, the card is rendered from it in the browser
+    dcc.Store(id='{}-status'.format(card_name)),
+    dbc.Card(
+      id=card_name,
+      children=[],
+      color="secondary",
+      inverse=True,
+      className="mt-4")
+  ], id='{}-col'.format(card_name), width=3)
+
+def __serve_cards_layout():
+  # One card slot per project of a page, the projects of the current page are filled in
+  cards = []
+  [cards.append(__card_layout(slot)) for slot in range(settings.PROJECTS_PAGE_SIZE)]
+  return cards
+
+serve_layout = [
+  html.Div(html.H2(settings.APP_NAME)),    
+  dbc.Pagination(id='monitor-page', max_value=1, active_page=1, fully_expanded=False, previous_next=True),
+  dbc.Container(id='project', children=dbc.Row(__serve_cards_layout()), fluid=True)
 ]
\ No newline at end of file
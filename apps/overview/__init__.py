@@ -0,0 +1,4 @@
+# Local application imports
+from . import layouts, callbacks
+
+layout = layouts.serve_layout
@@ -0,0 +1,221 @@
+# Standard library imports
+import json
+import logging
+
+# Third party imports
+from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
+
+# Local application imports
+from app import app, cache
+from apps.dashboard import signals
+from apps.dashboard.layouts import render_empty_plot_layout
+from modules.gitlab import TIMESPAN_DAYS, record_project
+from modules.lazy import lazy_import
+from modules import profiling, projects, publisher, regressions
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Analytics dependencies are imported on first use
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+
+OVERVIEW_DATASETS = ['pipelines', 'commits', 'deployments']
+
+# Heatmap columns: (metric, label, +1 if higher is better, -1 if lower is better)
+HEATMAP_METRICS = [
+  ('success_rate', 'Success rate', 1),
+  ('mean_duration', 'Duration', -1),
+  ('coverage', 'Coverage', 1),
+  ('coverage_trend', 'Coverage trend', 1),
+  ('tests_trend', 'Tests trend', 1),
+  ('deployments_per_week', 'Deployments', 1),
+  ('commits_per_day', 'Commits', 1),
+]
+
+@profiling.timed('overview')
+def compute_overview(pipelines, commits, deployments, project_keys):
+  """Compute the metrics of all projects with one grouped pass per dataset
+
+  Returns a DataFrame indexed by project key.
+  """
+  overview = pd.DataFrame(index=pd.Index(project_keys, name='project'))
+
+  df = pd.DataFrame.from_records(pipelines, columns=['id', 'project_id', 'instance', 'project_name', 'status', 'duration', 'coverage', 'total_count'])
+  df['project'] = signals.project_keys(df)
+  df = df.sort_values(['project', 'id'])
+  df['success'] = (df['status'] == 'success').astype(float)
+  # Pipelines without details report no duration, leave them out of the mean
+  df['duration'] = df['duration'].where(df['duration'] > 0) / 60
+  by_project = df.groupby('project').agg(
+    project_name=('project_name', 'last'),
+    pipelines=('id', 'size'),
+    success_rate=('success', 'mean'),
+    mean_duration=('duration', 'mean'),
+    coverage=('coverage', 'last'),
+    first_coverage=('coverage', 'first'),
+    tests=('total_count', 'last'),
+    first_tests=('total_count', 'first'))
+  by_project['success_rate'] = 100 * by_project['success_rate']
+  by_project['coverage_trend'] = by_project['coverage'] - by_project.pop('first_coverage')
+  by_project['tests_trend'] = by_project['tests'] - by_project.pop('first_tests')
+  overview = overview.join(by_project)
+
+  deployments_by_project = signals.project_keys(pd.DataFrame.from_records(deployments, columns=['project_id', 'instance'])).value_counts()
+  commits_by_project = signals.project_keys(pd.DataFrame.from_records(commits, columns=['project_id', 'instance'])).value_counts()
+  overview['deployments_per_week'] = deployments_by_project.reindex(overview.index, fill_value=0) / (TIMESPAN_DAYS / 7)
+  overview['commits_per_day'] = commits_by_project.reindex(overview.index, fill_value=0) / TIMESPAN_DAYS
+
+  overview['pipelines'] = overview['pipelines'].fillna(0)
+  overview['project_name'] = overview['project_name'].fillna(pd.Series(overview.index.astype(str), index=overview.index))
+  return overview
+
+def __freshness_key():
+  # Changes whenever one of the datasets was collected again
+  freshness = signals.get_freshness()
+  return json.dumps({dataset: max((marker['updated_at'] for marker in freshness[dataset].values()), default=None)
+    for dataset in OVERVIEW_DATASETS}, sort_keys=True)
+
+def get_overview():
+  """Return the overview of all projects, computed once per dataset refresh"""
+  key = __freshness_key()
+  cached = cache.get('overview')
+  if cached is not None and cached['key'] == key:
+    return cached['overview']
+
+  overview = compute_overview(*[signals.get_dataset(dataset) for dataset in OVERVIEW_DATASETS],
+    [project['key'] for project in projects.get_projects()])
+  cache.set('overview', {'key': key, 'overview': overview}, timeout=3600)
+  return overview
+
+def __published_key():
+  # Reading the datasets collects them again once they expired, the overview is rendered after every refresh
+  [signals.get_dataset(dataset) for dataset in OVERVIEW_DATASETS]
+  return __freshness_key()
+
+def render_published():
+  """Render the overview of all projects with their DORA metrics and regressions for the published snapshot"""
+  overview = get_overview()
+  engine = signals.get_dora()
+  rows = overview.reset_index().replace({np.nan: None}).to_dict('records')
+  for row in rows:
+    row.update(engine.metrics(row['project'], days=30))
+    row['regressions'] = [regressions.describe(regression) for regression in signals.get_regressions(row['project'])]
+  rows.sort(key=lambda row: (row['success_rate'] is None, row['success_rate'] or 0))
+  return publisher.render_template('published/overview.html', rows=rows), rows
+
+@profiling.timed('figure')
+def render_heatmap(overview):
+  if len(overview) == 0:
+    return render_empty_plot_layout("Projects", 500)
+
+  overview = overview.sort_values('project_name', ascending=False)
+  metrics = [metric for metric, label, direction in HEATMAP_METRICS]
+  # Percentile rank per metric, so metrics with different units share one color scale
+  scores = overview[metrics].rank(pct=True)
+  for metric, label, direction in HEATMAP_METRICS:
+    if direction < 0:
+      scores[metric] = 1 - scores[metric]
+
+  height = max(500, 20 * len(overview) + 150)
+  return go.Figure(
+    data=[go.Heatmap(
+      z=scores.to_numpy(),
+      x=[label for metric, label, direction in HEATMAP_METRICS],
+      y=overview['project_name'],
+      customdata=overview[metrics].round(2).to_numpy(),
+      hovertemplate='%{y}<br>%{x}: %{customdata}<extra></extra>',
+      colorscale=[[0, 'rgb(227, 120, 104)'], [0.5, 'rgb(255, 235, 59)'], [1, 'rgb(76, 175, 80)']],
+      zmin=0,
+      zmax=1,
+      showscale=False)],
+    layout=go.Layout(
+      title=go.layout.Title(text="Projects"),
+      paper_bgcolor='rgba(0, 0, 0, 0)',
+      plot_bgcolor='rgba(0, 0, 0, 0)',
+      height=height
+    ))
+
+@profiling.timed('figure')
+def render_merge_request_sizes(store):
+  labels, counts = zip(*store.size_distribution())
+  if sum(counts) == 0:
+    return render_empty_plot_layout("Merge request size (files changed)", 400)
+  return go.Figure(
+    data=[go.Bar(x=labels, y=counts, marker_color='rgb(76, 175, 80)')],
+    layout=go.Layout(
+      title=go.layout.Title(text="Merge request size (files changed)"),
+      paper_bgcolor='rgba(0, 0, 0, 0)',
+      plot_bgcolor='rgba(0, 0, 0, 0)',
+      height=400
+    ))
+
+def register_callbacks():
+  """Register application callbacks"""
+  logger.info('Register overview callbacks')
+  publisher.register('overview', render_published, key=__published_key)
+
+  @app.callback(
+    [Output('overview-table', 'data'),
+     Output('overview-heatmap', 'figure')],
+    [Input('memory-{}'.format(dataset), 'modified_timestamp') for dataset in OVERVIEW_DATASETS])
+  def __render_overview(*timestamps):
+    # The datasets are read on the server, wait until the page loaded all of them
+    if None in timestamps:
+      raise PreventUpdate
+    overview = get_overview()
+    rows = overview.reset_index().replace({np.nan: None}).to_dict('records')
+    return rows, render_heatmap(overview)
+
+  @app.callback(
+    Output('dora-table', 'data'),
+    [Input('dora-window', 'value')] +
+    [Input('memory-{}'.format(dataset), 'modified_timestamp') for dataset in OVERVIEW_DATASETS])
+  def __render_dora(days, *timestamps):
+    if None in timestamps:
+      raise PreventUpdate
+    engine = signals.get_dora()
+    names = get_overview()['project_name']
+
+    rows = [dict(engine.metrics(days=days), project_name='All projects')]
+    for project in names.index:
+      rows.append(dict(engine.metrics(project, days=days), project_name=names[project]))
+    return rows
+
+  if settings.MERGE_REQUESTS_ENABLED:
+    @app.callback(
+      [Output('merge-request-table', 'data'),
+       Output('merge-request-sizes', 'figure')],
+      [Input('memory-pipelines', 'modified_timestamp')])
+    def __render_merge_requests(timestamp):
+      if timestamp is None:
+        raise PreventUpdate
+      store = signals.get_merge_requests()
+      names = get_overview()['project_name']
+
+      rows = [dict(store.metrics(), project_name='All projects')]
+      for project in names.index:
+        rows.append(dict(store.metrics(project), project_name=names[project]))
+      return rows, render_merge_request_sizes(store)
+
+  if settings.TEST_HISTORY_ENABLED:
+    @app.callback(
+      [Output('flaky-table', 'data'),
+       Output('slowest-table', 'data')],
+      [Input('memory-pipelines', 'modified_timestamp')])
+    def __render_tests(timestamp):
+      if timestamp is None:
+        raise PreventUpdate
+      history = signals.get_test_history()
+      names = get_overview()['project_name']
+      web_urls = {record_project(record): record['web_url'].rsplit('/-/pipelines/', 1)[0] for record in signals.get_dataset('pipelines')}
+
+      flaky = history.flaky()
+      for row in flaky:
+        row['last_failed_pipeline'] = '[#{0}]({1}/-/pipelines/{0})'.format(row['last_failed_pipeline'], web_urls.get(row['project'], ''))
+      rows = [flaky, history.slowest()]
+      for row in rows[0] + rows[1]:
+        row['project_name'] = names.get(row['project'], row['project'])
+      return rows
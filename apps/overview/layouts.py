@@ -0,0 +1,131 @@
+# Third party imports
+from dash import dash_table, dcc, html
+import dash_bootstrap_components as dbc
+
+# Local application imports
+from apps.dashboard.layouts import render_empty_plot_layout
+from modules import dora
+import settings
+
+COLUMNS = [
+  {'name': 'Project', 'id': 'project_name'},
+  {'name': 'Pipelines', 'id': 'pipelines', 'type': 'numeric'},
+  {'name': 'Success rate (%)', 'id': 'success_rate', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Mean duration (min)', 'id': 'mean_duration', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Coverage (%)', 'id': 'coverage', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+  {'name': 'Coverage trend', 'id': 'coverage_trend', 'type': 'numeric', 'format': {'specifier': '+.2f'}},
+  {'name': 'Tests', 'id': 'tests', 'type': 'numeric', 'format': {'specifier': '.0f'}},
+  {'name': 'Tests trend', 'id': 'tests_trend', 'type': 'numeric', 'format': {'specifier': '+.0f'}},
+  {'name': 'Deployments / week', 'id': 'deployments_per_week', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Commits / day', 'id': 'commits_per_day', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+]
+
+DORA_COLUMNS = [
+  {'name': 'Project', 'id': 'project_name'},
+  {'name': 'Deployments', 'id': 'deployments', 'type': 'numeric'},
+  {'name': 'Deployments / day', 'id': 'deployment_frequency', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+  {'name': 'Lead time (h)', 'id': 'lead_time_hours', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Change failure rate (%)', 'id': 'change_failure_rate', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Time to restore (h)', 'id': 'time_to_restore_hours', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+]
+
+MERGE_REQUEST_COLUMNS = [
+  {'name': 'Project', 'id': 'project_name'},
+  {'name': 'Merge requests', 'id': 'merge_requests', 'type': 'numeric'},
+  {'name': 'Open', 'id': 'opened', 'type': 'numeric'},
+  {'name': 'Merged', 'id': 'merged', 'type': 'numeric'},
+  {'name': 'First review (h, median)', 'id': 'review_time_median', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'First review (h, p90)', 'id': 'review_time_p90', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Merge (h, median)', 'id': 'merge_time_median', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Merge (h, p90)', 'id': 'merge_time_p90', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Review rounds', 'id': 'review_rounds', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Merged without review', 'id': 'unreviewed_merges', 'type': 'numeric'},
+]
+
+FLAKY_COLUMNS = [
+  {'name': 'Project', 'id': 'project_name'},
+  {'name': 'Suite', 'id': 'suite'},
+  {'name': 'Test', 'id': 'name'},
+  {'name': 'Runs', 'id': 'runs', 'type': 'numeric'},
+  {'name': 'Failures', 'id': 'failures', 'type': 'numeric'},
+  {'name': 'Flip rate (%)', 'id': 'flip_rate', 'type': 'numeric', 'format': {'specifier': '.1f'}},
+  {'name': 'Last failure', 'id': 'last_failed_pipeline', 'presentation': 'markdown'},
+]
+
+SLOWEST_COLUMNS = [
+  {'name': 'Project', 'id': 'project_name'},
+  {'name': 'Suite', 'id': 'suite'},
+  {'name': 'Test', 'id': 'name'},
+  {'name': 'Runs', 'id': 'runs', 'type': 'numeric'},
+  {'name': 'Mean duration (s)', 'id': 'mean_duration', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+  {'name': 'Max duration (s)', 'id': 'max_duration', 'type': 'numeric', 'format': {'specifier': '.2f'}},
+]
+
+def render_test_table(table_id, columns):
+  return dash_table.DataTable(
+    id=table_id,
+    columns=columns,
+    sort_action='native',
+    page_size=10,
+    style_header={'backgroundColor': '#1c2236', 'fontWeight': 'bold'},
+    style_cell={'backgroundColor': '#1d2338', 'color': '#fff', 'textAlign': 'left'},
+  )
+
+serve_layout = [
+  dbc.Row(dbc.Col(html.Div(html.H2('{} - Overview'.format(settings.APP_NAME))), width="auto")),
+
+  dcc.Loading(children=[
+    dash_table.DataTable(
+      id='overview-table',
+      columns=COLUMNS,
+      sort_action='native',
+      sort_by=[{'column_id': 'success_rate', 'direction': 'asc'}],
+      page_size=25,
+      style_header={'backgroundColor': '#1c2236', 'fontWeight': 'bold'},
+      style_cell={'backgroundColor': '#1d2338', 'color': '#fff', 'textAlign': 'left'},
+    )
+  ], type='default'),
+
+  dbc.Row([
+    dbc.Col(html.H4('Delivery (DORA)'), width="auto"),
+    dbc.Col(dbc.RadioItems(
+      id='dora-window',
+      options=[{'label': '{} days'.format(days), 'value': days} for days in dora.WINDOWS],
+      value=30,
+      inline=True), width="auto"),
+  ], align='center', className='mt-4'),
+
+  dash_table.DataTable(
+    id='dora-table',
+    columns=DORA_COLUMNS,
+    sort_action='native',
+    page_size=25,
+    style_header={'backgroundColor': '#1c2236', 'fontWeight': 'bold'},
+    style_cell={'backgroundColor': '#1d2338', 'color': '#fff', 'textAlign': 'left'},
+  ),
+
+  dcc.Loading(children=[
+    html.Div(dcc.Graph(
+      id='overview-heatmap',
+      figure=render_empty_plot_layout("Projects", 500)))
+  ], type='default'),
+]
+
+if settings.MERGE_REQUESTS_ENABLED:
+  serve_layout = serve_layout + [
+    dbc.Row(dbc.Col(html.H4('Merge requests'), width="auto"), className='mt-4'),
+    dcc.Loading(children=[render_test_table('merge-request-table', MERGE_REQUEST_COLUMNS)], type='default'),
+    dcc.Loading(children=[
+      html.Div(dcc.Graph(
+        id='merge-request-sizes',
+        figure=render_empty_plot_layout("Merge request size (files changed)", 400)))
+    ], type='default'),
+  ]
+
+if settings.TEST_HISTORY_ENABLED:
+  serve_layout = serve_layout + [
+    dbc.Row(dbc.Col(html.H4('Flaky tests'), width="auto"), className='mt-4'),
+    dcc.Loading(children=[render_test_table('flaky-table', FLAKY_COLUMNS)], type='default'),
+    dbc.Row(dbc.Col(html.H4('Slowest tests'), width="auto"), className='mt-4'),
+    dcc.Loading(children=[render_test_table('slowest-table', SLOWEST_COLUMNS)], type='default'),
+  ]
@@ -0,0 +1,38 @@
+# Standard library imports
+import logging
+from urllib.parse import quote
+
+# Third party imports
+from dash.dependencies import Input, Output
+from dash import html
+
+# Local application imports
+from app import app
+from modules import profiling
+
+logger = logging.getLogger(__name__)
+
+def register_callbacks():
+  """Register application callbacks"""
+  logger.info('Register profiling callbacks')
+
+  @app.callback(
+    [Output('profiling-summary', 'data'),
+     Output('profiling-summary', 'columns'),
+     Output('profiling-slow', 'children')],
+    [Input('profiling-refresh', 'n_clicks')])
+  def __render_report(n_clicks):
+    rows = profiling.summary()
+    names = []
+    [names.append(name) for row in rows for name in row if name not in names]
+    columns = [{'name': name, 'id': name, 'type': 'numeric', 'format': {'specifier': '.1f'}} if name != 'output'
+      else {'name': name, 'id': name} for name in names]
+
+    slow = [record for record in profiling.records() if 'profile' in record]
+    slow.sort(key=lambda record: record['total'], reverse=True)
+    items = [html.Li([
+      html.A(record['output'], href='/profiling/stats?path={}'.format(quote(record['profile']))),
+      ' {:.0f} ms, {} bytes, triggered by {}'.format(1000 * record['total'], record['response_bytes'], ', '.join(record['triggered']))
+    ]) for record in slow[:50]]
+
+    return rows, columns, html.Ul(items)
@@ -0,0 +1,25 @@
+# Third party imports
+from dash import dash_table, html
+import dash_bootstrap_components as dbc
+
+# Local application imports
+import settings
+
+serve_layout = [
+  dbc.Row([
+    dbc.Col(html.Div(html.H2('{} - Callback profiling'.format(settings.APP_NAME))), width="auto"),
+    dbc.Col(dbc.Button('Refresh', id='profiling-refresh', color='info', size='sm', className='mr-1'), width="auto"),
+    dbc.Col(html.A(dbc.Button('Download dump', color='secondary', size='sm'), href='/profiling/dump'), width="auto"),
+  ], align='center'),
+
+  dash_table.DataTable(
+    id='profiling-summary',
+    sort_action='native',
+    sort_by=[{'column_id': 'mean_ms', 'direction': 'desc'}],
+    style_header={'backgroundColor': '#1c2236', 'fontWeight': 'bold'},
+    style_cell={'backgroundColor': '#1d2338', 'color': '#fff', 'textAlign': 'left'},
+  ),
+
+  html.H4('Slow invocations', className='mt-4'),
+  html.Div(id='profiling-slow'),
+]
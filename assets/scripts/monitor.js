@@ -0,0 +1,70 @@
+// Build monitor cards in the browser from the compact status records of apps/monitor/callbacks.py
+
+(function() {
+  var COLORS = {success: 'success', running: 'warning', failed: 'danger'};
+  var CENTER = {textAlign: 'center'};
+
+  function component(namespace, type, props) {
+    return {namespace: namespace, type: type, props: props};
+  }
+
+  function html(type, props) {
+    return component('dash_html_components', type, props);
+  }
+
+  function dbc(type, props) {
+    return component('dash_bootstrap_components', type, props);
+  }
+
+  // Same format as Python's str(timedelta(seconds=...))
+  function duration(seconds) {
+    seconds = Math.floor(seconds || 0);
+    var days = Math.floor(seconds / 86400);
+    var rest = seconds % 86400;
+    var pad = function(value) { return value < 10 ? '0' + value : '' + value; };
+    var time = Math.floor(rest / 3600) + ':' + pad(Math.floor(rest % 3600 / 60)) + ':' + pad(rest % 60);
+    if (days > 0) {
+      return days + (days === 1 ? ' day, ' : ' days, ') + time;
+    }
+    return time;
+  }
+
+  function emptyCard() {
+    return [dbc('CardBody', {children: [
+      html('H2', {children: 'No matching data found', className: 'mb-2', style: CENTER})
+    ]})];
+  }
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    monitor: {
+      render_card: function(status) {
+        if (!status) {
+          return [[], 'secondary', {display: 'none'}];
+        }
+        if (status.empty) {
+          return [emptyCard(), 'secondary', {}];
+        }
+
+        var children = [
+          dbc('CardHeader', {children: status.name}),
+          dbc('CardBody', {children: [
+            html('H2', {children: status.status.toUpperCase(), className: 'mb-2', style: CENTER}),
+            html('Div', {children: duration(status.duration), className: 'mb-2', style: CENTER}),
+            html('Div', {children: status.jobs, className: 'mb-2', style: CENTER}),
+            html('Span', {children: [
+              dbc('Button', {
+                children: 'Coverage: ' + Number(status.coverage || 0).toFixed(2) + ' %',
+                color: 'dark', size: 'sm', className: 'mr-1', outline: true
+              })
+            ]}),
+            html('Div', {children: (status.regressions || []).map(function(regression) {
+              return dbc('Badge', {children: 'regression: ' + regression, color: 'danger', className: 'mr-1'});
+            }), className: 'mt-2'})
+          ]}),
+          dbc('CardFooter', {children: status.project_id + ' (' + status.ref_name + ')'})
+        ];
+        return [children, COLORS[status.status] || 'secondary', {}];
+      }
+    }
+  });
+})();
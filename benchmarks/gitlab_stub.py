@@ -0,0 +1,768 @@
+"""Offline GitLab API stand-in
+
+Serves deterministic, generated data for every endpoint used by modules/gitlab.py,
+with configurable size, page size limits, latency, error rate and rate limiting.
+Request counts per endpoint template are served on /__stats (reset via /__reset).
+
+  $ python -m benchmarks.gitlab_stub --projects 100 --pipelines 20 --port 8081
+"""
+
+# Standard library imports
+import argparse
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/v4'
+
+DEFAULT_CONFIG = {
+  'projects': 10,               # Number of projects (ids 1..n)
+  'project_offset': 0,          # Added to the project ids, e.g. for a second instance
+  'group_id': 1,
+  'subgroups': 0,               # Projects are spread over this many subgroups
+  'pipelines': 20,              # Pipelines per project
+  'commits': 30,                # Commits per project
+  'deployments': 10,            # Deployments per project
+  'merge_requests': 20,         # Merge requests per project
+  'milestones': 6,              # Sprint milestones of the group
+  'issues': 40,                 # Issues per milestone
+  'jobs': 6,                    # Jobs per pipeline
+  'suite_size': 50,             # Test cases per test suite
+  'flaky_cases': 10,            # Test cases of every project that fail now and then
+  'history_days': 30,           # Timestamps are spread over this many days
+  'max_page_size': 100,         # Upper bound for per_page
+  'latency': 0.0,               # Seconds added to every response
+  'latency_jitter': 0.0,        # Random extra seconds (uniform)
+  'error_rate': 0.0,            # Share of requests answered with 500
+  'rate_limit': 0,              # Requests per rate limit window, 0 disables limiting
+  'rate_limit_window': 60,      # Seconds
+  'enforce_rate_limit': False,  # Answer with 429 when the limit is exceeded
+  'version': '15.8.0',
+  'seed': 42,
+  'now': '',                    # Fixed reference time (ISO 8601) for reproducible data, default is the start time
+}
+
+def _iso(value):
+  return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def _parse_time(value):
+  value = value.replace('Z', '+00:00')
+  parsed = datetime.fromisoformat(value)
+  if parsed.tzinfo is None:
+    parsed = parsed.astimezone()
+  return parsed
+
+class GitLabData():
+  """Deterministic data set, generated lazily per project"""
+
+  def __init__(self, config):
+    self.config = config
+    self.now = _parse_time(config['now']) if config['now'] else datetime.now(timezone.utc)
+    self.__projects = {}
+    self.__group = None
+    self.__lock = threading.Lock()
+
+  def __random(self, *key):
+    return random.Random('{}-{}'.format(self.config['seed'], '-'.join(str(k) for k in key)))
+
+  def __timestamp(self, rnd):
+    return self.now - timedelta(seconds=rnd.uniform(0, self.config['history_days'] * 86400))
+
+  def project_ids(self):
+    return list(range(self.config['project_offset'] + 1, self.config['project_offset'] + self.config['projects'] + 1))
+
+  def project(self, project_id):
+    if project_id not in range(self.config['project_offset'] + 1, self.config['project_offset'] + self.config['projects'] + 1):
+      return None
+    with self.__lock:
+      if project_id not in self.__projects:
+        self.__projects[project_id] = self.__generate_project(project_id)
+      return self.__projects[project_id]
+
+  def namespace_id(self, project_id):
+    if self.config['subgroups'] == 0:
+      return self.config['group_id']
+    return self.config['group_id'] * 100 + project_id % self.config['subgroups'] + 1
+
+  def project_summary(self, project_id):
+    """Project attributes only, cheap enough for listing hundreds of projects"""
+    return self.__project_summary(project_id, self.__random('project', project_id))
+
+  def __project_summary(self, project_id, rnd):
+    return {
+      'id': project_id,
+      'name': 'project-{}'.format(project_id),
+      'path_with_namespace': 'group/project-{}'.format(project_id),
+      'default_branch': 'master',
+      'namespace': {'id': self.namespace_id(project_id), 'kind': 'group'},
+      'web_url': 'https://gitlab.example.com/group/project-{}'.format(project_id),
+      'last_activity_at': _iso(self.__timestamp(rnd)),
+    }
+
+  def __generate_project(self, project_id):
+    rnd = self.__random('project', project_id)
+    project = self.__project_summary(project_id, rnd)
+
+    commits = []
+    for index in range(self.config['commits']):
+      created = self.__timestamp(rnd)
+      sha = '{:040x}'.format(rnd.getrandbits(160))
+      commits.append({
+        'id': sha,
+        'short_id': sha[:8],
+        'title': 'Commit {}'.format(index),
+        'message': 'Commit {}'.format(index),
+        'author_name': 'Developer {}'.format(rnd.randint(1, 8)),
+        'author_email': 'dev@example.com',
+        'created_at': _iso(created),
+        'committed_date': _iso(created),
+        '_created': created,
+      })
+    commits.sort(key=lambda commit: commit['_created'], reverse=True)
+
+    pipelines = []
+    details = {}
+    for index in range(self.config['pipelines']):
+      created = self.__timestamp(rnd)
+      duration = rnd.randint(120, 1800)
+      status = rnd.choices(['success', 'failed', 'canceled', 'running'], [80, 14, 3, 3])[0]
+      pipeline_id = project_id * 100000 + index + 1
+      pipeline = {
+        'id': pipeline_id,
+        'iid': index + 1,
+        'project_id': project_id,
+        'sha': commits[rnd.randrange(len(commits))]['id'] if commits else '{:040x}'.format(pipeline_id),
+        'ref': 'master',
+        'status': status,
+        'source': 'push',
+        'created_at': _iso(created),
+        'updated_at': _iso(created + timedelta(seconds=duration)),
+        'web_url': '{}/-/pipelines/{}'.format(project['web_url'], pipeline_id),
+        '_updated': created + timedelta(seconds=duration),
+      }
+      pipelines.append(pipeline)
+      total = rnd.randint(200, 2000)
+      failed = rnd.randint(1, 10) if status == 'failed' else 0
+      skipped = rnd.randint(0, 20)
+      details[pipeline_id] = {
+        'coverage': None if rnd.random() < 0.05 else '{:.2f}'.format(rnd.uniform(50, 95)),
+        'duration': None if status == 'running' else duration,
+        'queued_duration': rnd.uniform(0, 120),
+        'started_at': _iso(created),
+        'finished_at': None if status == 'running' else _iso(created + timedelta(seconds=duration)),
+        'test_report': {
+          'time': rnd.uniform(30, 600),
+          'count': total,
+          'success': total - failed - skipped,
+          'failed': failed,
+          'skipped': skipped,
+          'error': 0,
+        },
+      }
+    pipelines.sort(key=lambda pipeline: pipeline['id'], reverse=True)
+
+    deployments = []
+    for index in range(self.config['deployments']):
+      created = self.__timestamp(rnd)
+      environment = rnd.choice(['staging', 'staging', 'production'])
+      deployments.append({
+        'id': project_id * 100000 + index + 1,
+        'iid': index + 1,
+        'ref': 'master',
+        'sha': commits[rnd.randrange(len(commits))]['id'] if commits else '',
+        'created_at': _iso(created),
+        'updated_at': _iso(created),
+        'status': 'success',
+        'environment': {'id': 1 if environment == 'staging' else 2, 'name': environment},
+        '_updated': created,
+      })
+    deployments.sort(key=lambda deployment: deployment['id'], reverse=True)
+
+    merge_requests, notes = self.__generate_merge_requests(project_id, project)
+    return {'project': project, 'commits': commits, 'pipelines': pipelines, 'details': details, 'deployments': deployments,
+      'merge_requests': merge_requests, 'notes': notes}
+
+  def __generate_merge_requests(self, project_id, project):
+    """Merge requests with review notes, drawn from a random sequence of their own"""
+    rnd = self.__random('merge-requests', project_id)
+    merge_requests = []
+    notes = {}
+    for index in range(self.config['merge_requests']):
+      iid = index + 1
+      author = rnd.randint(1, 8)
+      created = self.__timestamp(rnd)
+      events = []
+      at = created
+      # Review rounds: a reviewer comments or approves, the author pushes fixes
+      for review_round in range(rnd.choice([0, 1, 1, 1, 2, 2, 3, 4])):
+        at = at + timedelta(hours=rnd.lognormvariate(1, 1.2))
+        reviewer = rnd.choice([user for user in range(1, 9) if user != author])
+        events.append((at, reviewer, False, 'Please have a look at this'))
+        at = at + timedelta(hours=rnd.lognormvariate(0.5, 1))
+        events.append((at, author, True, 'added {} commit'.format(rnd.randint(1, 3))))
+      state = 'opened'
+      merged = None
+      if len(events) > 0 and rnd.random() < 0.8:
+        at = at + timedelta(hours=rnd.lognormvariate(0, 1))
+        events.append((at, rnd.choice([user for user in range(1, 9) if user != author]), True, 'approved this merge request'))
+        merged = at + timedelta(minutes=rnd.uniform(1, 120))
+        state = 'merged'
+      elif rnd.random() < 0.1:
+        state = 'closed'
+      updated = max([created] + [event[0] for event in events] + ([merged] if merged else []))
+      if updated > self.now:
+        state, merged = 'opened', None
+        events = [event for event in events if event[0] <= self.now]
+        updated = max([created] + [event[0] for event in events])
+      merge_requests.append({
+        'id': project_id * 100000 + iid,
+        'iid': iid,
+        'project_id': project_id,
+        'title': 'Merge request {}'.format(iid),
+        'state': state,
+        'author': {'id': author, 'username': 'developer{}'.format(author)},
+        'created_at': _iso(created),
+        'updated_at': _iso(updated),
+        'merged_at': _iso(merged) if merged else None,
+        'web_url': '{}/-/merge_requests/{}'.format(project['web_url'], iid),
+        '_updated': updated,
+        '_changes_count': str(int(rnd.lognormvariate(1.5, 1.2)) + 1),
+      })
+      notes[iid] = [{
+        'id': project_id * 10000000 + iid * 100 + number,
+        'body': body,
+        'author': {'id': user, 'username': 'developer{}'.format(user)},
+        'system': system,
+        'created_at': _iso(at),
+      } for number, (at, user, system, body) in enumerate(events)]
+    merge_requests.sort(key=lambda merge_request: merge_request['_updated'])
+    return merge_requests, notes
+
+  def test_report(self, project_id, pipeline_id, summary):
+    """Full test report matching the summary, test case names and durations are stable per project"""
+    rnd = self.__random('test-report', pipeline_id)
+    names = rnd.sample(range(min(self.config['flaky_cases'], summary['count'])), min(summary['failed'], self.config['flaky_cases'], summary['count']))
+    failed = set(names + list(range(summary['count'] - (summary['failed'] - len(names)), summary['count'])))
+    skipped = set(range(summary['count'] - summary['failed'] - summary['skipped'], summary['count'] - summary['failed'])) - failed
+    suites = {}
+    for index in range(summary['count']):
+      base = self.__random('test-case', project_id, index).lognormvariate(-3, 1.5)
+      status = 'failed' if index in failed else 'skipped' if index in skipped else 'success'
+      suites.setdefault(index // self.config['suite_size'], []).append({
+        'status': status,
+        'name': 'test_{}'.format(index),
+        'classname': 'tests.suite_{}.TestCase'.format(index // self.config['suite_size']),
+        'execution_time': 0.0 if status == 'skipped' else round(base * rnd.uniform(0.8, 1.25), 4),
+        'system_output': 'AssertionError' if status == 'failed' else None,
+        'stack_trace': None,
+      })
+    return {
+      'total_time': summary['time'],
+      'total_count': summary['count'],
+      'success_count': summary['success'],
+      'failed_count': summary['failed'],
+      'skipped_count': summary['skipped'],
+      'error_count': summary['error'],
+      'test_suites': [{
+        'name': 'suite_{}'.format(suite),
+        'total_time': round(sum(case['execution_time'] for case in cases), 4),
+        'total_count': len(cases),
+        'success_count': sum(1 for case in cases if case['status'] == 'success'),
+        'failed_count': sum(1 for case in cases if case['status'] == 'failed'),
+        'skipped_count': sum(1 for case in cases if case['status'] == 'skipped'),
+        'error_count': 0,
+        'test_cases': cases,
+      } for suite, cases in suites.items()],
+    }
+
+  def group(self):
+    with self.__lock:
+      if self.__group is None:
+        self.__group = self.__generate_group()
+      return self.__group
+
+  def __generate_group(self):
+    rnd = self.__random('group')
+    milestones = []
+    issues = []
+    count = self.config['milestones']
+    for index in range(count):
+      # Two week sprints, the last one is active
+      start = (self.now - timedelta(days=14 * (count - index - 1) + 7)).date()
+      due = start + timedelta(days=13)
+      milestone = {
+        'id': index + 1,
+        'iid': index + 1,
+        'group_id': self.config['group_id'],
+        'title': 'Sprint {:02d}'.format(index + 1),
+        'state': 'active' if index == count - 1 else 'closed',
+        'start_date': start.isoformat(),
+        'due_date': due.isoformat(),
+      }
+      milestones.append(milestone)
+      for issue_index in range(self.config['issues']):
+        created = datetime.combine(start, datetime.min.time(), timezone.utc) + timedelta(hours=rnd.uniform(-72, 300))
+        updated = created + timedelta(hours=rnd.uniform(0, 200))
+        labels = ['Bug::{}'.format(rnd.choice(['critical', 'major', 'minor', 'trivial']))] if rnd.random() < 0.15 else []
+        issues.append({
+          'id': index * 10000 + issue_index + 1,
+          'iid': index * 10000 + issue_index + 1,
+          'project_id': self.config['project_offset'] + rnd.randint(1, max(1, self.config['projects'])),
+          'title': 'Issue {}'.format(issue_index),
+          'state': 'closed' if milestone['state'] == 'closed' or rnd.random() < 0.5 else 'opened',
+          'created_at': _iso(created),
+          'updated_at': _iso(updated),
+          'closed_at': None,
+          'labels': labels,
+          'weight': rnd.choice([None, 1, 2, 3, 5, 8]),
+          'milestone': dict(milestone),
+          '_created': created,
+        })
+    return {'milestones': milestones, 'issues': issues, 'by_iid': {issue['iid']: issue for issue in issues}}
+
+  def issue_events(self, iid):
+    """Resource state, weight and milestone events of an issue, none after now"""
+    issue = self.group()['by_iid'].get(iid)
+    if issue is None:
+      return None
+    rnd = self.__random('issue-events', iid)
+    created, updated = issue['_created'], _parse_time(issue['updated_at'])
+    retval = {'state': [], 'weight': [], 'milestone': []}
+    def event(event_type, at, **fields):
+      if at <= self.now:
+        retval[event_type].append(dict(fields, id=iid * 10 + sum(len(events) for events in retval.values()) + 1,
+          created_at=_iso(at), resource_type='Issue', resource_id=issue['id']))
+    # Some issues are planned into the sprint after they were created, some are estimated later
+    event('milestone', created + timedelta(hours=rnd.uniform(0, 48)) if rnd.random() < 0.3 else created,
+      action='add', milestone={key: issue['milestone'][key] for key in ('id', 'iid', 'title')})
+    if issue['weight'] is not None:
+      if rnd.random() < 0.3:
+        event('weight', created, weight=rnd.choice([1, 2, 3]))
+      event('weight', created + timedelta(hours=rnd.uniform(0, 24)), weight=issue['weight'])
+    if issue['state'] == 'closed':
+      if rnd.random() < 0.1:
+        closed = created + (updated - created) / 2
+        event('state', closed, state='closed')
+        event('state', closed + timedelta(hours=2), state='reopened')
+      event('state', updated, state='closed')
+    return retval
+
+def _public(record):
+  return {key: value for key, value in record.items() if not key.startswith('_')}
+
+class GitLabStub():
+  """Threaded HTTP server answering GitLab API v4 requests from generated data"""
+
+  def __init__(self, host='127.0.0.1', port=0, **config):
+    self.config = dict(DEFAULT_CONFIG, **config)
+    self.data = GitLabData(self.config)
+    self.__stats_lock = threading.Lock()
+    self.__requests = {}
+    self.__window = (time.monotonic(), 0)
+    self.__random = random.Random(self.config['seed'])
+    self.__routes = [
+      (re.compile(r'^/version$'), self.__version),
+      (re.compile(r'^/groups/(\d+)$'), self.__group),
+      (re.compile(r'^/groups/(\d+)/milestones$'), self.__milestones),
+      (re.compile(r'^/groups/(\d+)/issues$'), self.__issues),
+      (re.compile(r'^/groups/(\d+)/projects$'), self.__group_projects),
+      (re.compile(r'^/projects/(\d+)$'), self.__project),
+      (re.compile(r'^/projects/(\d+)/repository/commits$'), self.__commits),
+      (re.compile(r'^/projects/(\d+)/deployments$'), self.__deployments),
+      (re.compile(r'^/projects/(\d+)/pipelines$'), self.__pipelines),
+      (re.compile(r'^/projects/(\d+)/issues/(\d+)/resource_(state|weight|milestone)_events$'), self.__issue_events),
+      (re.compile(r'^/projects/(\d+)/merge_requests$'), self.__merge_requests),
+      (re.compile(r'^/projects/(\d+)/merge_requests/(\d+)$'), self.__merge_request),
+      (re.compile(r'^/projects/(\d+)/merge_requests/(\d+)/notes$'), self.__merge_request_notes),
+      (re.compile(r'^/projects/(\d+)/pipelines/(\d+)$'), self.__pipeline),
+      (re.compile(r'^/projects/(\d+)/pipelines/(\d+)/jobs$'), self.__jobs),
+      (re.compile(r'^/projects/(\d+)/pipelines/(\d+)/test_report_summary$'), self.__test_report_summary),
+      (re.compile(r'^/projects/(\d+)/pipelines/(\d+)/test_report$'), self.__test_report),
+      (re.compile(r'^/api/graphql$'), self.__graphql),
+    ]
+    self.server = ThreadingHTTPServer((host, port), self.__handler())
+    self.server.daemon_threads = True
+    self.__thread = None
+
+  @property
+  def url(self):
+    host, port = self.server.server_address[:2]
+    return 'http://{}:{}{}'.format(host, port, API_PREFIX)
+
+  def start(self):
+    self.__thread = threading.Thread(target=self.server.serve_forever, name='gitlab-stub', daemon=True)
+    self.__thread.start()
+    return self
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def stats(self):
+    """Return request counts per endpoint template"""
+    with self.__stats_lock:
+      return dict(self.__requests)
+
+  def reset_stats(self):
+    with self.__stats_lock:
+      self.__requests = {}
+
+  ##########################################################
+
+  def __handler(self):
+    stub = self
+
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+      # Headers and body are written separately, avoid delayed ACK stalls on keep-alive connections
+      disable_nagle_algorithm = True
+
+      def do_GET(self):
+        stub.handle(self, 'GET')
+
+      def do_POST(self):
+        stub.handle(self, 'POST')
+
+      def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    return Handler
+
+  def __count(self, template):
+    with self.__stats_lock:
+      self.__requests[template] = self.__requests.get(template, 0) + 1
+      started, count = self.__window
+      now = time.monotonic()
+      if now - started >= self.config['rate_limit_window']:
+        started, count = now, 0
+      count = count + 1
+      self.__window = (started, count)
+      return started, count
+
+  def handle(self, request, method):
+    url = urlsplit(request.path)
+    if url.path == '/__stats':
+      return self.__respond(request, 200, self.stats(), {})
+    if url.path == '/__reset':
+      self.reset_stats()
+      return self.__respond(request, 200, {}, {})
+
+    path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+    query = {key: values[0] if len(values) == 1 else values for key, values in parse_qs(url.query).items()}
+    body = None
+    if method == 'POST':
+      length = int(request.headers.get('Content-Length', 0))
+      body = json.loads(request.rfile.read(length) or b'{}')
+
+    if self.config['latency'] or self.config['latency_jitter']:
+      time.sleep(self.config['latency'] + self.__random.uniform(0, self.config['latency_jitter']))
+
+    for pattern, view in self.__routes:
+      match = pattern.match(path)
+      if match is None:
+        continue
+      template = pattern.pattern.replace(r'(\d+)', ':id').strip('^$')
+      started, count = self.__count(template)
+      headers = {}
+      if self.config['rate_limit']:
+        reset = int(time.time() + self.config['rate_limit_window'] - (time.monotonic() - started))
+        headers['RateLimit-Limit'] = str(self.config['rate_limit'])
+        headers['RateLimit-Remaining'] = str(max(0, self.config['rate_limit'] - count))
+        headers['RateLimit-Reset'] = str(reset)
+        if self.config['enforce_rate_limit'] and count > self.config['rate_limit']:
+          headers['Retry-After'] = str(max(1, reset - int(time.time())))
+          return self.__respond(request, 429, {'message': '429 Too Many Requests'}, headers)
+      if self.__random.random() < self.config['error_rate']:
+        return self.__respond(request, 500, {'message': '500 Internal Server Error'}, headers)
+      status, payload, extra = view(query, body, *[int(group) if group.isdigit() else group for group in match.groups()])
+      headers.update(extra)
+      return self.__respond(request, status, payload, headers)
+
+    self.__count('unknown')
+    return self.__respond(request, 404, {'message': '404 Not Found'}, {})
+
+  def __respond(self, request, status, payload, headers):
+    data = json.dumps(payload).encode('utf-8')
+    request.send_response(status)
+    request.send_header('Content-Type', 'application/json')
+    request.send_header('Content-Length', str(len(data)))
+    for key, value in headers.items():
+      request.send_header(key, value)
+    request.end_headers()
+    request.wfile.write(data)
+
+  def __paginate(self, query, records):
+    per_page = min(int(query.get('per_page', 20)), self.config['max_page_size'])
+    page = max(1, int(query.get('page', 1)))
+    total_pages = max(1, (len(records) + per_page - 1) // per_page)
+    items = [_public(record) for record in records[(page - 1) * per_page:page * per_page]]
+    headers = {
+      'X-Page': str(page),
+      'X-Per-Page': str(per_page),
+      'X-Total': str(len(records)),
+      'X-Total-Pages': str(total_pages),
+      'X-Next-Page': str(page + 1) if page < total_pages else '',
+    }
+    return 200, items, headers
+
+  def __not_found(self):
+    return 404, {'message': '404 Project Not Found'}, {}
+
+  ##########################################################
+
+  def __version(self, query, body):
+    return 200, {'version': self.config['version'], 'revision': 'stub'}, {}
+
+  def __group(self, query, body, group_id):
+    return 200, {'id': group_id, 'name': 'Group {}'.format(group_id), 'full_path': 'group'}, {}
+
+  def __milestones(self, query, body, group_id):
+    milestones = self.data.group()['milestones']
+    if 'search' in query:
+      milestones = [milestone for milestone in milestones if query['search'].lower() in milestone['title'].lower()]
+    if 'state' in query:
+      milestones = [milestone for milestone in milestones if milestone['state'] == query['state']]
+    return self.__paginate(query, milestones)
+
+  def __issues(self, query, body, group_id):
+    issues = self.data.group()['issues']
+    if 'milestone' in query:
+      issues = [issue for issue in issues if issue['milestone']['title'] == query['milestone']]
+    if 'created_after' in query:
+      created_after = _parse_time(query['created_after'])
+      issues = [issue for issue in issues if issue['_created'] >= created_after]
+    if 'created_before' in query:
+      created_before = _parse_time(query['created_before'])
+      issues = [issue for issue in issues if issue['_created'] <= created_before]
+    if 'updated_after' in query:
+      updated_after = _parse_time(query['updated_after'])
+      issues = [issue for issue in issues if _parse_time(issue['updated_at']) >= updated_after]
+    if query.get('order_by') == 'updated_at':
+      issues = sorted(issues, key=lambda issue: issue['updated_at'], reverse=query.get('sort', 'desc') == 'desc')
+    return self.__paginate(query, issues)
+
+  def __issue_events(self, query, body, project_id, iid, event_type):
+    events = self.data.issue_events(iid)
+    if events is None:
+      return self.__not_found()
+    return self.__paginate(query, events[event_type])
+
+  def __group_projects(self, query, body, group_id):
+    projects = [self.data.project_summary(project_id) for project_id in self.data.project_ids()]
+    if query.get('include_subgroups') != 'true':
+      projects = [project for project in projects if project['namespace']['id'] == group_id]
+    return self.__paginate(query, projects)
+
+  def __project(self, query, body, project_id):
+    data = self.data.project(project_id)
+    if data is None:
+      return self.__not_found()
+    return 200, data['project'], {}
+
+  def __commits(self, query, body, project_id):
+    data = self.data.project(project_id)
+    if data is None:
+      return self.__not_found()
+    commits = data['commits']
+    if 'since' in query:
+      since = _parse_time(query['since'])
+      commits = [commit for commit in commits if commit['_created'] >= since]
+    if 'until' in query:
+      until = _parse_time(query['until'])
+      commits = [commit for commit in commits if commit['_created'] <= until]
+    return self.__paginate(query, commits)
+
+  def __deployments(self, query, body, project_id):
+    data = self.data.project(project_id)
+    if data is None:
+      return self.__not_found()
+    deployments = data['deployments']
+    if 'updated_after' in query:
+      updated_after = _parse_time(query['updated_after'])
+      deployments = [deployment for deployment in deployments if deployment['_updated'] >= updated_after]
+    if 'updated_before' in query:
+      updated_before = _parse_time(query['updated_before'])
+      deployments = [deployment for deployment in deployments if deployment['_updated'] <= updated_before]
+    return self.__paginate(query, deployments)
+
+  def __pipelines(self, query, body, project_id):
+    data = self.data.project(project_id)
+    if data is None:
+      return self.__not_found()
+    pipelines = data['pipelines']
+    if 'ref' in query:
+      pipelines = [pipeline for pipeline in pipelines if pipeline['ref'] == query['ref']]
+    if query.get('scope') == 'finished':
+      pipelines = [pipeline for pipeline in pipelines if pipeline['status'] in ('success', 'failed', 'canceled', 'skipped')]
+    if 'status' in query:
+      pipelines = [pipeline for pipeline in pipelines if pipeline['status'] == query['status']]
+    if 'updated_after' in query:
+      updated_after = _parse_time(query['updated_after'])
+      pipelines = [pipeline for pipeline in pipelines if pipeline['_updated'] >= updated_after]
+    if 'updated_before' in query:
+      updated_before = _parse_time(query['updated_before'])
+      pipelines = [pipeline for pipeline in pipelines if pipeline['_updated'] <= updated_before]
+    return self.__paginate(query, pipelines)
+
+  def __merge_requests(self, query, body, project_id):
+    data = self.data.project(project_id)
+    if data is None:
+      return self.__not_found()
+    merge_requests = data['merge_requests']
+    if query.get('state', 'all') != 'all':
+      merge_requests = [merge_request for merge_request in merge_requests if merge_request['state'] == query['state']]
+    if 'updated_after' in query:
+      updated_after = _parse_time(query['updated_after'])
+      merge_requests = [merge_request for merge_request in merge_requests if merge_request['_updated'] >= updated_after]
+    if 'updated_before' in query:
+      updated_before = _parse_time(query['updated_before'])
+      merge_requests = [merge_request for merge_request in merge_requests if merge_request['_updated'] <= updated_before]
+    if query.get('sort', 'desc') == 'desc':
+      merge_requests = list(reversed(merge_requests))
+    return self.__paginate(query, merge_requests)
+
+  def __merge_request(self, query, body, project_id, iid):
+    data = self.data.project(project_id)
+    if data is None or not 1 <= iid <= len(data['merge_requests']):
+      return self.__not_found()
+    merge_request = next(merge_request for merge_request in data['merge_requests'] if merge_request['iid'] == iid)
+    return 200, dict(_public(merge_request), changes_count=merge_request['_changes_count']), {}
+
+  def __merge_request_notes(self, query, body, project_id, iid):
+    data = self.data.project(project_id)
+    if data is None or iid not in data['notes']:
+      return self.__not_found()
+    notes = data['notes'][iid]
+    if query.get('sort', 'desc') == 'desc':
+      notes = list(reversed(notes))
+    return self.__paginate(query, notes)
+
+  def __pipeline_detail(self, project_id, pipeline_id):
+    data = self.data.project(project_id)
+    if data is None or pipeline_id not in data['details']:
+      return None, None
+    pipeline = next(pipeline for pipeline in data['pipelines'] if pipeline['id'] == pipeline_id)
+    return pipeline, data['details'][pipeline_id]
+
+  def __pipeline(self, query, body, project_id, pipeline_id):
+    pipeline, detail = self.__pipeline_detail(project_id, pipeline_id)
+    if pipeline is None:
+      return self.__not_found()
+    retval = dict(_public(pipeline), **{key: value for key, value in detail.items() if key != 'test_report'})
+    return 200, retval, {}
+
+  def __jobs(self, query, body, project_id, pipeline_id):
+    pipeline, detail = self.__pipeline_detail(project_id, pipeline_id)
+    if pipeline is None:
+      return self.__not_found()
+    rnd = random.Random('{}-jobs-{}'.format(self.config['seed'], pipeline_id))
+    scopes = query.get('scope[]', [])
+    scopes = [scopes] if isinstance(scopes, str) else scopes
+    jobs = []
+    for index in range(self.config['jobs']):
+      status = pipeline['status'] if index == self.config['jobs'] - 1 else 'success'
+      if pipeline['status'] == 'running' and index >= self.config['jobs'] // 2:
+        status = rnd.choice(['running', 'pending'])
+      jobs.append({'id': pipeline_id * 100 + index, 'name': 'job-{}'.format(index), 'stage': 'stage-{}'.format(index // 2), 'status': status})
+    if scopes:
+      jobs = [job for job in jobs if job['status'] in scopes]
+    return self.__paginate(query, jobs)
+
+  def __test_report_summary(self, query, body, project_id, pipeline_id):
+    pipeline, detail = self.__pipeline_detail(project_id, pipeline_id)
+    if pipeline is None:
+      return self.__not_found()
+    return 200, {'total': detail['test_report'], 'test_suites': []}, {}
+
+  def __test_report(self, query, body, project_id, pipeline_id):
+    pipeline, detail = self.__pipeline_detail(project_id, pipeline_id)
+    if pipeline is None:
+      return self.__not_found()
+    return 200, self.data.test_report(project_id, pipeline_id, detail['test_report']), {}
+
+  ##########################################################
+  ## GraphQL, only the pipelines query of modules/graphql.py is understood
+
+  def __graphql_time(self, value):
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+  def __graphql_pipeline(self, pipeline, detail):
+    return {
+      'id': 'gid://gitlab/Ci::Pipeline/{}'.format(pipeline['id']),
+      'iid': str(pipeline['iid']),
+      'sha': pipeline['sha'],
+      'ref': pipeline['ref'],
+      'status': pipeline['status'].upper(),
+      'source': pipeline['source'],
+      'createdAt': self.__graphql_time(_parse_time(pipeline['created_at'])),
+      'updatedAt': self.__graphql_time(pipeline['_updated']),
+      'duration': detail['duration'],
+      'queuedDuration': detail['queued_duration'],
+      'coverage': float(detail['coverage']) if detail['coverage'] is not None else None,
+      'testReportSummary': {'total': detail['test_report']},
+    }
+
+  def __graphql(self, query, body):
+    variables = body.get('variables') or {}
+    ids = [int(gid.rsplit('/', 1)[1]) for gid in variables.get('ids') or []]
+    first = min(int(variables.get('first') or 100), self.config['max_page_size'])
+    offset = int(variables['after']) if variables.get('after') else 0
+    finished = 'FINISHED' in body.get('query', '')
+
+    nodes = []
+    for project_id in ids[:first]:
+      data = self.data.project(project_id)
+      if data is None:
+        continue
+      pipelines = data['pipelines']
+      if variables.get('ref'):
+        pipelines = [pipeline for pipeline in pipelines if pipeline['ref'] == variables['ref']]
+      if finished:
+        pipelines = [pipeline for pipeline in pipelines if pipeline['status'] in ('success', 'failed', 'canceled', 'skipped')]
+      if variables.get('updatedAfter'):
+        updated_after = _parse_time(variables['updatedAfter'])
+        pipelines = [pipeline for pipeline in pipelines if pipeline['_updated'] >= updated_after]
+      page = pipelines[offset:offset + first]
+      nodes.append({
+        'id': 'gid://gitlab/Project/{}'.format(project_id),
+        'name': data['project']['name'],
+        'webUrl': data['project']['web_url'],
+        'pipelines': {
+          'pageInfo': {'hasNextPage': offset + first < len(pipelines), 'endCursor': str(offset + first)},
+          'nodes': [self.__graphql_pipeline(pipeline, data['details'][pipeline['id']]) for pipeline in page],
+        },
+      })
+    # Rough stand-in for GitLab's complexity score, grows with the number of projects
+    complexity = {'score': 20 + 2 * len(nodes), 'limit': 250}
+    return 200, {'data': {'queryComplexity': complexity, 'projects': {'nodes': nodes}}}, {}
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Offline GitLab API stand-in')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8081)
+  for key, value in DEFAULT_CONFIG.items():
+    if isinstance(value, bool):
+      parser.add_argument('--{}'.format(key.replace('_', '-')), action='store_true', default=value)
+    else:
+      parser.add_argument('--{}'.format(key.replace('_', '-')), type=type(value), default=value)
+  args = parser.parse_args(argv)
+
+  logging.basicConfig(level=logging.INFO)
+  config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+  stub = GitLabStub(args.host, args.port, **config)
+  logger.info('GitLab stand-in listening on {}'.format(stub.url))
+  try:
+    stub.server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()
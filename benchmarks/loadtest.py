@@ -0,0 +1,329 @@
+"""Concurrent session load test for the Dash app
+
+Simulates browser sessions against a running app: every session loads a page,
+fires the initial callbacks and follows the callback graph like the Dash
+renderer does (store updates fan out to the per-project callbacks). Monitor
+sessions fire the build interval periodically. By default the app and the
+offline GitLab stand-in are started locally.
+
+  $ python -m benchmarks.loadtest --sessions 50 --projects 20 --duration 300
+  $ python -m benchmarks.loadtest --url http://localhost:5000 --stub-url http://localhost:8081 --sessions 50
+"""
+
+# Standard library imports
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Third party imports
+import requests
+
+# Local application imports
+from benchmarks.gitlab_stub import GitLabStub
+from benchmarks.refresh import environment
+
+# Concurrent requests per session, like a browser per host
+SESSION_CONNECTIONS = 6
+
+__numeric_id = re.compile(r'\d+')
+
+def output_label(output):
+  return __numeric_id.sub(':id', output)
+
+def percentile(values, share):
+  if len(values) == 0:
+    return 0.0
+  values = sorted(values)
+  return values[min(len(values) - 1, int(share * len(values)))]
+
+class Stats():
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.latencies = {}
+    self.errors = 0
+    self.bytes = 0
+    self.decoded_bytes = 0
+
+  def record(self, output, latency, size, decoded_size=0, error=False):
+    with self.lock:
+      self.latencies.setdefault(output_label(output), []).append(latency)
+      self.bytes = self.bytes + size
+      self.decoded_bytes = self.decoded_bytes + decoded_size
+      if error:
+        self.errors = self.errors + 1
+
+  def all_latencies(self):
+    with self.lock:
+      return [latency for latencies in self.latencies.values() for latency in latencies]
+
+class Session():
+  """Minimal Dash renderer: keeps component props and fires dependent callbacks"""
+
+  def __init__(self, base_url, dependencies, pathname, stats, accept_encoding=None):
+    self.base_url = base_url
+    self.dependencies = [dependency for dependency in dependencies if dependency.get('clientside_function') is None]
+    self.pathname = pathname
+    self.stats = stats
+    self.http = requests.Session()
+    if accept_encoding is not None:
+      self.http.headers['Accept-Encoding'] = accept_encoding
+    self.props = {}
+    self.ids = set()
+    self.stores = set()
+    self.fired = set()
+    self.executor = ThreadPoolExecutor(max_workers=SESSION_CONNECTIONS)
+
+  def close(self):
+    self.executor.shutdown(wait=True)
+    self.http.close()
+
+  def __walk(self, component):
+    if isinstance(component, list):
+      [self.__walk(child) for child in component]
+      return
+    if not isinstance(component, dict) or 'props' not in component:
+      return
+    props = component['props']
+    if 'id' in props and isinstance(props['id'], str):
+      self.ids.add(props['id'])
+      if component.get('type') == 'Store':
+        self.stores.add(props['id'])
+      for name, value in props.items():
+        if name != 'children':
+          self.props[(props['id'], name)] = value
+    for value in props.values():
+      if isinstance(value, (dict, list)):
+        self.__walk(value)
+
+  @staticmethod
+  def __outputs(dependency):
+    output = dependency['output']
+    if output.startswith('..'):
+      return [tuple(item.rsplit('.', 1)) for item in output.strip('.').split('...')]
+    return [tuple(output.rsplit('.', 1))]
+
+  def __present(self, dependency):
+    return all(output[0] in self.ids for output in self.__outputs(dependency))
+
+  def __payload(self, dependency, changed):
+    outputs = [{'id': output[0], 'property': output[1]} for output in self.__outputs(dependency)]
+    def values(items):
+      return [{'id': item['id'], 'property': item['property'], 'value': self.props.get((item['id'], item['property']))} for item in items]
+    return {
+      'output': dependency['output'],
+      'outputs': outputs if len(outputs) > 1 else outputs[0],
+      'inputs': values(dependency['inputs']),
+      'state': values(dependency['state']),
+      'changedPropIds': ['{}.{}'.format(item['id'], item['property']) for item in dependency['inputs']
+        if (item['id'], item['property']) in changed],
+    }
+
+  def __fire(self, dependency, changed):
+    payload = self.__payload(dependency, changed)
+    self.fired.add(dependency['output'])
+    started = time.perf_counter()
+    try:
+      response = self.http.post(self.base_url + '/_dash-update-component', json=payload, timeout=600)
+    except requests.exceptions.RequestException:
+      self.stats.record(dependency['output'], time.perf_counter() - started, 0, error=True)
+      return []
+    latency = time.perf_counter() - started
+    # Bytes on the wire, requests decodes compressed responses
+    size = int(response.headers.get('Content-Length', len(response.content)))
+    self.stats.record(dependency['output'], latency, size, len(response.content), error=response.status_code not in (200, 204))
+    if response.status_code != 200:
+      return []
+
+    updated = []
+    for component_id, props in response.json().get('response', {}).items():
+      for name, value in props.items():
+        self.props[(component_id, name)] = value
+        updated.append((component_id, name))
+        if component_id in self.stores and name == 'data':
+          self.props[(component_id, 'modified_timestamp')] = int(time.time() * 1000)
+          updated.append((component_id, 'modified_timestamp'))
+        if name == 'children':
+          self.__walk(value)
+    return updated
+
+  def __triggered(self, changed):
+    return [dependency for dependency in self.dependencies
+      if self.__present(dependency) and any((item['id'], item['property']) in changed for item in dependency['inputs'])]
+
+  def run_callbacks(self, pending, changed):
+    """Fire callbacks round by round until no further props change"""
+    while len(pending) > 0:
+      outputs = set(output for dependency in pending for output in self.__outputs(dependency))
+      # Wait for callbacks whose inputs are produced by other pending callbacks
+      ready = [dependency for dependency in pending
+        if not any((item['id'], item['property']) in outputs and (item['id'], item['property']) not in self.__outputs(dependency)
+          for item in dependency['inputs'])] or pending
+      futures = [self.executor.submit(self.__fire, dependency, changed) for dependency in ready]
+      updated = set(prop for future in futures for prop in future.result())
+      pending = [dependency for dependency in pending if dependency not in ready]
+      pending = pending + [dependency for dependency in self.__triggered(updated) if dependency not in pending]
+      changed = updated
+
+  def load(self):
+    self.http.get(self.base_url + self.pathname, timeout=60)
+    self.__walk(self.http.get(self.base_url + '/_dash-layout', timeout=60).json())
+    self.props[('url', 'pathname')] = self.pathname
+    initial = [dependency for dependency in self.dependencies if self.__present(dependency) and not dependency.get('prevent_initial_call')]
+    self.run_callbacks(initial, set())
+    # The page content is only known after the first round, fire its initial callbacks too
+    page = [dependency for dependency in self.dependencies
+      if self.__present(dependency) and not dependency.get('prevent_initial_call') and dependency['output'] not in self.fired]
+    self.run_callbacks(page, set())
+
+  def tick(self, interval_id):
+    key = (interval_id, 'n_intervals')
+    self.props[key] = (self.props.get(key) or 0) + 1
+    self.run_callbacks(self.__triggered({key}), {key})
+
+def run_session(base_url, dependencies, pathname, stats, deadline, intervals, accept_encoding=None):
+  session = Session(base_url, dependencies, pathname, stats, accept_encoding)
+  try:
+    session.load()
+    next_ticks = {interval_id: time.monotonic() + seconds for interval_id, seconds in intervals.items()}
+    while len(next_ticks) > 0 and time.monotonic() < deadline:
+      interval_id = min(next_ticks, key=next_ticks.get)
+      wait = next_ticks[interval_id] - time.monotonic()
+      if wait > 0:
+        time.sleep(min(wait, max(0, deadline - time.monotonic())))
+      if time.monotonic() >= deadline:
+        break
+      session.tick(interval_id)
+      next_ticks[interval_id] = next_ticks[interval_id] + intervals[interval_id]
+  finally:
+    session.close()
+
+def __free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+def start_app(env, command, port):
+  env = dict(env, APP_HOST='127.0.0.1', APP_PORT=str(port))
+  command = [part.format(port=port) for part in command]
+  process = subprocess.Popen(command, env=env)
+  base_url = 'http://127.0.0.1:{}'.format(port)
+  for _ in range(600):
+    if process.poll() is not None:
+      raise RuntimeError('App exited with code {}'.format(process.returncode))
+    try:
+      if requests.get(base_url + '/_dash-layout', timeout=1).status_code == 200:
+        return process, base_url
+    except requests.exceptions.RequestException:
+      pass
+    time.sleep(0.5)
+  process.terminate()
+  raise RuntimeError('App did not start')
+
+def stub_requests(stub_url):
+  if stub_url is None:
+    return None
+  return sum(requests.get(stub_url + '/__stats', timeout=10).json().values())
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Concurrent session load test for the Dash app')
+  parser.add_argument('--sessions', type=int, default=50)
+  parser.add_argument('--monitor-share', type=float, default=0.5, help='Share of sessions showing /monitor')
+  parser.add_argument('--duration', type=float, default=300, help='Seconds every session stays open')
+  parser.add_argument('--ramp-up', type=float, default=10, help='Seconds until all sessions are started')
+  parser.add_argument('--build-interval', type=float, default=120, help='Seconds between monitor updates')
+  parser.add_argument('--hourly-interval', type=float, default=3600, help='Seconds between dashboard store updates')
+  parser.add_argument('--warmup', type=int, default=1, help='Sessions per page run before measuring')
+  parser.add_argument('--url', help='Test a running app instead of starting one')
+  parser.add_argument('--stub-url', help='GitLab stand-in used by --url (for GitLab call counts)')
+  parser.add_argument('--projects', type=int, default=10, help='Projects of the started stand-in')
+  parser.add_argument('--latency', type=float, default=0.0, help='Latency of the started stand-in')
+  parser.add_argument('--discovery', action='store_true', help='Let the app discover the projects of the group')
+  parser.add_argument('--server-cmd', default='{} index.py'.format(sys.executable),
+    help='Command starting the app, {port} is replaced by the port')
+  parser.add_argument('--accept-encoding', help='Accept-Encoding header of the sessions, e.g. identity')
+  parser.add_argument('--output', help='Write the results as JSON')
+  args = parser.parse_args(argv)
+
+  stub = None
+  process = None
+  base_url = args.url
+  stub_url = args.stub_url
+  if base_url is None:
+    stub = GitLabStub(projects=args.projects, latency=args.latency).start()
+    stub_url = stub.url.split('/api/')[0]
+    env = environment(stub, args.projects)
+    if args.discovery:
+      env = dict(env, GITLAB_PROJECT_DISCOVERY='1', GITLAB_PROJECT_IDS='{"projects": []}')
+    process, base_url = start_app(env, args.server_cmd.split(), __free_port())
+
+  try:
+    dependencies = requests.get(base_url + '/_dash-dependencies', timeout=60).json()
+    for _ in range(args.warmup):
+      for pathname in ['/dashboard', '/monitor']:
+        run_session(base_url, dependencies, pathname, Stats(), 0, {})
+
+    stats = Stats()
+    requests_before = stub_requests(stub_url)
+    monitor_sessions = int(round(args.sessions * args.monitor_share))
+    started = time.monotonic()
+    threads = []
+    for index in range(args.sessions):
+      monitor = index < monitor_sessions
+      pathname = '/monitor' if monitor else '/dashboard'
+      intervals = {'session-update-build': args.build_interval} if monitor else {'session-update-hourly': args.hourly_interval}
+      deadline = started + args.ramp_up * index / max(1, args.sessions) + args.duration
+      thread = threading.Thread(target=run_session, args=(base_url, dependencies, pathname, stats, deadline, intervals, args.accept_encoding), daemon=True)
+      threads.append(thread)
+    random.shuffle(threads)
+    for index, thread in enumerate(threads):
+      time.sleep(max(0, started + args.ramp_up * index / max(1, args.sessions) - time.monotonic()))
+      thread.start()
+    [thread.join() for thread in threads]
+    elapsed = time.monotonic() - started
+    requests_after = stub_requests(stub_url)
+  finally:
+    if process is not None:
+      process.terminate()
+      process.wait()
+    if stub is not None:
+      stub.stop()
+
+  latencies = stats.all_latencies()
+  result = {
+    'sessions': args.sessions,
+    'callbacks': len(latencies),
+    'errors': stats.errors,
+    'throughput': len(latencies) / elapsed,
+    'response_bytes': stats.bytes,
+    'decoded_bytes': stats.decoded_bytes,
+    'p50': percentile(latencies, 0.50),
+    'p95': percentile(latencies, 0.95),
+    'p99': percentile(latencies, 0.99),
+    'gitlab_calls_per_session': (requests_after - requests_before) / args.sessions if requests_before is not None else None,
+    'outputs': {output: {'count': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99)}
+      for output, values in stats.latencies.items()},
+  }
+
+  print('{} sessions, {} callbacks ({} errors) in {:.1f} s, {:.1f} callbacks/s'.format(
+    args.sessions, result['callbacks'], result['errors'], elapsed, result['throughput']))
+  print('response bytes {} ({} decoded)'.format(result['response_bytes'], result['decoded_bytes']))
+  print('latency p50 {:.3f} s, p95 {:.3f} s, p99 {:.3f} s'.format(result['p50'], result['p95'], result['p99']))
+  if result['gitlab_calls_per_session'] is not None:
+    print('GitLab calls per session: {:.1f}'.format(result['gitlab_calls_per_session']))
+  for output, values in sorted(result['outputs'].items(), key=lambda item: -item[1]['p95']):
+    print('  {:<60} {:>6} calls  p50 {:.3f} s  p95 {:.3f} s  p99 {:.3f} s'.format(output[:60], values['count'], values['p50'], values['p95'], values['p99']))
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(result, f, indent=2)
+  return 1 if stats.errors > 0 else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
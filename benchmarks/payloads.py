@@ -0,0 +1,152 @@
+"""Response payload benchmark against the offline GitLab stand-in
+
+Requests the dataset stores, the overview figures, the time-series figures
+of a project (whole range and zoomed into its last day) and the static Dash
+responses through the Flask test client with every content encoding and
+reports response bytes, server time and JSON serialization time.
+
+  $ python -m benchmarks.payloads --projects 100 --output payloads.json
+"""
+
+# Standard library imports
+import argparse
+from datetime import datetime, timedelta
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Local application imports
+from benchmarks.gitlab_stub import GitLabStub
+from benchmarks.refresh import environment
+
+ENCODINGS = ['identity', 'gzip', 'br']
+STORES = ['pipelines', 'commits', 'deployments', 'milestones']
+
+def __store_request(dataset):
+  return {
+    'output': 'memory-{}.data'.format(dataset),
+    'outputs': {'id': 'memory-{}'.format(dataset), 'property': 'data'},
+    'inputs': [{'id': 'session-update-hourly', 'property': 'n_intervals', 'value': 0}],
+    'changedPropIds': [],
+  }
+
+def __overview_request():
+  return {
+    'output': '..overview-table.data...overview-heatmap.figure..',
+    'outputs': [{'id': 'overview-table', 'property': 'data'}, {'id': 'overview-heatmap', 'property': 'figure'}],
+    'inputs': [{'id': 'memory-{}'.format(dataset), 'property': 'modified_timestamp', 'value': 1} for dataset in ['pipelines', 'commits', 'deployments']],
+    'changedPropIds': [],
+  }
+
+def __figure_request(graph_id, dataset, project_id, data, relayout):
+  return {
+    'output': '{}.figure'.format(graph_id),
+    'outputs': {'id': graph_id, 'property': 'figure'},
+    'inputs': [
+      {'id': 'memory-{}'.format(dataset), 'property': 'modified_timestamp', 'value': 1},
+      {'id': 'project-tabs', 'property': 'active_tab', 'value': 'tab-{}'.format(project_id)},
+      {'id': graph_id, 'property': 'relayoutData', 'value': relayout},
+    ],
+    'state': [{'id': 'memory-{}'.format(dataset), 'property': 'data', 'value': data}],
+    'changedPropIds': ['{}.relayoutData'.format(graph_id)] if relayout is not None else [],
+  }
+
+def __serialization_time(value, repeat):
+  from dash._utils import to_json
+  times = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    to_json(value)
+    times.append(time.perf_counter() - started)
+  return statistics.median(times)
+
+def run_payloads(repeat):
+  """Measure all payloads in this process and print the results as JSON"""
+  import index
+  from apps.dashboard import signals
+  from apps.overview import callbacks as overview
+
+  client = index.server.test_client()
+  requests = {'_dash-layout': ('/_dash-layout', None), '_dash-dependencies': ('/_dash-dependencies', None)}
+  for dataset in STORES:
+    requests['memory-{}.data'.format(dataset)] = ('/_dash-update-component', __store_request(dataset))
+  requests['overview-heatmap.figure'] = ('/_dash-update-component', __overview_request())
+
+  # Time-series figures of the first project
+  pipelines = signals.get_dataset('pipelines')
+  project_id = pipelines[0]['project_id']
+  last = max(pipeline['created_at'] for pipeline in pipelines if pipeline['project_id'] == project_id)[:19]
+  zoom = {'xaxis.range[0]': (datetime.fromisoformat(last) - timedelta(days=1)).isoformat(' '), 'xaxis.range[1]': last.replace('T', ' ')}
+  for graph_id in ['project-coverage', 'project-testreport']:
+    requests['{}.figure'.format(graph_id)] = ('/_dash-update-component', __figure_request(graph_id, 'pipelines', project_id, pipelines, None))
+    requests['{}.figure zoomed'.format(graph_id)] = ('/_dash-update-component', __figure_request(graph_id, 'pipelines', project_id, pipelines, zoom))
+
+  def fetch(path, body, headers):
+    if body is None:
+      return client.get(path, headers=headers)
+    return client.post(path, json=body, headers=headers)
+
+  results = {}
+  for name, (path, body) in requests.items():
+    # Collect the datasets before measuring
+    fetch(path, body, {})
+    results[name] = {}
+    for encoding in ENCODINGS:
+      times = []
+      for _ in range(repeat):
+        started = time.perf_counter()
+        response = fetch(path, body, {'Accept-Encoding': encoding})
+        times.append(time.perf_counter() - started)
+      results[name][encoding] = {'bytes': len(response.data), 'server': statistics.median(times),
+        'content_encoding': response.headers.get('Content-Encoding', 'identity')}
+
+    if body is None:
+      # Revalidation of the browser's copy
+      etag = response.headers.get('ETag')
+      response = client.get(path, headers={'Accept-Encoding': 'br', 'If-None-Match': etag or ''})
+      results[name]['revalidated'] = {'status': response.status_code, 'bytes': len(response.data)}
+
+  for dataset in STORES:
+    results['memory-{}.data'.format(dataset)]['serialization'] = __serialization_time(signals.get_dataset(dataset), repeat)
+  results['overview-heatmap.figure']['serialization'] = __serialization_time(overview.render_heatmap(overview.get_overview()), repeat)
+  print(json.dumps(results))
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Response payload benchmark for the Dash app')
+  parser.add_argument('--projects', type=int, default=100, help='Projects of the stand-in')
+  parser.add_argument('--pipelines', type=int, default=20, help='Pipelines per project')
+  parser.add_argument('--repeat', type=int, default=5, help='Measurements per payload and encoding')
+  parser.add_argument('--output', help='Write results as JSON')
+  parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run:
+    run_payloads(args.repeat)
+    return 0
+
+  stub = GitLabStub(projects=args.projects, pipelines=args.pipelines).start()
+  try:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.payloads', '--run', '--repeat', str(args.repeat)],
+      env=environment(stub, args.projects), capture_output=True, text=True, check=True).stdout
+  finally:
+    stub.stop()
+  results = json.loads(output.strip().splitlines()[-1])
+
+  for name, result in results.items():
+    for encoding in ENCODINGS:
+      print('{:<32} {:<9} {:>10} bytes {:>8.1f} ms server'.format(
+        name, result[encoding]['content_encoding'], result[encoding]['bytes'], 1000 * result[encoding]['server']))
+    if 'serialization' in result:
+      print('{:<32} {:<9} {:>25.1f} ms JSON serialization'.format(name, '', 1000 * result['serialization']))
+    if 'revalidated' in result:
+      print('{:<32} {:<9} {:>10} bytes (status {})'.format(name, 'etag', result['revalidated']['bytes'], result['revalidated']['status']))
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
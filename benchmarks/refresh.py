@@ -0,0 +1,209 @@
+"""End-to-end refresh benchmark against the offline GitLab stand-in
+
+Every target runs in a fresh process (cold caches, own peak RSS) at each scale
+and reports wall time, GitLab requests and memory.
+
+  $ python -m benchmarks.refresh --scales 10 100 500 --output results.json
+  $ python -m benchmarks.refresh --baseline results.json --tolerance 0.25
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+# Local application imports
+from benchmarks.gitlab_stub import GitLabStub
+
+def __projects():
+  import settings
+  projects = settings.GITLAB_PROJECT_IDS['projects']
+  return [(project['id'], project['ref_name'] if 'ref_name' in project else 'master') for project in projects]
+
+def __gitlab_get_pipelines():
+  from modules.gitlab import GitLab
+  gl = GitLab()
+  yield
+  [gl.get_pipelines(project_id, ref_name) for project_id, ref_name in __projects()]
+
+def __graphql_get_pipelines():
+  from modules.graphql import GitLabGraphQL
+  gql = GitLabGraphQL()
+  yield
+  gql.get_pipelines_many([{'id': project_id, 'ref_name': ref_name} for project_id, ref_name in __projects()])
+
+def __gitlab_get_milestones():
+  from modules.gitlab import GitLab
+  import settings
+  gl = GitLab()
+  yield
+  gl.get_milestones(settings.GITLAB_GROUP_ID)
+
+def __gitlab_get_group_projects():
+  from modules.gitlab import GitLab
+  import settings
+  gl = GitLab()
+  yield
+  gl.get_group_projects(settings.GITLAB_GROUP_ID)
+
+def __signal(dataset):
+  def target():
+    from apps.dashboard import signals
+    yield
+    signals.get_dataset(dataset)
+  return target
+
+def __overview_compute():
+  from apps.dashboard import signals
+  from apps.overview import callbacks
+  datasets = [signals.get_dataset(dataset) for dataset in callbacks.OVERVIEW_DATASETS]
+  project_ids = [project_id for project_id, ref_name in __projects()]
+  yield
+  callbacks.compute_overview(*datasets, project_ids)
+
+def __monitor_card_status():
+  from apps.monitor import callbacks
+  yield
+  [callbacks.get_card_status(project_id, ref_name) for project_id, ref_name in __projects()]
+
+def __monitor_tick():
+  # Steady state: the cards were rendered before and no pipeline changed since
+  from apps.monitor import callbacks
+  [callbacks.get_card_status(project_id, ref_name) for project_id, ref_name in __projects()]
+  yield
+  [callbacks.get_card_status(project_id, ref_name) for project_id, ref_name in __projects()]
+
+def __test_history():
+  from apps.dashboard import signals
+  signals.get_dataset('pipelines')
+  yield
+  signals.sync_test_history(force=True)
+
+# Every target is a generator: setup until the first yield, measured afterwards
+TARGETS = {
+  'gitlab.get_pipelines': __gitlab_get_pipelines,
+  'graphql.get_pipelines': __graphql_get_pipelines,
+  'gitlab.get_milestones': __gitlab_get_milestones,
+  'gitlab.get_group_projects': __gitlab_get_group_projects,
+  'signals.pipelines': __signal('pipelines'),
+  'signals.commits': __signal('commits'),
+  'signals.deployments': __signal('deployments'),
+  'signals.milestones': __signal('milestones'),
+  'monitor.card_status': __monitor_card_status,
+  'monitor.tick': __monitor_tick,
+  'overview.compute': __overview_compute,
+  'tests.history': __test_history,
+}
+
+def __stub_requests(stub_url):
+  with urlopen(stub_url + '/__stats') as response:
+    return sum(json.loads(response.read()).values())
+
+def __max_rss_mb():
+  # ru_maxrss is reported in kilobytes on Linux
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_target(name):
+  """Run a single target in this process and print the measurements as JSON"""
+  stub_url = os.environ['BENCHMARK_STUB_URL']
+  target = TARGETS[name]()
+  next(target)
+
+  requests_before = __stub_requests(stub_url)
+  rss_before = __max_rss_mb()
+  started = time.perf_counter()
+  for _ in target:
+    pass
+  wall = time.perf_counter() - started
+  result = {
+    'wall': wall,
+    'requests': __stub_requests(stub_url) - requests_before,
+    'peak_rss_mb': __max_rss_mb(),
+    'rss_growth_mb': __max_rss_mb() - rss_before,
+  }
+  print(json.dumps(result))
+
+def environment(stub, projects):
+  """Environment for application processes talking to the stand-in"""
+  return dict(os.environ, **{
+    'GITLAB_API_URL': stub.url,
+    'GITLAB_TOKEN': 'benchmark',
+    'GITLAB_GROUP_ID': str(stub.config['group_id']),
+    'GITLAB_PROJECT_IDS': json.dumps({'projects': [{'id': project_id} for project_id in range(1, projects + 1)]}),
+    'CACHE_TYPE': 'SimpleCache',
+    'CACHE_BACKEND': 'redis',
+    'CACHE_WARM_ON_BOOT': '0',
+    'LOGLEVEL': 'WARNING',
+    'BENCHMARK_STUB_URL': stub.url.split('/api/')[0],
+  })
+
+def run_scale(projects, targets, stub_config):
+  stub = GitLabStub(projects=projects, **stub_config).start()
+  env = environment(stub, projects)
+  results = {}
+  try:
+    for name in targets:
+      output = subprocess.run([sys.executable, '-m', 'benchmarks.refresh', '--run-target', name],
+        env=env, capture_output=True, text=True, check=True).stdout
+      results[name] = json.loads(output.strip().splitlines()[-1])
+      print('{:>5} projects  {:<24} {:>9.2f} s {:>8} requests {:>8.1f} MB peak RSS'.format(
+        projects, name, results[name]['wall'], results[name]['requests'], results[name]['peak_rss_mb']), flush=True)
+  finally:
+    stub.stop()
+  return results
+
+def compare(results, baseline, tolerance):
+  """Return regressions of wall time (relative tolerance) and request counts"""
+  regressions = []
+  for scale, targets in results.items():
+    for name, result in targets.items():
+      reference = baseline.get(scale, {}).get(name)
+      if reference is None:
+        continue
+      if result['wall'] > reference['wall'] * (1 + tolerance):
+        regressions.append('{} @ {} projects: wall {:.2f} s > {:.2f} s'.format(name, scale, result['wall'], reference['wall']))
+      if result['requests'] > reference['requests']:
+        regressions.append('{} @ {} projects: requests {} > {}'.format(name, scale, result['requests'], reference['requests']))
+      if result['peak_rss_mb'] > reference['peak_rss_mb'] * (1 + tolerance):
+        regressions.append('{} @ {} projects: peak RSS {:.1f} MB > {:.1f} MB'.format(name, scale, result['peak_rss_mb'], reference['peak_rss_mb']))
+  return regressions
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Refresh benchmark against the offline GitLab stand-in')
+  parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 500], help='Project counts')
+  parser.add_argument('--targets', nargs='+', choices=list(TARGETS.keys()), default=list(TARGETS.keys()))
+  parser.add_argument('--pipelines', type=int, default=20, help='Pipelines per project')
+  parser.add_argument('--latency', type=float, default=0.0, help='Stand-in latency per request (seconds)')
+  parser.add_argument('--max-page-size', type=int, default=100)
+  parser.add_argument('--output', help='Write results as JSON')
+  parser.add_argument('--baseline', help='Fail on regressions against these results')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slow down')
+  parser.add_argument('--run-target', help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run_target:
+    run_target(args.run_target)
+    return 0
+
+  stub_config = {'pipelines': args.pipelines, 'latency': args.latency, 'max_page_size': args.max_page_size}
+  results = {str(scale): run_scale(scale, args.targets, stub_config) for scale in args.scales}
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline, encoding='utf-8') as f:
+      regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+      print('REGRESSION: {}'.format(regression))
+    return 1 if regressions else 0
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
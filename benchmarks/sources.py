@@ -0,0 +1,124 @@
+"""Compare the REST and GraphQL pipeline sources
+
+Fetches the pipelines of all projects through both sources, reports wall time,
+GitLab requests and GraphQL query cost, and checks that both return identical
+records. Records can be saved as fixture and later sources compared against it,
+the stand-in then generates its data relative to the fixture's recording time.
+
+  $ python -m benchmarks.sources --projects 100 --record pipelines.json.gz
+  $ python -m benchmarks.sources --projects 100 --fixtures pipelines.json.gz
+"""
+
+# Standard library imports
+import argparse
+from datetime import datetime, timezone
+import gzip
+import json
+import subprocess
+import sys
+import time
+from urllib.request import urlopen
+
+# Local application imports
+from benchmarks.gitlab_stub import GitLabStub
+from benchmarks.refresh import environment
+
+def __stub_requests(stub_url):
+  with urlopen(stub_url + '/__stats') as response:
+    return sum(json.loads(response.read()).values())
+
+def run_sources(stub_url):
+  """Fetch through both sources in this process and print records and measurements as JSON"""
+  from modules.gitlab import GitLab
+  from modules.graphql import GitLabGraphQL
+  from modules import projects
+
+  gl = GitLab()
+  gql = GitLabGraphQL()
+  project_list = projects.get_projects()
+  sources = {
+    'rest': lambda: {str(project['id']): gl.get_pipelines(project['id'], project['ref_name']) for project in project_list},
+    'graphql': lambda: {str(project_id): records for project_id, records in gql.get_pipelines_many(project_list).items()},
+  }
+
+  results = {}
+  for name, fetch in sources.items():
+    requests_before = __stub_requests(stub_url)
+    started = time.perf_counter()
+    records = fetch()
+    results[name] = {'wall': time.perf_counter() - started, 'requests': __stub_requests(stub_url) - requests_before, 'records': records}
+  results['graphql']['cost'] = gql.cost
+  print(json.dumps(results))
+
+def differences(expected, actual, limit=10):
+  """Return up to limit descriptions of records which differ"""
+  retval = []
+  for project_id in sorted(set(expected) | set(actual)):
+    expected_records = {record['id']: record for record in expected.get(project_id, [])}
+    actual_records = {record['id']: record for record in actual.get(project_id, [])}
+    for pipeline_id in sorted(set(expected_records) | set(actual_records)):
+      left, right = expected_records.get(pipeline_id), actual_records.get(pipeline_id)
+      if left == right:
+        continue
+      if left is None or right is None:
+        retval.append('project {} pipeline {}: only in {}'.format(project_id, pipeline_id, 'expected' if right is None else 'actual'))
+      else:
+        fields = sorted(key for key in set(left) | set(right) if left.get(key) != right.get(key))
+        retval.append('project {} pipeline {}: {}'.format(project_id, pipeline_id,
+          ', '.join('{} {!r} != {!r}'.format(key, left.get(key), right.get(key)) for key in fields)))
+      if len(retval) >= limit:
+        return retval
+  return retval
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Compare the REST and GraphQL pipeline sources')
+  parser.add_argument('--projects', type=int, default=100, help='Projects of the stand-in')
+  parser.add_argument('--pipelines', type=int, default=20, help='Pipelines per project')
+  parser.add_argument('--latency', type=float, default=0.0, help='Stand-in latency per request (seconds)')
+  parser.add_argument('--record', help='Save the REST records as fixture (gzip JSON)')
+  parser.add_argument('--fixtures', help='Compare both sources against a recorded fixture')
+  parser.add_argument('--run', help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run:
+    run_sources(args.run)
+    return 0
+
+  fixture = None
+  now = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+  if args.fixtures:
+    with gzip.open(args.fixtures, 'rt', encoding='utf-8') as f:
+      fixture = json.load(f)
+    now = fixture['now']
+
+  stub = GitLabStub(projects=args.projects, pipelines=args.pipelines, latency=args.latency, now=now).start()
+  try:
+    stub_url = stub.url.split('/api/')[0]
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.sources', '--run', stub_url],
+      env=environment(stub, args.projects), capture_output=True, text=True, check=True).stdout
+  finally:
+    stub.stop()
+  results = json.loads(output.strip().splitlines()[-1])
+
+  for name, result in results.items():
+    count = sum(len(records) for records in result['records'].values())
+    print('{:<8} {:>8.2f} s {:>8} requests {:>8} records'.format(name, result['wall'], result['requests'], count))
+  cost = results['graphql']['cost']
+  print('GraphQL cost: {} queries, complexity score {} (limit {} per query)'.format(cost['queries'], cost['score'], cost['limit']))
+
+  expected = results['rest']['records'] if fixture is None else fixture['records']
+  failed = False
+  for name, result in results.items():
+    diff = differences(expected, result['records'])
+    if len(diff) > 0:
+      failed = True
+      print('{} records differ:'.format(name))
+      [print('  ' + line) for line in diff]
+
+  if args.record:
+    with gzip.open(args.record, 'wt', encoding='utf-8') as f:
+      json.dump({'now': now, 'records': results['rest']['records']}, f)
+  return 1 if failed else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,186 @@
+"""Startup benchmark: import profile, cold start and worker memory
+
+The import profile lists the packages imported by the app with their import
+time (python -X importtime) and the RSS they add. The server scenarios start
+Gunicorn against the offline GitLab stand-in and report the time until the
+app answers and the memory of every worker: RSS, PSS (shared pages divided
+between the processes sharing them) and USS (pages of the worker alone).
+
+  $ python -m benchmarks.startup --profile
+  $ python -m benchmarks.startup --workers 4 --output startup.json
+"""
+
+# Standard library imports
+import argparse
+import json
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Third party imports
+import requests
+
+# Local application imports
+from benchmarks.gitlab_stub import GitLabStub
+from benchmarks.loadtest import Session, Stats
+from benchmarks.refresh import environment
+
+# (name, environment) of the server scenarios
+SCENARIOS = [
+  ('all pages', {'WEB_PRELOAD': '0'}),
+  ('all pages, preload', {'WEB_PRELOAD': '1'}),
+  ('monitor only', {'WEB_PRELOAD': '0', 'APP_PAGES': 'monitor'}),
+  ('monitor only, preload', {'WEB_PRELOAD': '1', 'APP_PAGES': 'monitor'}),
+]
+# Sessions per page every scenario runs before measuring, every worker should have served some
+WARM_UP_SESSIONS = 4
+
+def __memory_mb(pid):
+  """Return RSS, PSS and USS of a process in MB"""
+  values = {}
+  with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+    for line in f:
+      parts = line.split()
+      if len(parts) == 3 and parts[2] == 'kB':
+        values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+  return {'rss': values['Rss'], 'pss': values['Pss'], 'uss': values['Private_Clean'] + values['Private_Dirty']}
+
+def __children(pid):
+  with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+    return [int(child) for child in f.read().split()]
+
+def __free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+def __importtime(env):
+  """Return (package, self seconds, first position) of the packages imported by the app"""
+  output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import index'], env=env, capture_output=True, text=True, check=True).stderr
+  packages = {}
+  for line in output.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    own, _, name = line[len('import time:'):].split('|')
+    package = name.strip().split('.')[0]
+    entry = packages.setdefault(package, [package, 0.0, len(packages)])
+    entry[1] = entry[1] + int(own) / 1e6
+  return [tuple(entry) for entry in packages.values()]
+
+def run_rss(packages):
+  """Import packages one after another in this process and print the RSS each of them added as JSON"""
+  import importlib
+  retval = {}
+  for package in packages:
+    before = __memory_mb('self')['rss']
+    try:
+      importlib.import_module(package)
+    except Exception:
+      continue
+    retval[package] = __memory_mb('self')['rss'] - before
+  print(json.dumps(retval))
+
+def profile(env, limit):
+  packages = __importtime(env)
+  # Packages are imported in the order the app imports them, RSS is attributed to the first importer
+  order = [package for package, _, _ in sorted(packages, key=lambda entry: entry[2])]
+  output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--run-rss'] + order,
+    env=env, capture_output=True, text=True, check=True).stdout
+  rss = json.loads(output.strip().splitlines()[-1])
+  total = sum(seconds for _, seconds, _ in packages)
+
+  print('{:<32} {:>10} {:>10}'.format('package', 'import ms', 'RSS MB'))
+  for package, seconds, _ in sorted(packages, key=lambda entry: -entry[1])[:limit]:
+    print('{:<32} {:>10.1f} {:>10.1f}'.format(package, 1000 * seconds, rss.get(package, 0.0)))
+  print('{:<32} {:>10.1f} {:>10.1f}'.format('total', 1000 * total, sum(rss.values())))
+  return {'packages': {package: {'import': seconds, 'rss_mb': rss.get(package)} for package, seconds, _ in packages}, 'import': total}
+
+def run_scenario(env, workers):
+  """Start Gunicorn, return cold start time and the memory of its workers"""
+  port = __free_port()
+  base_url = 'http://127.0.0.1:{}'.format(port)
+  env = dict(env, WEB_WORKERS=str(workers), PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='startup-metrics-'))
+  started = time.perf_counter()
+  process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--bind', '127.0.0.1:{}'.format(port), 'index:server'],
+    env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+    cold_start = None
+    while cold_start is None:
+      if process.poll() is not None:
+        raise RuntimeError('Gunicorn exited with code {}'.format(process.returncode))
+      try:
+        if requests.get(base_url + '/_dash-layout', timeout=1).status_code == 200:
+          cold_start = time.perf_counter() - started
+      except requests.exceptions.RequestException:
+        time.sleep(0.05)
+
+    # Let every worker boot and serve a few sessions of every page, so workers import what the pages use
+    while len(__children(process.pid)) < workers:
+      time.sleep(0.1)
+    time.sleep(1)
+    dependencies = requests.get(base_url + '/_dash-dependencies', timeout=10).json()
+    stats = Stats()
+    for _ in range(WARM_UP_SESSIONS):
+      for page in env.get('APP_PAGES', 'dashboard,monitor,overview').split(','):
+        session = Session(base_url, dependencies, '/' + page, stats)
+        try:
+          session.load()
+        finally:
+          session.close()
+    memory = [__memory_mb(pid) for pid in __children(process.pid)]
+    return {
+      'cold_start': cold_start,
+      'warm_up_errors': stats.errors,
+      'master': __memory_mb(process.pid),
+      'workers': memory,
+      'worker_rss': sum(worker['rss'] for worker in memory) / len(memory),
+      'worker_pss': sum(worker['pss'] for worker in memory) / len(memory),
+      'worker_uss': sum(worker['uss'] for worker in memory) / len(memory),
+      'total_pss': __memory_mb(process.pid)['pss'] + sum(worker['pss'] for worker in memory),
+    }
+  finally:
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=30)
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Startup benchmark: import profile, cold start and worker memory')
+  parser.add_argument('--projects', type=int, default=20, help='Projects of the stand-in')
+  parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers')
+  parser.add_argument('--profile', action='store_true', help='Only print the import profile')
+  parser.add_argument('--limit', type=int, default=25, help='Packages listed in the import profile')
+  parser.add_argument('--output', help='Write results as JSON')
+  parser.add_argument('--run-rss', nargs='+', help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.run_rss:
+    run_rss(args.run_rss)
+    return 0
+
+  stub = GitLabStub(projects=args.projects).start()
+  env = dict(environment(stub, args.projects), CACHE_WARM_ON_BOOT='0')
+  results = {}
+  try:
+    results['profile'] = profile(env, args.limit)
+    if not args.profile:
+      print()
+      print('{:<24} {:>10} {:>12} {:>12} {:>12} {:>12}'.format('scenario', 'cold s', 'worker RSS', 'worker PSS', 'worker USS', 'total PSS'))
+      for name, scenario_env in SCENARIOS:
+        result = run_scenario(dict(env, **scenario_env), args.workers)
+        results[name] = result
+        print('{:<24} {:>10.2f} {:>9.1f} MB {:>9.1f} MB {:>9.1f} MB {:>9.1f} MB'.format(
+          name, result['cold_start'], result['worker_rss'], result['worker_pss'], result['worker_uss'], result['total_pss']), flush=True)
+        if result['warm_up_errors'] > 0:
+          print('  {} warm-up callbacks failed'.format(result['warm_up_errors']))
+  finally:
+    stub.stop()
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,42 @@
+# Standard library imports
+import gc
+import os
+import shutil
+import tempfile
+
+# Aggregate the Prometheus metrics of all workers, prometheus_client reads the directory when it is imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'status-dashboard-metrics'))
+
+# Third party imports
+from prometheus_client import multiprocess
+
+# Local application imports
+import settings
+
+bind = '{}:{}'.format(settings.APP_HOST, settings.APP_PORT)
+workers = settings.WEB_WORKERS
+# Threads keep slow GitLab crawls from blocking the other callbacks of a worker
+worker_class = 'gthread'
+threads = settings.WEB_THREADS
+timeout = 120
+# The app is imported once in the master, workers share its memory pages until they write to them
+preload_app = settings.WEB_PRELOAD
+
+def on_starting(server):
+  # Metric files of a previous run would be added to the new counters
+  path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+  shutil.rmtree(path, ignore_errors=True)
+  os.makedirs(path, exist_ok=True)
+
+def pre_fork(server, worker):
+  if preload_app:
+    # Objects of the master are left alone by the garbage collector, collections would copy their pages
+    gc.freeze()
+
+def post_fork(server, worker):
+  if preload_app:
+    import index
+    index.post_fork()
+
+def child_exit(server, worker):
+  multiprocess.mark_process_dead(worker.pid)
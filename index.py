@@ -1,4 +1,5 @@
 # Standard library imports
+import importlib
 import uuid
 
 # Third party imports
@@ -8,7 +9,7 @@ from dash.dependencies import Input, Output
 
 # Local application imports
 from app import app, cache
-from apps import dashboard, monitor
+from modules import gitlab, graphql, lazy, publisher
 import settings
 
 # if __name__ == '__main__':
@@ -16,6 +17,10 @@ import settings
 
 server = app.server
 
+# Only the pages served by this instance are imported, a monitor wallboard doesn't load the analytics pages
+ROUTES = {'/': 'dashboard', '/dashboard': 'dashboard', '/monitor': 'monitor', '/overview': 'overview', '/profiling': 'profiling'}
+pages = {page: importlib.import_module('apps.{}'.format(page)) for page in settings.APP_PAGES + (['profiling'] if settings.PROFILING else [])}
+
 app.layout = html.Div([
   # Current window location for multi-page application
   dcc.Location(id='url', refresh=False),
@@ -25,6 +30,7 @@ app.layout = html.Div([
   dcc.Store(id='memory-commits'),
   dcc.Store(id='memory-deployments'),
   dcc.Store(id='memory-milestones'),
+  dcc.Store(id='memory-freshness'),
 
   # Session based id  
   html.Div(str(uuid.uuid4()), id='session-id', style={'display': 'none'}),
@@ -43,15 +49,37 @@ app.layout = html.Div([
 @app.callback(Output('page', 'children'),
               [Input('url', 'pathname')])
 def display_page(pathname):
-  if pathname == '/' or pathname == '/dashboard':
-    return dashboard.layout
-  elif pathname == '/monitor':
-    return monitor.layout    
+  page = ROUTES.get(pathname)
+  if page in pages:
+    return pages[page].layout
   else:
     return '404'
 
-dashboard.callbacks.register_callbacks()
-monitor.callbacks.register_callbacks()
+[page.callbacks.register_callbacks() for page in pages.values()]
+
+def warm_start():
+  # Seed and warm caches so the first visitor doesn't wait for the crawl
+  if 'dashboard' in pages or 'overview' in pages:
+    # plotly's serializers use pandas and numpy for every response once they are in sys.modules, they are imported
+    # before the collectors start, so no response is serialized while another thread is halfway through importing them
+    lazy.load('pandas')
+    importlib.import_module('apps.dashboard.signals').warm_start()
+  publisher.start()
+
+def post_fork():
+  """Start a worker forked from the preloading master (see gunicorn.conf.py)"""
+  # Connections of the master must not be shared with the workers
+  gitlab.close_clients()
+  graphql.close_clients()
+  warm_start()
+
+if settings.WEB_PRELOAD:
+  # The workers share the analytics dependencies with the master, threads are started after the fork
+  lazy.preload()
+else:
+  warm_start()
 
 if __name__ == '__main__':
+  if settings.WEB_PRELOAD:
+    warm_start()
   app.run_server(debug=settings.DEBUG, host=settings.APP_HOST, port=settings.APP_PORT)
\ No newline at end of file
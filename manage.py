@@ -0,0 +1,69 @@
+# Standard library imports
+import argparse
+from datetime import datetime
+import logging
+import sys
+
+# Local application imports
+import settings
+
+logging.basicConfig(level=settings.LOGLEVEL, format=settings.LOGFORMAT)
+logger = logging.getLogger(__name__)
+
+def snapshot_export(args):
+  from apps.dashboard import signals
+  datasets = args.datasets if args.datasets else signals.DATASETS
+  count = signals.export_snapshot(args.path, datasets)
+  print('Exported {} records to {}'.format(count, args.path))
+
+def snapshot_import(args):
+  from apps.dashboard import signals
+  imported = signals.import_snapshot(args.path, force=args.force)
+  print('Imported datasets: {}'.format(', '.join(imported) if imported else 'none'))
+
+def backfill(args):
+  from modules.backfill import Backfill, BackfillStore
+  store = BackfillStore(args.store)
+  try:
+    result = Backfill(store, args.since, args.until or datetime.now(), resources=args.resources,
+      workers=args.workers, rate=args.rate, window_days=args.window_days).run()
+  finally:
+    store.close()
+  print('Backfilled {} records in {:.1f} s ({:.1f} records/s)'.format(result['records'], result['seconds'], result['records_per_second']))
+  if len(result['failed']) > 0:
+    print('{} of {} tasks stopped, run again to resume'.format(len(result['failed']), result['tasks']))
+    return 1
+  return 0
+
+def __date(value):
+  return datetime.strptime(value, '%Y-%m-%d')
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='{} management commands'.format(settings.APP_NAME))
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  parser_export = commands.add_parser('snapshot-export', help='Export the collected datasets to a snapshot file')
+  parser_export.add_argument('path', help='Snapshot file (gzip JSON lines)')
+  parser_export.add_argument('--datasets', nargs='+', choices=['pipelines', 'commits', 'deployments', 'milestones'])
+  parser_export.set_defaults(func=snapshot_export)
+
+  parser_import = commands.add_parser('snapshot-import', help='Seed the caches from a snapshot file')
+  parser_import.add_argument('path', help='Snapshot file (gzip JSON lines)')
+  parser_import.add_argument('--force', action='store_true', help='Overwrite datasets which are already cached')
+  parser_import.set_defaults(func=snapshot_import)
+
+  parser_backfill = commands.add_parser('backfill', help='Crawl the history of all projects into a local store, resumes interrupted runs')
+  parser_backfill.add_argument('--since', type=__date, required=True, help='First day (YYYY-MM-DD)')
+  parser_backfill.add_argument('--until', type=__date, help='Last day (YYYY-MM-DD), defaults to now')
+  parser_backfill.add_argument('--resources', nargs='+', choices=['pipelines', 'commits', 'deployments', 'milestones'])
+  parser_backfill.add_argument('--store', default=settings.BACKFILL_PATH, help='SQLite file')
+  parser_backfill.add_argument('--workers', type=int, default=settings.BACKFILL_WORKERS, help='Projects crawled in parallel')
+  parser_backfill.add_argument('--rate', type=float, default=settings.BACKFILL_RATE, help='GitLab requests per second')
+  parser_backfill.add_argument('--window-days', type=int, default=settings.BACKFILL_WINDOW_DAYS, help='Days per checkpoint')
+  parser_backfill.set_defaults(func=backfill)
+
+  args = parser.parse_args(argv)
+  return args.func(args) or 0
+
+if __name__ == '__main__':
+  sys.exit(main())
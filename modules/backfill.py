@@ -0,0 +1,167 @@
+# Standard library imports
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Local application imports
+from modules.gitlab import DEFAULT_INSTANCE, GitLab, GitLabError, RateLimiter, instances
+from modules import projects
+import settings
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = ['pipelines', 'commits', 'deployments', 'milestones']
+# Milestone issues belong to the group, they are checkpointed under this project id
+GROUP_PROJECT_ID = 0
+
+class BackfillStore():
+  """SQLite store of backfilled records and crawl checkpoints"""
+
+  def __init__(self, path):
+    self.path = path
+    self.__connection = sqlite3.connect(path, check_same_thread=False)
+    self.__lock = threading.Lock()
+    with self.__lock:
+      self.__connection.execute('PRAGMA journal_mode=WAL')
+      with self.__connection:
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS records ('
+          'resource TEXT, project_id INTEGER, id TEXT, created_at TEXT, data TEXT, '
+          'PRIMARY KEY (resource, project_id, id))')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS checkpoints ('
+          'resource TEXT, project_id INTEGER, window_start TEXT, window_end TEXT, records INTEGER, finished_at TEXT, '
+          'PRIMARY KEY (resource, project_id, window_start, window_end))')
+
+  def close(self):
+    with self.__lock:
+      self.__connection.close()
+
+  def checkpoints(self, resource, project_id):
+    """Return the finished windows of a project's resource as set of (start, end)"""
+    with self.__lock:
+      rows = self.__connection.execute('SELECT window_start, window_end FROM checkpoints WHERE resource = ? AND project_id = ?',
+        (resource, project_id)).fetchall()
+    return set(rows)
+
+  def save(self, resource, project_id, window, records):
+    """Store the records of a window and its checkpoint in one transaction"""
+    rows = [(resource, project_id, str(record['id']), record.get('created_at'), json.dumps(record, separators=(',', ':'), default=str))
+      for record in records]
+    with self.__lock, self.__connection:
+      self.__connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+      self.__connection.execute('INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)',
+        (resource, project_id, window[0], window[1], len(rows), datetime.now().isoformat()))
+
+  def records(self, resource, project_id=None):
+    query = 'SELECT data FROM records WHERE resource = ?'
+    parameters = (resource,)
+    if project_id is not None:
+      query = query + ' AND project_id = ?'
+      parameters = parameters + (project_id,)
+    with self.__lock:
+      rows = self.__connection.execute(query + ' ORDER BY created_at', parameters).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+  def count(self, resource):
+    with self.__lock:
+      return self.__connection.execute('SELECT COUNT(*) FROM records WHERE resource = ?', (resource,)).fetchone()[0]
+
+def windows(since, until, days):
+  """Split since..until into windows of days, returns a list of (start, end)"""
+  retval = []
+  start = since
+  while start < until:
+    end = min(until, start + timedelta(days=days))
+    retval.append((start, end))
+    start = end
+  return retval
+
+class Backfill():
+  """Crawl the history of all projects into a BackfillStore
+
+  Every project and resource is crawled window by window by a pool of threads,
+  each finished window is checkpointed, so an interrupted run resumes with the
+  first unfinished window.
+  """
+
+  def __init__(self, store, since, until, resources=None, workers=None, rate=None, window_days=None):
+    self.store = store
+    self.since = since
+    self.until = until
+    self.resources = resources or RESOURCES
+    self.workers = workers or settings.BACKFILL_WORKERS
+    # Every GitLab instance has a rate budget of its own
+    self.limiters = {instance: RateLimiter(rate or settings.BACKFILL_RATE) for instance in instances()}
+    self.windows = windows(since, until, window_days or settings.BACKFILL_WINDOW_DAYS)
+    self.__local = threading.local()
+    self.__progress_lock = threading.Lock()
+    self.__records = 0
+    self.__started = None
+
+  def __client(self, instance):
+    # requests sessions aren't shared between threads
+    if not hasattr(self.__local, 'clients'):
+      self.__local.clients = {}
+    if instance not in self.__local.clients:
+      self.__local.clients[instance] = GitLab(instance, limiter=self.limiters[instance])
+    return self.__local.clients[instance]
+
+  def __fetch(self, resource, project, start, end):
+    gl = self.__client(project.get('instance') or DEFAULT_INSTANCE)
+    if resource == 'pipelines':
+      return gl.get_pipelines(project['id'], project['ref_name'], since=start, until=end)
+    if resource == 'commits':
+      return gl.get_commits(project['id'], project['ref_name'], since=start, until=end)
+    if resource == 'deployments':
+      return gl.get_deployments(project['id'], since=start, until=end)
+    return gl.get_milestones(settings.GITLAB_GROUP_ID, since=start, until=end)
+
+  def __crawl(self, resource, project):
+    # Projects are stored by key, ids are only unique within an instance (SQLite keeps keys of the default instance as integers)
+    finished = self.store.checkpoints(resource, project['key'])
+    count = 0
+    for start, end in self.windows:
+      window = (start.isoformat(), end.isoformat())
+      if window in finished:
+        continue
+      records = self.__fetch(resource, project, start, end)
+      self.store.save(resource, project['key'], window, records)
+      count = count + len(records)
+      with self.__progress_lock:
+        self.__records = self.__records + len(records)
+    return count
+
+  def tasks(self):
+    retval = [(resource, project) for resource in self.resources if resource != 'milestones' for project in projects.get_projects()]
+    if 'milestones' in self.resources:
+      retval.append(('milestones', {'id': GROUP_PROJECT_ID, 'key': GROUP_PROJECT_ID}))
+    return retval
+
+  def throughput(self):
+    """Records per second since the run started"""
+    elapsed = time.perf_counter() - self.__started if self.__started is not None else 0
+    return self.__records / elapsed if elapsed > 0 else 0.0
+
+  def run(self):
+    """Crawl all unfinished windows, returns a summary of the run"""
+    tasks = self.tasks()
+    self.__started = time.perf_counter()
+    failed = []
+    with ThreadPoolExecutor(max_workers=self.workers) as executor:
+      futures = {executor.submit(self.__crawl, resource, project): (resource, project['key']) for resource, project in tasks}
+      for index, future in enumerate(as_completed(futures)):
+        resource, project_id = futures[future]
+        try:
+          count = future.result()
+        except GitLabError as e:
+          logger.error('Backfill of {} ({}) stopped, run again to resume: {}'.format(resource, project_id, e))
+          failed.append((resource, project_id))
+          continue
+        logger.info('Backfilled {} {} records of project {} ({}/{} tasks, {:.1f} records/s)'.format(
+          count, resource, project_id, index + 1, len(tasks), self.throughput()))
+
+    seconds = time.perf_counter() - self.__started
+    return {'records': self.__records, 'seconds': seconds, 'records_per_second': self.throughput(), 'tasks': len(tasks), 'failed': failed}
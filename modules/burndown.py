@@ -0,0 +1,152 @@
+# Standard library imports
+from datetime import date, timedelta
+from itertools import accumulate
+import threading
+
+# Third party imports
+from dateutil.parser import isoparse
+
+# Local application imports
+from modules.gitlab import ISSUE_EVENT_TYPES
+
+# Daily series of a sprint, changes per day are folded in and summed up when read
+SERIES = ['scope_weight', 'done_weight', 'scope_issues', 'done_issues']
+
+class Burndown():
+  """Daily burndown and burnup of a sprint milestone, folded from issue resource events
+
+  Every issue is tracked as its current state (weight, closed, part of the
+  milestone). Each new state, weight or milestone event changes that state
+  and the change of the issue's contribution is added to the day of the
+  event, the series are running sums of these daily changes. An issue is only
+  fetched again after it was updated, events which were folded in before are
+  skipped.
+  """
+
+  def __init__(self, milestone):
+    self.milestone = {key: milestone[key] for key in ('id', 'title', 'start_date', 'due_date')}
+    self.start = date.fromisoformat(milestone['start_date'])
+    self.days = (date.fromisoformat(milestone['due_date']) - self.start).days + 1
+    # updated_after of the next sync, None until the issues of the milestone were synced once
+    self.watermark = None
+    self.revision = 0
+    self.__deltas = {name: [0] * self.days for name in SERIES}
+    self.__issues = {}      # (project id, iid) -> {'weight', 'closed', 'member', 'updated_at', 'events': {type: last id}}
+    self.__lock = threading.Lock()
+
+  def __day(self, timestamp):
+    # Changes before the sprint count for its first day, later ones for the last
+    return min(max((isoparse(timestamp).date() - self.start).days, 0), self.days - 1)
+
+  @staticmethod
+  def __contribution(state):
+    if not state['member']:
+      return {name: 0 for name in SERIES}
+    return {
+      'scope_weight': state['weight'],
+      'done_weight': state['weight'] if state['closed'] else 0,
+      'scope_issues': 1,
+      'done_issues': 1 if state['closed'] else 0,
+    }
+
+  def __apply(self, state, timestamp, **changes):
+    before = self.__contribution(state)
+    state.update(changes)
+    after = self.__contribution(state)
+    day = self.__day(timestamp)
+    for name in SERIES:
+      self.__deltas[name][day] += after[name] - before[name]
+
+  def __is_member(self, issue):
+    return (issue.get('milestone') or {}).get('id') == self.milestone['id']
+
+  def pending(self, issues):
+    """Return the listed issues whose events have to be synced: issues of the milestone and issues which left it"""
+    with self.__lock:
+      return [issue for issue in issues
+        if (self.__is_member(issue) or (issue['project_id'], issue['iid']) in self.__issues)
+        and self.__issues.get((issue['project_id'], issue['iid']), {}).get('updated_at') != issue['updated_at']]
+
+  def __initial_state(self, issue, events):
+    """State of an issue when it was created, GitLab only records events for later changes"""
+    milestone_events = [event for event in events['milestone'] if (event.get('milestone') or {}).get('id') == self.milestone['id']]
+    if len(milestone_events) > 0:
+      member = milestone_events[0]['action'] == 'remove'
+    else:
+      member = len(events['milestone']) == 0 and self.__is_member(issue)
+    weight = issue.get('weight') or 0 if len(events['weight']) == 0 else 0
+    return {'member': member, 'weight': weight}
+
+  def add(self, issue, events):
+    """Fold the events of an issue (see GitLab.get_issue_events) which are newer than the ones folded before"""
+    key = (issue['project_id'], issue['iid'])
+    with self.__lock:
+      state = self.__issues.get(key)
+      changes = []
+      if state is None:
+        state = {'weight': 0, 'closed': False, 'member': False, 'events': {event_type: 0 for event_type in ISSUE_EVENT_TYPES}}
+        self.__issues[key] = state
+        self.__apply(state, issue['created_at'], **self.__initial_state(issue, events))
+        if len(events['state']) == 0 and issue['state'] == 'closed':
+          changes.append((issue.get('closed_at') or issue['updated_at'], 0, {'closed': True}))
+
+      for event_type in ISSUE_EVENT_TYPES:
+        for event in events[event_type]:
+          if event['id'] <= state['events'][event_type]:
+            continue
+          state['events'][event_type] = max(state['events'][event_type], event['id'])
+          if event_type == 'state':
+            changes.append((event['created_at'], event['id'], {'closed': event['state'] == 'closed'}))
+          elif event_type == 'weight':
+            changes.append((event['created_at'], event['id'], {'weight': event['weight'] or 0}))
+          else:
+            # Added to another milestone means it left this one
+            member = event['action'] == 'add' and (event.get('milestone') or {}).get('id') == self.milestone['id']
+            changes.append((event['created_at'], event['id'], {'member': member}))
+
+      for timestamp, _, change in sorted(changes, key=lambda change: (isoparse(change[0]), change[1])):
+        self.__apply(state, timestamp, **change)
+      state['updated_at'] = issue['updated_at']
+      self.revision = self.revision + 1
+      return len(changes)
+
+  def series(self, today=None):
+    """Return the daily series of the sprint up to today: dates, scope, done, remaining and ideal weights and issue counts"""
+    today = today or date.today()
+    with self.__lock:
+      values = {name: list(accumulate(deltas)) for name, deltas in self.__deltas.items()}
+    last = min((today - self.start).days, self.days - 1)
+    retval = {'dates': [self.start + timedelta(days=day) for day in range(self.days)]}
+    for name in SERIES:
+      retval[name] = [value if day <= last else None for day, value in enumerate(values[name])]
+    for unit in ('weight', 'issues'):
+      retval['remaining_{}'.format(unit)] = [scope - done if scope is not None else None
+        for scope, done in zip(retval['scope_{}'.format(unit)], retval['done_{}'.format(unit)])]
+      # Straight line from the scope on the first day to zero on the due date
+      start = values['scope_{}'.format(unit)][0]
+      retval['ideal_{}'.format(unit)] = [start * (1 - day / max(1, self.days - 1)) for day in range(self.days)]
+    return retval
+
+  def stats(self):
+    with self.__lock:
+      return {'issues': sum(1 for state in self.__issues.values() if state['member']), 'tracked': len(self.__issues)}
+
+  def state(self):
+    """Return the burndown, e.g. to share it through the cache"""
+    with self.__lock:
+      return {
+        'revision': self.revision,
+        'milestone': dict(self.milestone),
+        'watermark': self.watermark,
+        'deltas': {name: list(deltas) for name, deltas in self.__deltas.items()},
+        'issues': {key: dict(state, events=dict(state['events'])) for key, state in self.__issues.items()},
+      }
+
+  def load(self, state):
+    with self.__lock:
+      if state is None or state['milestone']['id'] != self.milestone['id']:
+        return
+      self.revision = state['revision']
+      self.watermark = state['watermark']
+      self.__deltas = state['deltas']
+      self.__issues = state['issues']
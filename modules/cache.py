@@ -0,0 +1,283 @@
+# Standard library imports
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+
+# Third party imports
+from flask_caching.backends import SimpleCache
+import redis
+
+# Local application imports
+import settings
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool():
+  """Return the connection pool shared by all Redis clients of this process"""
+  global _pool
+  if _pool is None:
+    with _pool_lock:
+      if _pool is None:
+        _pool = redis.ConnectionPool.from_url(settings.REDIS_URL, max_connections=settings.REDIS_MAX_CONNECTIONS)
+  return _pool
+
+def get_redis():
+  return redis.Redis(connection_pool=get_connection_pool())
+
+def shared():
+  """True if state is shared between processes through Redis"""
+  return settings.CACHE_TYPE == 'redis' or settings.CACHE_BACKEND == 'chunked'
+
+_local_locks = {}
+
+def get_lock(name, timeout):
+  """Return a lock which is held by one worker at a time
+
+  Redis locks coordinate all worker processes and expire after timeout seconds,
+  without Redis a process local lock is used.
+  """
+  if shared():
+    return get_redis().lock('status-dashboard:lock:{}'.format(name), timeout=timeout)
+  with _pool_lock:
+    return _local_locks.setdefault(name, threading.Lock())
+
+def release_lock(lock):
+  """Release a lock, an already expired Redis lock is not an error"""
+  try:
+    lock.release()
+  except redis.exceptions.LockError as e:
+    logger.warning('Lock expired before release: {}'.format(e))
+
+class MetadataCache():
+  """Small values (names, versions) cached in process and shared through Redis"""
+
+  def __init__(self, prefix='status-dashboard:meta', timeout=3600, local_size=None):
+    self.prefix = prefix
+    self.timeout = timeout
+    # Upper bound of values kept in process, least recently used ones are dropped first
+    self.local_size = local_size
+    self.__local = OrderedDict()
+    self.__lock = threading.Lock()
+
+  def __get_local(self, key):
+    with self.__lock:
+      entry = self.__local.get(key)
+      if entry is None or entry[1] <= time.monotonic():
+        return None
+      self.__local.move_to_end(key)
+      return entry[0]
+
+  def get(self, key):
+    return self.get_many([key])[key]
+
+  def get_many(self, keys):
+    """Return a dict of key -> value (None if missing), Redis is read with a single MGET"""
+    retval = {key: self.__get_local(key) for key in keys}
+    missing = [key for key in keys if retval[key] is None]
+    if len(missing) == 0 or not shared():
+      return retval
+
+    try:
+      blobs = get_redis().mget(['{}:{}'.format(self.prefix, key) for key in missing])
+    except redis.exceptions.RedisError as e:
+      logger.warning('Metadata cache unavailable: {}'.format(e))
+      return retval
+    for key, blob in zip(missing, blobs):
+      if blob is not None:
+        retval[key] = json.loads(blob)
+        self.__set_local(key, retval[key])
+    return retval
+
+  def set(self, key, value):
+    self.__set_local(key, value)
+    if shared():
+      try:
+        get_redis().set('{}:{}'.format(self.prefix, key), json.dumps(value), ex=self.timeout)
+      except redis.exceptions.RedisError as e:
+        logger.warning('Metadata cache unavailable: {}'.format(e))
+
+  def __set_local(self, key, value):
+    with self.__lock:
+      self.__local[key] = (value, time.monotonic() + self.timeout)
+      self.__local.move_to_end(key)
+      if self.local_size is not None:
+        while len(self.__local) > self.local_size:
+          self.__local.popitem(last=False)
+
+class SizedCache(SimpleCache):
+  """In-process Flask-Caching backend bounded by bytes as well as by entries
+
+  Values are kept pickled, the pickle is what an entry costs. Writes beyond
+  the budget evict expired entries first, then the least recently used ones.
+  Values larger than the whole budget are not cached.
+  """
+
+  def __init__(self, threshold=500, default_timeout=300, ignore_errors=False, max_bytes=None):
+    super().__init__(threshold=threshold, default_timeout=default_timeout, ignore_errors=ignore_errors)
+    self.max_bytes = max_bytes or settings.CACHE_MAX_BYTES
+    self.evictions = 0
+    self._cache = OrderedDict()
+    # Bytes of all pickles, kept up to date on every change instead of summed up on every write
+    self._bytes = 0
+    self.__expired_checked = 0
+    self.__lock = threading.RLock()
+
+  @classmethod
+  def factory(cls, app, config, args, kwargs):
+    kwargs.update(threshold=config['CACHE_THRESHOLD'], ignore_errors=config['CACHE_IGNORE_ERRORS'], max_bytes=config.get('CACHE_MAX_BYTES'))
+    return cls(*args, **kwargs)
+
+  def __pop(self, key):
+    item = self._cache.pop(key, None)
+    if item is not None:
+      self._bytes = self._bytes - len(item[1])
+    return item
+
+  def _over_threshold(self):
+    return len(self._cache) > self._threshold or self._bytes > self.max_bytes
+
+  def _remove_expired(self, now):
+    # Entries with a timeout of 0 never expire
+    for key in [key for key, (expires, _) in self._cache.items() if expires != 0 and expires < now]:
+      self.__pop(key)
+
+  def _prune(self):
+    if not self._over_threshold():
+      return
+    # Expired entries are looked for at most once per second, in between the least recently used ones are evicted
+    now = time.time()
+    if now - self.__expired_checked >= 1:
+      self.__expired_checked = now
+      self._remove_expired(now)
+    self._remove_older()
+
+  def _remove_older(self):
+    while len(self._cache) > 1 and self._over_threshold():
+      _, (_, blob) = self._cache.popitem(last=False)
+      self._bytes = self._bytes - len(blob)
+      self.evictions = self.evictions + 1
+
+  def get(self, key):
+    value = super().get(key)
+    if value is not None:
+      with self.__lock:
+        if key in self._cache:
+          self._cache.move_to_end(key)
+    return value
+
+  def set(self, key, value, timeout=None):
+    expires = self._normalize_timeout(timeout)
+    blob = self.serializer.dumps(value)
+    with self.__lock:
+      self.__pop(key)
+      if len(blob) > self.max_bytes:
+        logger.warning('Not caching {} ({} bytes exceed CACHE_MAX_BYTES)'.format(key, len(blob)))
+        return False
+      self._cache[key] = (expires, blob)
+      self._bytes = self._bytes + len(blob)
+      self._prune()
+    return True
+
+  def add(self, key, value, timeout=None):
+    with self.__lock:
+      if self.has(key):
+        return False
+      return self.set(key, value, timeout)
+
+  def delete(self, key):
+    with self.__lock:
+      return self.__pop(key) is not None
+
+  def clear(self):
+    with self.__lock:
+      self._cache.clear()
+      self._bytes = 0
+    return True
+
+  def stats(self):
+    with self.__lock:
+      return {'entries': len(self._cache), 'bytes': self._bytes, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+def dumps(value):
+  """Serialize to compact, zlib compressed JSON"""
+  return zlib.compress(json.dumps(value, separators=(',', ':'), default=str).encode('utf-8'), settings.CACHE_COMPRESS_LEVEL)
+
+def loads(blob):
+  return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+class ChunkedCache():
+  """Redis cache which stores every dataset as independent chunks (e.g. one per project)"""
+
+  def __init__(self, prefix='status-dashboard', timeout=3600, client=None):
+    self.prefix = prefix
+    self.timeout = timeout
+    self.client = client if client is not None else get_redis()
+
+  def __key(self, dataset, chunk):
+    return '{}:{}:{}'.format(self.prefix, dataset, chunk)
+
+  def __digest_key(self, dataset, chunk):
+    return '{}:{}:{}:digest'.format(self.prefix, dataset, chunk)
+
+  def get_many(self, chunks_by_dataset):
+    """Read all requested chunks of all datasets with a single MGET
+
+    Returns a dict of dataset -> {chunk: records}, missing chunks are None.
+    """
+    keys = [(dataset, chunk) for dataset, chunks in chunks_by_dataset.items() for chunk in chunks]
+    retval = {dataset: {} for dataset in chunks_by_dataset}
+    if len(keys) == 0:
+      return retval
+
+    blobs = self.client.mget([self.__key(dataset, chunk) for dataset, chunk in keys])
+    for (dataset, chunk), blob in zip(keys, blobs):
+      value = None
+      if blob is not None:
+        try:
+          value = loads(blob)
+        except (zlib.error, ValueError) as e:
+          logger.warning('Dropping unreadable cache chunk {}:{} ({})'.format(dataset, chunk, e))
+      retval[dataset][chunk] = value
+    return retval
+
+  def set_many(self, dataset, records_by_chunk, timeout=None):
+    """Write chunks of a dataset, only chunks with changed content are rewritten
+
+    Unchanged chunks just get their expiry extended. Returns the list of rewritten chunks.
+    """
+    timeout = self.timeout if timeout is None else timeout
+    chunks = list(records_by_chunk.keys())
+    if len(chunks) == 0:
+      return []
+
+    blobs = {chunk: dumps(records_by_chunk[chunk]) for chunk in chunks}
+    digests = {chunk: hashlib.blake2b(blobs[chunk], digest_size=16).hexdigest() for chunk in chunks}
+    current = self.client.mget([self.__digest_key(dataset, chunk) for chunk in chunks])
+
+    changed = []
+    pipe = self.client.pipeline(transaction=False)
+    for chunk, digest in zip(chunks, current):
+      key = self.__key(dataset, chunk)
+      if digest is not None and digest.decode('utf-8') == digests[chunk]:
+        pipe.expire(key, timeout)
+        pipe.expire(self.__digest_key(dataset, chunk), timeout)
+        continue
+      pipe.set(key, blobs[chunk], ex=timeout)
+      pipe.set(self.__digest_key(dataset, chunk), digests[chunk], ex=timeout)
+      changed.append(chunk)
+    pipe.execute()
+
+    logger.debug('Cache {}: rewrote {} of {} chunks'.format(dataset, len(changed), len(chunks)))
+    return changed
+
+  def delete(self, dataset, chunks):
+    keys = [self.__key(dataset, chunk) for chunk in chunks] + [self.__digest_key(dataset, chunk) for chunk in chunks]
+    if len(keys) > 0:
+      self.client.delete(*keys)
@@ -0,0 +1,77 @@
+# Standard library imports
+import gzip
+import hashlib
+import logging
+
+# Third party imports
+from flask import request
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# Local application imports
+import settings
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/javascript')
+# Responses which only change with a new deployment, validated with a strong ETag
+ETAG_PATHS = ('/_dash-layout', '/_dash-dependencies')
+
+def __accepts(encoding):
+  return request.accept_encodings.quality(encoding) > 0
+
+def __encoding(response):
+  """Return the encoding a response is sent with, None if it stays uncompressed"""
+  if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+    return None
+  if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+    return None
+  if len(response.get_data()) < settings.COMPRESSION_MIN_SIZE:
+    return None
+  if brotli is not None and __accepts('br'):
+    return 'br'
+  if __accepts('gzip'):
+    return 'gzip'
+  return None
+
+def available_encodings():
+  """Encodings responses are compressed with, preferred first"""
+  return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def compress(data, encoding):
+  if encoding == 'br':
+    return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+  return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def __after_request(response):
+  if response.mimetype in COMPRESSIBLE_MIMETYPES:
+    response.vary.add('Accept-Encoding')
+  encoding = __encoding(response)
+
+  if request.method == 'GET' and request.path in ETAG_PATHS and response.status_code == 200 and not response.direct_passthrough:
+    # Every encoding is a representation of its own
+    digest = hashlib.blake2b(response.get_data(), digest_size=16).hexdigest()
+    response.set_etag(digest if encoding is None else '{}-{}'.format(digest, encoding))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.make_conditional(request)
+    if response.status_code == 304:
+      return response
+
+  if encoding is not None:
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+  return response
+
+def init_app(server):
+  """Compress responses and validate static Dash responses with ETags
+
+  Register before other after_request handlers, Flask runs them in reverse
+  order and those should see the uncompressed payload.
+  """
+  if not settings.COMPRESSION_ENABLED:
+    return
+  if brotli is None:
+    logger.info('Brotli is not installed, responses are compressed with gzip only')
+  server.after_request(__after_request)
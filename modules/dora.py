@@ -0,0 +1,181 @@
+# Standard library imports
+from bisect import bisect_left, bisect_right, insort
+import copy
+import statistics
+import threading
+import time
+
+# Third party imports
+from dateutil.parser import isoparse
+
+# Local application imports
+from modules.gitlab import record_project
+import settings
+
+DAY = 86400
+# Rolling windows (days) offered on the dashboard
+WINDOWS = [7, 30, 90]
+
+class DoraEngine():
+  """DORA metrics maintained incrementally from commits, deployments and pipelines
+
+  Every record is processed once, metrics of a rolling window are read from
+  time ordered event lists:
+  - deployment frequency: production deployments per day, over the window
+    or the shorter time the ingested records cover
+  - lead time for changes: commit -> first production deployment containing it
+    (commits of the ref up to the deployed sha)
+  - change failure rate: production deployments whose next finished pipeline failed
+  - time to restore: first failed pipeline -> next successful pipeline
+  """
+
+  def __init__(self, environment=None, retention_days=None):
+    self.environment = environment or settings.DORA_PRODUCTION_ENVIRONMENT
+    self.retention = (retention_days or settings.DORA_RETENTION_DAYS) * DAY
+    self.__projects = {}
+    # Time of the oldest deployment or pipeline ingested, the records cover the time since
+    self.__since = None
+    self.__lock = threading.Lock()
+
+  @staticmethod
+  def __timestamp(value):
+    return isoparse(value).timestamp()
+
+  @staticmethod
+  def __new_project():
+    return {
+      'seen': {},               # record key -> time, records are only processed once
+      'commit_times': {},       # sha -> commit time
+      'pending_commits': [],    # times of commits not deployed yet
+      'awaiting': [],           # deployments waiting for their next pipeline
+      'failing_since': None,
+      'deployments': [],
+      'lead_times': [],         # (deployment time, seconds)
+      'changes': [],            # (deployment time, failed)
+      'restores': [],           # (restore time, seconds)
+    }
+
+  def __project(self, record):
+    return self.__projects.setdefault(record_project(record), self.__new_project())
+
+  def __seen(self, key, record):
+    return key in self.__project(record)['seen']
+
+  def update(self, commits=(), deployments=(), pipelines=()):
+    """Ingest records which weren't processed yet, returns the number of new records"""
+    with self.__lock:
+      horizon = time.time() - self.retention
+      new = 0
+
+      for commit in commits:
+        project = self.__project(commit)
+        if ('commit', commit['id']) in project['seen']:
+          continue
+        timestamp = self.__timestamp(commit.get('committed_date') or commit['created_at'])
+        if timestamp < horizon:
+          continue
+        project['seen'][('commit', commit['id'])] = timestamp
+        project['commit_times'][commit['id']] = timestamp
+        insort(project['pending_commits'], timestamp)
+        new = new + 1
+
+      # Deployments and pipelines depend on each other, process them as one timeline
+      events = []
+      for deployment in deployments:
+        if deployment.get('environment', {}).get('name') != self.environment or self.__seen(('deployment', deployment['id']), deployment):
+          continue
+        events.append((self.__timestamp(deployment['created_at']), 0, ('deployment', deployment['id']), deployment))
+      for pipeline in pipelines:
+        # Running pipelines are picked up once they finished
+        if pipeline['status'] not in ('success', 'failed') or self.__seen(('pipeline', pipeline['id']), pipeline):
+          continue
+        events.append((self.__timestamp(pipeline.get('updated_at') or pipeline['created_at']), 1, ('pipeline', pipeline['id']), pipeline))
+      events.sort(key=lambda event: event[:2])
+
+      for timestamp, kind, key, record in events:
+        if timestamp < horizon:
+          continue
+        self.__since = min(self.__since, timestamp) if self.__since is not None else timestamp
+        project = self.__project(record)
+        project['seen'][key] = timestamp
+        if kind == 0:
+          self.__deployed(project, timestamp, record['sha'])
+        else:
+          self.__pipeline_finished(project, timestamp, record['status'] == 'failed')
+        new = new + 1
+
+      self.__prune(horizon)
+      return new
+
+  def __deployed(self, project, timestamp, sha):
+    # All pending commits up to the deployed one are part of this deployment
+    cutoff = project['commit_times'].get(sha, timestamp)
+    index = bisect_right(project['pending_commits'], cutoff)
+    for commit_time in project['pending_commits'][:index]:
+      insort(project['lead_times'], (timestamp, max(0.0, timestamp - commit_time)))
+    del project['pending_commits'][:index]
+    insort(project['deployments'], timestamp)
+    insort(project['awaiting'], timestamp)
+
+  def __pipeline_finished(self, project, timestamp, failed):
+    index = bisect_right(project['awaiting'], timestamp)
+    for deployment_time in project['awaiting'][:index]:
+      insort(project['changes'], (deployment_time, failed))
+    del project['awaiting'][:index]
+
+    if failed and project['failing_since'] is None:
+      project['failing_since'] = timestamp
+    elif not failed and project['failing_since'] is not None:
+      insort(project['restores'], (timestamp, timestamp - project['failing_since']))
+      project['failing_since'] = None
+
+  def __prune(self, horizon):
+    for project in self.__projects.values():
+      for name in ['deployments', 'pending_commits', 'awaiting']:
+        del project[name][:bisect_left(project[name], horizon)]
+      for name in ['lead_times', 'changes', 'restores']:
+        del project[name][:bisect_left(project[name], (horizon,))]
+      if len(project['seen']) > 0 and min(project['seen'].values()) < horizon:
+        project['seen'] = {key: timestamp for key, timestamp in project['seen'].items() if timestamp >= horizon}
+        project['commit_times'] = {sha: timestamp for sha, timestamp in project['commit_times'].items() if timestamp >= horizon}
+
+  def metrics(self, project=None, days=30, now=None):
+    """Return the metrics of a project by key (or all projects) within the last days"""
+    now = now or time.time()
+    since = now - days * DAY
+    with self.__lock:
+      # GitLab only returns the records of the last weeks, longer windows would under-report the frequency
+      covered = min(days, (now - self.__since) / DAY) if self.__since is not None else days
+      if project is None:
+        projects = list(self.__projects.values())
+      else:
+        projects = [self.__projects[project]] if project in self.__projects else []
+
+      deployments = sum(len(project['deployments']) - bisect_left(project['deployments'], since) for project in projects)
+      lead_times = [seconds for project in projects for _, seconds in project['lead_times'][bisect_left(project['lead_times'], (since,)):]]
+      changes = [failed for project in projects for _, failed in project['changes'][bisect_left(project['changes'], (since,)):]]
+      restores = [seconds for project in projects for _, seconds in project['restores'][bisect_left(project['restores'], (since,)):]]
+
+    return {
+      'deployments': deployments,
+      'deployment_frequency': deployments / max(1, covered),
+      'lead_time_hours': statistics.median(lead_times) / 3600 if len(lead_times) > 0 else None,
+      'change_failure_rate': 100 * sum(changes) / len(changes) if len(changes) > 0 else None,
+      'time_to_restore_hours': statistics.median(restores) / 3600 if len(restores) > 0 else None,
+    }
+
+  def projects(self):
+    """Return the keys of the projects with metrics"""
+    with self.__lock:
+      return list(self.__projects.keys())
+
+  def state(self):
+    """Return the engine state, e.g. to share it through the cache"""
+    with self.__lock:
+      return {'environment': self.environment, 'since': self.__since, 'projects': copy.deepcopy(self.__projects)}
+
+  def load(self, state):
+    with self.__lock:
+      if state is not None and state.get('environment') == self.environment:
+        self.__projects = state['projects']
+        self.__since = state.get('since')
@@ -1,238 +1,605 @@
-# Standard library imports
-from datetime import datetime, timedelta
-import logging
-
-# Third party imports
-import requests
-import settings
-
-logger = logging.getLogger(__name__)
-
-class GitLab():
-  version=''
-
-  def __init__(self):
-    self.api = settings.GITLAB_API_URL    # instance variable unique to each instance
-    self.gl_session = requests.Session()
-    self.gl_session.headers = {
-      'PRIVATE-TOKEN': settings.GITLAB_TOKEN
-    }
-    self.gl_session.verify=True
-    self.get_version()
-
-  # We want to see the last 2 weeks
-  def __timespan(self):
-    return datetime.now() - timedelta(days=14)
-
-  def __get_request(self, endpoint):
-    url = self.api + endpoint
-    logger.debug('GitLab request: ' + url)  
-    response = self.gl_session.get(url = url)
-
-    if response.status_code != 200:
-      logger.error('{}: {}'.format(endpoint, response.text))
-    return response
-
-  def __get_all_pages(self, endpoint):
-    retval = []
-    query_separator = '&' if endpoint.find('?') != -1 else '?'
-
-    page_index = 1
-    next = True
-    while next == True:
-      
-      response = self.__get_request(endpoint + query_separator + 'page={}&per_page=100'.format(page_index) )
-      retval = retval + response.json()
-
-      if 'X-Next-Page' in response.headers and not response.headers['X-Next-Page']:
-        next = False
-      if 'X-Next-Page' in response.headers and response.headers['X-Next-Page']:
-        if int(response.headers['X-Next-Page']) <= page_index:
-          next = False
-      if 'X-Next-Page' not in response.headers:
-        next = False
-      page_index = page_index + 1
-    return retval
-
-  ##########################################################
-
-  def __version(self):
-    return GitLab.version.split('.')
-
-  def get_version(self):
-    response = self.__get_request('/version')
-    if response.status_code == 200:
-      GitLab.version = response.json()['version']
-      return GitLab.version
-    return ''
-
-  ##########################################################
-
-  def get_group_name(self, group_id):
-    response = self.__get_request('/groups/{}'.format(group_id))
-    if response.status_code == 200:
-      return response.json()['name']
-    return ''
-
-  def get_project_name(self, project_id):
-    response = self.__get_request('/projects/{}'.format(project_id))
-    if response.status_code == 200:
-      return response.json()['name']
-    return ''
-
-  ##########################################################
-
-  def get_commits(self, project_id, ref_name):
-    issues = self.__get_all_pages('/projects/{}/repository/commits?ref_name={}&since={}'.format(project_id, ref_name, self.__timespan()))
-    retval = [dict(issue, **{'project_id': project_id}) for issue in issues]
-    return retval
-
-  ##########################################################
-
-  def get_issues(self, group_id, search):
-    issues = self.__get_all_pages('/groups/{}/issues?{}&scope=all&created_after={}'.format(group_id, search, self.__timespan()))
-    retval = [dict(issue, **{'project_name': self.get_project_name(issue['project_id'])}) for issue in issues]
-    return retval
-
-  ##########################################################
-
-  def no_upcoming_milestones_predicate(self, milestone):
-    today = datetime.now().strftime("%Y-%m-%d")
-    return (milestone['due_date'] >= today and milestone['start_date'] <= today) or milestone['state'] == 'closed'
-    
-  def sort_by_milestone_title(self, milestone):
-    return milestone['title']
-
-  def get_milestones(self, group_id):
-    milestones = self.__get_all_pages('/groups/{}/milestones?search=Sprint'.format(group_id))
-    if len(milestones) == 0:
-      return []
-
-    milestones = list(filter(self.no_upcoming_milestones_predicate, milestones))
-    milestones.sort(key=self.sort_by_milestone_title)
-    milestones = milestones[-5:]
-
-    retval = []
-    for milestone in milestones:
-      # milestone_id = str(milestone['id'])
-      milestone_title = str(milestone['title'])
-      # issues = self.__get_all_pages('/groups/{}/milestones/{}/issues'.format(group_id, milestone_id))
-      issues = self.__get_all_pages('/groups/{}/issues?milestone={}&scope=all'.format(group_id, milestone_title))
-      if len(issues) > 0:
-        retval = retval + issues
-    return retval
-
-  ##########################################################
-
-  def get_active_jobs(self, project_id, pipeline_id):
-    retval = []
-    response = self.__get_request('/projects/{}/pipelines/{}/jobs?scope[]=pending&scope[]=running&scope[]=manual'.format(project_id, pipeline_id))
-    if response.status_code == 200:
-      retval = response.json()
-    return retval
-
-  def get_inactive_jobs(self, project_id, pipeline_id):
-    retval = []
-    response = self.__get_request('/projects/{}/pipelines/{}/jobs?scope[]=failed&scope[]=canceled'.format(project_id, pipeline_id))
-    if response.status_code == 200:
-      retval = response.json()
-    return retval
-
-  def get_test_report_summary(self, project_id, pipeline_id):    
-    retval = []
-    major_version = int(self.__version()[0])
-    if major_version < 13:
-      logger.warning('GitLab version ({}) is not support test_report_summary endpoint'.format(GitLab.version))
-      return retval
-
-    response = self.__get_request('/projects/{}/pipelines/{}/test_report_summary'.format(project_id, pipeline_id))
-    if response.status_code == 200:
-      retval = response.json()
-    return retval
-
-  def get_latest_pipeline(self, project_id, ref_name):
-    retval = None
-    response = self.__get_request('/projects/{}/pipelines?ref={}&per_page=1&page=1'.format(project_id, ref_name))
-    
-    if response.status_code != 200:
-      return retval
-    
-    pipelines = response.json()
-
-    if len(pipelines) == 1:
-      pipeline = pipelines[0].copy()     
-
-      # Add project id/name
-      pipeline.update({'project_id': project_id})
-      pipeline.update({'project_name': self.get_project_name(project_id)})
-
-      # Add details
-      response = self.__get_request('/projects/{}/pipelines/{}'.format(project_id, pipeline['id']))
-      detail = response.json() if response.status_code == 200 else None      
-      if detail is not None:
-        coverage = detail['coverage'] if detail['coverage'] is not None else 0
-        duration = detail['duration'] if detail['duration'] is not None else 0
-        pipeline.update({'duration': int(duration)})
-        pipeline.update({'coverage': float(coverage)})
-      else:
-        pipeline.update({'duration': 0})
-        pipeline.update({'coverage': 0.0})
-
-      retval = pipeline
-    return retval
-
-  def get_pipelines(self, project_id, ref_name):
-    pipelines = self.__get_all_pages('/projects/{}/pipelines?ref={}&scope=finished&updated_after={}'.format(project_id, ref_name, self.__timespan()))
-    
-    retval = []
-    for pipeline in pipelines:
-      pipeline_id = pipeline['id']       
-      pipeline_details = pipeline.copy()
-
-      # Add project id/name
-      pipeline_details.update({'project_id': project_id})
-      pipeline_details.update({'project_name': self.get_project_name(project_id)})
-
-      response = self.__get_request('/projects/{}/pipelines/{}'.format(project_id, pipeline_id))
-      detail = response.json() if response.status_code == 200 else None
-
-      # Add coverage details
-      pipeline_details.update({'duration': 0})
-      pipeline_details.update({'coverage': 0.0})
-
-      if detail is not None:
-        coverage = detail['coverage'] if detail['coverage'] is not None else 0
-        duration = detail['duration'] if detail['duration'] is not None else 0
-        pipeline.update({'duration': int(duration)})
-        pipeline_details.update({'coverage': float(coverage)})
-
-      # Add test report details
-      pipeline_details.update({'total_time': 0})
-      pipeline_details.update({'total_count': 0})
-      pipeline_details.update({'success_count': 0})
-      pipeline_details.update({'failed_count': 0})
-      pipeline_details.update({'total_time': 0})
-      pipeline_details.update({'skipped_count': 0})
-      pipeline_details.update({'error_count': 0})
-
-      major_version = int(self.__version()[0])
-      if major_version >= 15:
-        response = self.__get_request('/projects/{}/pipelines/{}/test_report_summary'.format(project_id, pipeline_id))
-        test_report = response.json() if response.status_code == 200 else None
-        if test_report is not None:
-          pipeline_details.update({'total_time': test_report['total']['time']})
-          pipeline_details.update({'total_count': test_report['total']['count']})
-          pipeline_details.update({'success_count': test_report['total']['success']})
-          pipeline_details.update({'failed_count': test_report['total']['failed']})
-          pipeline_details.update({'skipped_count': test_report['total']['skipped']})
-          pipeline_details.update({'error_count': test_report['total']['error']})
-      retval.append(pipeline_details)
-
-    return retval
-
-  ##########################################################
-
-  def get_deployments(self, project_id):
-    deployments = self.__get_all_pages('/projects/{}/deployments?&updated_after={}&status=success'.format(project_id, self.__timespan()))
-    retval = [dict(deployment, **{'project_id': project_id}) for deployment in deployments]
-    return retval
\ No newline at end of file
+# Standard library imports
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import logging
+import re
+import threading
+import time
+
+# Third party imports
+import requests
+
+# Local application imports
+from modules.cache import MetadataCache
+from modules import metrics
+import settings
+
+logger = logging.getLogger(__name__)
+
+# Days of history requested from GitLab
+TIMESPAN_DAYS = 14
+# Attempts of a request answered with 429 (only with a rate limiter)
+RATE_LIMIT_RETRIES = 5
+# Share of GitLab's rate limit left to other users of the token
+RATE_LIMIT_RESERVE = 0.1
+# Pipelines in these states don't change anymore
+FINISHED_STATUSES = ('success', 'failed', 'canceled', 'skipped')
+# Resource events of an issue folded into the sprint burndown
+ISSUE_EVENT_TYPES = ('state', 'weight', 'milestone')
+# System note of a push to a merge request, ends a review round
+PUSH_NOTE = re.compile(r'^added \d+ (new )?commits?')
+
+class GitLabError(Exception):
+  """Raised when a GitLab request could not be completed"""
+
+class DeadlineExceeded(GitLabError):
+  """Raised when the time budget of a refresh is used up"""
+
+# Instance configured by GITLAB_API_URL/GITLAB_TOKEN/GITLAB_GROUP_ID
+DEFAULT_INSTANCE = 'default'
+
+def instance_config(instance=None):
+  """Return the settings of a GitLab instance: api_url, token, group_id, concurrency and rate"""
+  instance = instance or DEFAULT_INSTANCE
+  if instance == DEFAULT_INSTANCE:
+    config = {'api_url': settings.GITLAB_API_URL, 'token': settings.GITLAB_TOKEN, 'group_id': settings.GITLAB_GROUP_ID,
+      'graphql_url': settings.GITLAB_GRAPHQL_URL}
+  elif instance in settings.GITLAB_INSTANCES:
+    config = settings.GITLAB_INSTANCES[instance]
+  else:
+    raise GitLabError('Unknown GitLab instance: {}'.format(instance))
+  return dict({'group_id': None, 'graphql_url': None, 'concurrency': settings.GITLAB_CONCURRENCY, 'rate': settings.GITLAB_RATE}, **config)
+
+def instances():
+  return [DEFAULT_INSTANCE] + [instance for instance in settings.GITLAB_INSTANCES if instance != DEFAULT_INSTANCE]
+
+def project_key(project_id, instance=None):
+  """Key of a project in the dataset chunks and stores, project ids are only unique within an instance
+
+  Projects of the default instance are keyed by their id, e.g. '42', the ones
+  of other instances by instance and id, e.g. 'ee:42'.
+  """
+  instance = instance or DEFAULT_INSTANCE
+  return str(project_id) if instance == DEFAULT_INSTANCE else '{}:{}'.format(instance, project_id)
+
+def record_project(record):
+  """Key of the project of a record, records collected from other instances than the default one carry their instance"""
+  return project_key(record['project_id'], record.get('instance'))
+
+class RateLimiter():
+  """Request rate shared by all clients of an instance (or a crawl)
+
+  Requests are spaced to at most rate per second. When GitLab reports that its
+  rate limit is nearly used up (RateLimit-Remaining) or answers with 429, all
+  threads pause until the limit resets.
+  """
+
+  def __init__(self, rate):
+    self.interval = 1.0 / rate if rate > 0 else 0.0
+    self.__next = time.monotonic()
+    self.__paused_until = 0.0
+    self.__lock = threading.Lock()
+
+  def acquire(self):
+    with self.__lock:
+      now = time.monotonic()
+      slot = max(now, self.__next, self.__paused_until)
+      self.__next = slot + self.interval
+    time.sleep(slot - now)
+
+  def __pause(self, seconds):
+    with self.__lock:
+      self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+  def update(self, response):
+    """Record the rate limit state of a response, returns True if the request has to be repeated"""
+    if response.status_code == 429:
+      seconds = float(response.headers.get('Retry-After', 60))
+      logger.warning('GitLab rate limit exceeded, pausing for {:.0f} s'.format(seconds))
+      self.__pause(seconds)
+      return True
+
+    limit = response.headers.get('RateLimit-Limit')
+    remaining = response.headers.get('RateLimit-Remaining')
+    reset = response.headers.get('RateLimit-Reset')
+    if limit is not None and remaining is not None and reset is not None and int(remaining) <= RATE_LIMIT_RESERVE * int(limit):
+      seconds = max(0.0, int(reset) - time.time())
+      logger.info('GitLab rate limit nearly used up, pausing for {:.0f} s'.format(seconds))
+      self.__pause(seconds)
+    return False
+
+class GitLab():
+  # Per instance: version, names and pipeline details (shared by all workers through Redis),
+  # request slots and rate limiter, shared by all clients of the instance
+  __instances = {}
+  __instances_lock = threading.Lock()
+
+  def __init__(self, instance=None, limiter=None):
+    self.instance = instance or DEFAULT_INSTANCE
+    config = instance_config(self.instance)
+    self.api = config['api_url']    # instance variable unique to each instance
+    self.concurrency = config['concurrency']
+    self.gl_session = requests.Session()
+    self.gl_session.headers = {
+      'PRIVATE-TOKEN': config['token']
+    }
+    # Own connection pool, large enough for the requests in flight of this instance
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+    self.gl_session.mount('http://', adapter)
+    self.gl_session.mount('https://', adapter)
+    self.gl_session.verify=True
+    self.timeout = (settings.GITLAB_CONNECT_TIMEOUT, settings.GITLAB_READ_TIMEOUT)
+
+    self.__state = self.__shared_state(self.instance, config)
+    self.metadata = self.__state['metadata']
+    # Pipeline details shared by the dashboard and monitor, keyed by project and pipeline id
+    self.pipelines = self.__state['pipelines']
+    # A crawl (see modules/backfill.py) can bring its own rate limiter
+    self.limiter = limiter if limiter is not None else self.__state['limiter']
+    self.__local = threading.local()
+    self.get_version()
+
+  @staticmethod
+  def __shared_state(instance, config):
+    with GitLab.__instances_lock:
+      if instance not in GitLab.__instances:
+        # The default instance keeps the cache keys of a single instance setup
+        suffix = '' if instance == DEFAULT_INSTANCE else ':{}'.format(instance)
+        GitLab.__instances[instance] = {
+          'version': '',
+          'metadata': MetadataCache(prefix='status-dashboard:meta' + suffix, timeout=settings.GITLAB_METADATA_TIMEOUT),
+          'pipelines': MetadataCache(prefix='status-dashboard:pipelines' + suffix, timeout=settings.PIPELINE_STORE_TIMEOUT,
+            local_size=settings.PIPELINE_STORE_SIZE),
+          'slots': threading.BoundedSemaphore(config['concurrency']),
+          'limiter': RateLimiter(config['rate']) if config['rate'] > 0 else None,
+        }
+      return GitLab.__instances[instance]
+
+  @property
+  def version(self):
+    return self.__state['version']
+
+  # We want to see the last 2 weeks
+  def __timespan(self):
+    return datetime.now() - timedelta(days=TIMESPAN_DAYS)
+
+  def __range(self, after, before, since, until):
+    """Query parameters of a time range, the last 2 weeks unless since is given"""
+    retval = '&{}={}'.format(after, since if since is not None else self.__timespan())
+    if until is not None:
+      retval = retval + '&{}={}'.format(before, until)
+    return retval
+
+  @contextmanager
+  def deadline(self, seconds):
+    """Limit all requests of the current thread to a total time budget"""
+    previous = getattr(self.__local, 'deadline', None)
+    deadline = time.monotonic() + seconds
+    self.__local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+      yield
+    finally:
+      self.__local.deadline = previous
+
+  def __request_timeout(self, endpoint):
+    deadline = getattr(self.__local, 'deadline', None)
+    if deadline is None:
+      return self.timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      raise DeadlineExceeded('{}: refresh budget exceeded'.format(endpoint))
+    return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+
+  def __get_request(self, endpoint, retries=0):
+    url = self.api + endpoint
+    timeout = self.__request_timeout(endpoint)
+    logger.debug('GitLab request: ' + url)
+    if self.limiter is not None:
+      self.limiter.acquire()
+    started = time.perf_counter()
+    try:
+      with self.__state['slots']:
+        response = self.gl_session.get(url = url, timeout = timeout)
+    except requests.exceptions.Timeout as e:
+      metrics.observe_gitlab_request(endpoint, 'timeout', time.perf_counter() - started)
+      # Raises DeadlineExceeded if the timeout was caused by the refresh budget
+      self.__request_timeout(endpoint)
+      raise GitLabError('{}: {}'.format(endpoint, e)) from e
+    except requests.exceptions.RequestException as e:
+      metrics.observe_gitlab_request(endpoint, 'error', time.perf_counter() - started)
+      raise GitLabError('{}: {}'.format(endpoint, e)) from e
+    metrics.observe_gitlab_request(endpoint, response.status_code, time.perf_counter() - started)
+
+    # Rate limited, the limiter holds back further requests until the limit resets
+    if self.limiter is not None and self.limiter.update(response) and retries < RATE_LIMIT_RETRIES:
+      return self.__get_request(endpoint, retries + 1)
+
+    if response.status_code != 200:
+      logger.error('{}: {}'.format(endpoint, response.text))
+    return response
+
+  def __get_all_pages(self, endpoint):
+    retval = []
+    query_separator = '&' if endpoint.find('?') != -1 else '?'
+
+    page_index = 1
+    next = True
+    while next == True:
+      
+      response = self.__get_request(endpoint + query_separator + 'page={}&per_page=100'.format(page_index) )
+      metrics.observe_gitlab_page(endpoint)
+      # A failed page fails the chunk, the refresh goes on with the other chunks
+      if response.status_code != 200:
+        raise GitLabError('{}: HTTP {}'.format(endpoint, response.status_code))
+      retval = retval + response.json()
+
+      if 'X-Next-Page' in response.headers and not response.headers['X-Next-Page']:
+        next = False
+      if 'X-Next-Page' in response.headers and response.headers['X-Next-Page']:
+        if int(response.headers['X-Next-Page']) <= page_index:
+          next = False
+      if 'X-Next-Page' not in response.headers:
+        next = False
+      page_index = page_index + 1
+    return retval
+
+  def __get_page(self, endpoint, page_index, deadline):
+    # Deadlines are per thread, pages fetched in parallel share the deadline of the caller
+    if deadline is None:
+      response = self.__get_request(endpoint + 'page={}&per_page=100'.format(page_index))
+    else:
+      with self.deadline(deadline - time.monotonic()):
+        response = self.__get_request(endpoint + 'page={}&per_page=100'.format(page_index))
+    metrics.observe_gitlab_page(endpoint)
+    if response.status_code != 200:
+      raise GitLabError('{}: page {} answered with {}'.format(endpoint, page_index, response.status_code))
+    return response
+
+  def __get_pages_concurrently(self, endpoint):
+    """Return all pages of a list, the pages after the first are requested in parallel
+
+    GitLab leaves out the number of pages of large lists, those are requested
+    page by page.
+    """
+    endpoint = endpoint + ('&' if endpoint.find('?') != -1 else '?')
+    deadline = getattr(self.__local, 'deadline', None)
+    first = self.__get_page(endpoint, 1, deadline)
+    retval = first.json()
+    total_pages = int(first.headers.get('X-Total-Pages') or 0)
+
+    if total_pages > 1:
+      with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+        for response in executor.map(lambda page_index: self.__get_page(endpoint, page_index, deadline), range(2, total_pages + 1)):
+          retval = retval + response.json()
+    elif total_pages == 0 and first.headers.get('X-Next-Page'):
+      page_index = 2
+      while True:
+        response = self.__get_page(endpoint, page_index, deadline)
+        retval = retval + response.json()
+        if not response.headers.get('X-Next-Page') or int(response.headers['X-Next-Page']) <= page_index:
+          break
+        page_index = page_index + 1
+    return retval
+
+  ##########################################################
+
+  def __version(self):
+    return self.version.split('.') if self.version else ['0']
+
+  def get_version(self):
+    cached = self.metadata.get('version')
+    if cached is not None:
+      self.__state['version'] = cached
+      return self.version
+
+    try:
+      response = self.__get_request('/version')
+    except GitLabError as e:
+      logger.error('GitLab version could not be detected: {}'.format(e))
+      return ''
+    if response.status_code == 200:
+      self.__state['version'] = response.json()['version']
+      self.metadata.set('version', self.version)
+      return self.version
+    return ''
+
+  ##########################################################
+
+  def get_group_name(self, group_id):
+    key = 'group-name-{}'.format(group_id)
+    cached = self.metadata.get(key)
+    if cached is not None:
+      return cached
+
+    response = self.__get_request('/groups/{}'.format(group_id))
+    if response.status_code == 200:
+      self.metadata.set(key, response.json()['name'])
+      return response.json()['name']
+    return ''
+
+  def get_project_name(self, project_id):
+    key = 'project-name-{}'.format(project_id)
+    cached = self.metadata.get(key)
+    if cached is not None:
+      return cached
+
+    response = self.__get_request('/projects/{}'.format(project_id))
+    if response.status_code == 200:
+      self.metadata.set(key, response.json()['name'])
+      return response.json()['name']
+    return ''
+
+  def get_group_projects(self, group_id):
+    """Return all active projects of a group and its subgroups as list of {'id', 'ref_name'}"""
+    projects = self.__get_all_pages('/groups/{}/projects?include_subgroups=true&archived=false&simple=true&order_by=name&sort=asc'.format(group_id))
+    retval = []
+    for project in projects:
+      # The listing already has the names, spare a request per project later on
+      self.metadata.set('project-name-{}'.format(project['id']), project['name'])
+      retval.append({'id': project['id'], 'ref_name': project['default_branch'] or 'master'})
+    return retval
+
+  ##########################################################
+
+  def get_commits(self, project_id, ref_name, since=None, until=None):
+    issues = self.__get_all_pages('/projects/{}/repository/commits?ref_name={}{}'.format(project_id, ref_name, self.__range('since', 'until', since, until)))
+    retval = [dict(issue, **{'project_id': project_id}) for issue in issues]
+    return retval
+
+  ##########################################################
+
+  def get_issues(self, group_id, search):
+    issues = self.__get_all_pages('/groups/{}/issues?{}&scope=all&created_after={}'.format(group_id, search, self.__timespan()))
+    retval = [dict(issue, **{'project_name': self.get_project_name(issue['project_id'])}) for issue in issues]
+    return retval
+
+  ##########################################################
+
+  def no_upcoming_milestones_predicate(self, milestone):
+    today = datetime.now().strftime("%Y-%m-%d")
+    return (milestone['due_date'] >= today and milestone['start_date'] <= today) or milestone['state'] == 'closed'
+    
+  def sort_by_milestone_title(self, milestone):
+    return milestone['title']
+
+  def get_milestones(self, group_id, since=None, until=None):
+    """Return the issues of the last 5 sprints, or of all sprints overlapping since/until"""
+    milestones = self.__get_all_pages('/groups/{}/milestones?search=Sprint'.format(group_id))
+    if len(milestones) == 0:
+      return []
+
+    if since is None:
+      milestones = list(filter(self.no_upcoming_milestones_predicate, milestones))
+      milestones.sort(key=self.sort_by_milestone_title)
+      milestones = milestones[-5:]
+    else:
+      first = since.strftime("%Y-%m-%d")
+      last = (until or datetime.now()).strftime("%Y-%m-%d")
+      milestones = [milestone for milestone in milestones
+        if milestone['start_date'] is not None and milestone['due_date'] is not None and milestone['start_date'] <= last and milestone['due_date'] >= first]
+      milestones.sort(key=self.sort_by_milestone_title)
+
+    retval = []
+    for milestone in milestones:
+      # milestone_id = str(milestone['id'])
+      milestone_title = str(milestone['title'])
+      # issues = self.__get_all_pages('/groups/{}/milestones/{}/issues'.format(group_id, milestone_id))
+      issues = self.__get_all_pages('/groups/{}/issues?milestone={}&scope=all'.format(group_id, milestone_title))
+      if len(issues) > 0:
+        retval = retval + issues
+    return retval
+
+  def get_active_milestone(self, group_id):
+    """Return the sprint milestone running today, None between sprints"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    milestones = self.__get_all_pages('/groups/{}/milestones?search=Sprint&state=active'.format(group_id))
+    running = [milestone for milestone in milestones
+      if milestone['start_date'] is not None and milestone['due_date'] is not None and milestone['start_date'] <= today <= milestone['due_date']]
+    running.sort(key=self.sort_by_milestone_title)
+    return running[-1] if len(running) > 0 else None
+
+  def get_group_issues(self, group_id, milestone=None, updated_after=None):
+    """Return the issues of a group, optionally of one milestone or updated after a time"""
+    query = '&milestone={}'.format(milestone) if milestone is not None else ''
+    query = query + ('&updated_after={}'.format(updated_after) if updated_after is not None else '')
+    return self.__get_pages_concurrently('/groups/{}/issues?scope=all&order_by=updated_at&sort=asc{}'.format(group_id, query))
+
+  def get_issue_events(self, project_id, iid):
+    """Return the state, weight and milestone events of an issue as dict of event type -> events"""
+    return {event_type: self.__get_pages_concurrently('/projects/{}/issues/{}/resource_{}_events'.format(project_id, iid, event_type))
+      for event_type in ISSUE_EVENT_TYPES}
+
+  ##########################################################
+
+  def get_active_jobs(self, project_id, pipeline_id):
+    retval = []
+    response = self.__get_request('/projects/{}/pipelines/{}/jobs?scope[]=pending&scope[]=running&scope[]=manual'.format(project_id, pipeline_id))
+    if response.status_code == 200:
+      retval = response.json()
+    return retval
+
+  def get_inactive_jobs(self, project_id, pipeline_id):
+    retval = []
+    response = self.__get_request('/projects/{}/pipelines/{}/jobs?scope[]=failed&scope[]=canceled'.format(project_id, pipeline_id))
+    if response.status_code == 200:
+      retval = response.json()
+    return retval
+
+  def get_test_report_summary(self, project_id, pipeline_id):    
+    retval = []
+    major_version = int(self.__version()[0])
+    if major_version < 13:
+      logger.warning('GitLab version ({}) is not support test_report_summary endpoint'.format(self.version))
+      return retval
+
+    response = self.__get_request('/projects/{}/pipelines/{}/test_report_summary'.format(project_id, pipeline_id))
+    if response.status_code == 200:
+      retval = response.json()
+    return retval
+
+  def get_test_report(self, project_id, pipeline_id):
+    """Return the test report of a pipeline with all suites and test cases, None if there is none"""
+    response = self.__get_request('/projects/{}/pipelines/{}/test_report'.format(project_id, pipeline_id))
+    if response.status_code == 200:
+      return response.json()
+    return None
+
+  def get_latest_pipeline(self, project_id, ref_name):
+    """Return the newest pipeline of a ref
+
+    Only the pipeline list is requested, details are fetched when the pipeline
+    changed since it was stored (see get_pipeline_details).
+    """
+    response = self.__get_request('/projects/{}/pipelines?ref={}&per_page=1&page=1'.format(project_id, ref_name))
+    if response.status_code != 200:
+      return None
+
+    pipelines = response.json()
+    if len(pipelines) != 1:
+      return None
+    return self.get_pipeline_details(project_id, pipelines)[0]
+
+  def get_pipelines(self, project_id, ref_name, since=None, until=None):
+    pipelines = self.__get_all_pages('/projects/{}/pipelines?ref={}&scope=finished{}'.format(project_id, ref_name, self.__range('updated_after', 'updated_before', since, until)))
+    return self.get_pipeline_details(project_id, pipelines)
+
+  def get_pipeline_details(self, project_id, pipelines):
+    """Return pipeline list entries with details, shared by the dashboard and monitor
+
+    Details come from the pipeline store unless the status or updated_at of a
+    pipeline changed since they were stored.
+    """
+    keys = ['{}-{}'.format(project_id, pipeline['id']) for pipeline in pipelines]
+    stored = self.pipelines.get_many(keys)
+
+    retval = []
+    for key, pipeline in zip(keys, pipelines):
+      pipeline_details = stored[key]
+      if pipeline_details is None or pipeline_details['status'] != pipeline['status'] or pipeline_details['updated_at'] != pipeline['updated_at']:
+        # Raises GitLabError if a detail request failed, partial details are neither stored nor shown
+        pipeline_details = self.__pipeline_details(project_id, pipeline)
+        self.pipelines.set(key, pipeline_details)
+      retval.append(pipeline_details)
+    return retval
+
+  def __pipeline_details(self, project_id, pipeline):
+    pipeline_id = pipeline['id']
+    pipeline_details = pipeline.copy()
+
+    # Add project id/name
+    pipeline_details.update({'project_id': project_id})
+    pipeline_details.update({'project_name': self.get_project_name(project_id)})
+
+    endpoint = '/projects/{}/pipelines/{}'.format(project_id, pipeline_id)
+    response = self.__get_request(endpoint)
+    if response.status_code != 200:
+      raise GitLabError('{}: HTTP {}'.format(endpoint, response.status_code))
+    detail = response.json()
+
+    # Add coverage details
+    coverage = detail['coverage'] if detail['coverage'] is not None else 0
+    duration = detail['duration'] if detail['duration'] is not None else 0
+    pipeline_details.update({'duration': int(duration)})
+    pipeline_details.update({'queued_duration': float(detail.get('queued_duration') or 0)})
+    pipeline_details.update({'coverage': float(coverage)})
+
+    # Add test report details
+    pipeline_details.update({'total_time': 0})
+    pipeline_details.update({'total_count': 0})
+    pipeline_details.update({'success_count': 0})
+    pipeline_details.update({'failed_count': 0})
+    pipeline_details.update({'skipped_count': 0})
+    pipeline_details.update({'error_count': 0})
+
+    # Test reports are complete once the pipeline finished
+    major_version = int(self.__version()[0])
+    if major_version >= 15 and pipeline['status'] in FINISHED_STATUSES:
+      endpoint = '/projects/{}/pipelines/{}/test_report_summary'.format(project_id, pipeline_id)
+      response = self.__get_request(endpoint)
+      if response.status_code != 200:
+        raise GitLabError('{}: HTTP {}'.format(endpoint, response.status_code))
+      test_report = response.json()
+      if test_report is not None:
+        pipeline_details.update({'total_time': test_report['total']['time']})
+        pipeline_details.update({'total_count': test_report['total']['count']})
+        pipeline_details.update({'success_count': test_report['total']['success']})
+        pipeline_details.update({'failed_count': test_report['total']['failed']})
+        pipeline_details.update({'skipped_count': test_report['total']['skipped']})
+        pipeline_details.update({'error_count': test_report['total']['error']})
+    return pipeline_details
+
+  ##########################################################
+
+  def get_merge_requests(self, project_id, since=None, until=None):
+    """Return the merge requests of a project updated within the range, least recently updated first"""
+    merge_requests = self.__get_pages_concurrently('/projects/{}/merge_requests?state=all&order_by=updated_at&sort=asc{}'.format(
+      project_id, self.__range('updated_after', 'updated_before', since, until)))
+    return [dict(merge_request, **{'project_id': project_id}) for merge_request in merge_requests]
+
+  def get_merge_request_details(self, project_id, merge_request):
+    """Return the review history and size of a merge request
+
+    The first review is the first comment or approval of someone else than the
+    author, a review round ends with the next push of the author.
+    """
+    iid = merge_request['iid']
+    endpoint = '/projects/{}/merge_requests/{}'.format(project_id, iid)
+    response = self.__get_request(endpoint)
+    # Merge requests are fetched again after their update only, a failed request must not store them without their size
+    if response.status_code != 200:
+      raise GitLabError('{}: HTTP {}'.format(endpoint, response.status_code))
+    detail = response.json()
+    notes = self.__get_pages_concurrently('/projects/{}/merge_requests/{}/notes?order_by=created_at&sort=asc'.format(project_id, iid))
+
+    author = (merge_request.get('author') or {}).get('id')
+    first_review_at = None
+    review_rounds = 0
+    reviewing = False
+    for note in notes:
+      if note['system'] and PUSH_NOTE.match(note['body']):
+        reviewing = False
+        continue
+      if note['author']['id'] == author or (note['system'] and not note['body'].startswith('approved')):
+        continue
+      first_review_at = first_review_at or note['created_at']
+      if not reviewing:
+        review_rounds = review_rounds + 1
+        reviewing = True
+
+    return {
+      'project_id': project_id,
+      'iid': iid,
+      'state': merge_request['state'],
+      'created_at': merge_request['created_at'],
+      'updated_at': merge_request['updated_at'],
+      'merged_at': merge_request.get('merged_at'),
+      'first_review_at': first_review_at,
+      'review_rounds': review_rounds,
+      # Files changed, GitLab reports large merge requests as e.g. '1000+'
+      'changes': int(str(detail.get('changes_count') or 0).rstrip('+')),
+    }
+
+  ##########################################################
+
+  def get_deployments(self, project_id, since=None, until=None):
+    deployments = self.__get_all_pages('/projects/{}/deployments?{}&status=success'.format(project_id, self.__range('updated_after', 'updated_before', since, until)))
+    retval = [dict(deployment, **{'project_id': project_id}) for deployment in deployments]
+    return retval
+
+# Clients of the app, one per GitLab instance
+__clients = {}
+__clients_lock = threading.Lock()
+
+def get_client(instance=None):
+  """Return the client shared by all users of a GitLab instance"""
+  instance = instance or DEFAULT_INSTANCE
+  with __clients_lock:
+    if instance not in __clients:
+      __clients[instance] = GitLab(instance)
+    return __clients[instance]
+
+def close_clients():
+  """Close the connections of all clients, e.g. in a process forked after they were used"""
+  with __clients_lock:
+    [client.gl_session.close() for client in __clients.values()]
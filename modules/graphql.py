@@ -0,0 +1,232 @@
+# Standard library imports
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+import time
+
+# Third party imports
+from dateutil.parser import isoparse
+import requests
+
+# Local application imports
+from modules.gitlab import DEFAULT_INSTANCE, FINISHED_STATUSES, TIMESPAN_DAYS, DeadlineExceeded, GitLabError, get_client, instance_config
+from modules import metrics
+import settings
+
+logger = logging.getLogger(__name__)
+
+PIPELINES_QUERY = '''
+query pipelines($ids: [ID!], $ref: String, $updatedAfter: Time, $first: Int, $after: String) {
+  queryComplexity { score limit }
+  projects(ids: $ids, first: $first) {
+    nodes {
+      id
+      name
+      webUrl
+      pipelines(ref: $ref, %s updatedAfter: $updatedAfter, first: $first, after: $after) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          id iid sha ref status source createdAt updatedAt duration queuedDuration coverage
+          testReportSummary { total { time count success failed skipped error } }
+        }
+      }
+    }
+  }
+}
+'''
+# Pipelines per page and projects per query
+PAGE_SIZE = 100
+
+class GitLabGraphQL():
+  """Pipelines of many projects through GitLab's GraphQL API
+
+  Produces the same records as GitLab.get_pipelines and GitLab.get_latest_pipeline,
+  with one paginated query per batch of projects instead of a list, detail and
+  test report request per pipeline. Timestamps are only precise to the second,
+  GraphQL doesn't return milliseconds.
+  """
+
+  def __init__(self, instance=None):
+    self.instance = instance or DEFAULT_INSTANCE
+    config = instance_config(self.instance)
+    self.url = config['graphql_url'] or config['api_url'].rsplit('/api/', 1)[0] + '/api/graphql'
+    self.session = requests.Session()
+    self.session.headers = {
+      'Authorization': 'Bearer {}'.format(config['token'])
+    }
+    self.timeout = (settings.GITLAB_CONNECT_TIMEOUT, settings.GITLAB_READ_TIMEOUT)
+    # Query cost accounting: queries sent and their summed complexity score
+    self.cost = {'queries': 0, 'score': 0, 'limit': None}
+    self.__cost_lock = threading.Lock()
+    self.__local = threading.local()
+
+  @contextmanager
+  def deadline(self, seconds):
+    """Limit all queries of the current thread to a total time budget, see GitLab.deadline"""
+    previous = getattr(self.__local, 'deadline', None)
+    deadline = time.monotonic() + seconds
+    self.__local.deadline = deadline if previous is None else min(previous, deadline)
+    try:
+      yield
+    finally:
+      self.__local.deadline = previous
+
+  def __request_timeout(self):
+    deadline = getattr(self.__local, 'deadline', None)
+    if deadline is None:
+      return self.timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      raise DeadlineExceeded('/graphql: refresh budget exceeded')
+    return (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+
+  def __query(self, query, variables):
+    timeout = self.__request_timeout()
+    started = time.perf_counter()
+    try:
+      response = self.session.post(self.url, json={'query': query, 'variables': variables}, timeout=timeout)
+    except requests.exceptions.Timeout as e:
+      metrics.observe_gitlab_request('/graphql', 'timeout', time.perf_counter() - started)
+      # Raises DeadlineExceeded if the timeout was caused by the refresh budget
+      self.__request_timeout()
+      raise GitLabError('/graphql: {}'.format(e)) from e
+    except requests.exceptions.RequestException as e:
+      metrics.observe_gitlab_request('/graphql', 'error', time.perf_counter() - started)
+      raise GitLabError('/graphql: {}'.format(e)) from e
+    metrics.observe_gitlab_request('/graphql', response.status_code, time.perf_counter() - started)
+
+    if response.status_code != 200:
+      raise GitLabError('/graphql: {} {}'.format(response.status_code, response.text))
+    try:
+      payload = response.json()
+    except ValueError as e:
+      raise GitLabError('/graphql: invalid response: {}'.format(e)) from e
+    if payload.get('errors'):
+      raise GitLabError('/graphql: {}'.format('; '.join(error.get('message', str(error)) for error in payload['errors'])))
+    if not isinstance(payload.get('data'), dict):
+      raise GitLabError('/graphql: response without data')
+
+    data = payload['data']
+    complexity = data.get('queryComplexity')
+    if complexity is not None:
+      with self.__cost_lock:
+        self.cost['queries'] = self.cost['queries'] + 1
+        self.cost['score'] = self.cost['score'] + complexity['score']
+        self.cost['limit'] = complexity['limit']
+      if complexity['score'] > 0.8 * complexity['limit']:
+        logger.warning('GraphQL query complexity {} close to the limit of {}'.format(complexity['score'], complexity['limit']))
+    return data
+
+  @staticmethod
+  def __id(gid):
+    return int(gid.rsplit('/', 1)[1])
+
+  @staticmethod
+  def __time(value):
+    # Same format as the REST API
+    value = isoparse(value).astimezone(timezone.utc)
+    return value.strftime('%Y-%m-%dT%H:%M:%S') + '.{:03d}Z'.format(value.microsecond // 1000)
+
+  def __record(self, project, node):
+    """Convert a GraphQL pipeline to the record of GitLab.get_pipelines"""
+    pipeline_id = self.__id(node['id'])
+    status = node['status'].lower()
+    record = {
+      'id': pipeline_id,
+      'iid': int(node['iid']),
+      'project_id': self.__id(project['id']),
+      'sha': node['sha'],
+      'ref': node['ref'],
+      'status': status,
+      'source': node['source'],
+      'created_at': self.__time(node['createdAt']),
+      'updated_at': self.__time(node['updatedAt']),
+      'web_url': '{}/-/pipelines/{}'.format(project['webUrl'], pipeline_id),
+      'project_name': project['name'],
+      'duration': int(node['duration'] or 0),
+      'queued_duration': float(node.get('queuedDuration') or 0.0),
+      'coverage': float(node['coverage'] or 0.0),
+    }
+
+    # Test reports are only requested for finished pipelines by the REST client
+    total = None
+    if int(get_client(self.instance).version.split('.')[0] or 0) >= 15 and status in FINISHED_STATUSES and node.get('testReportSummary'):
+      total = node['testReportSummary']['total']
+    record.update({
+      'total_time': total['time'] if total else 0,
+      'total_count': total['count'] if total else 0,
+      'success_count': total['success'] if total else 0,
+      'failed_count': total['failed'] if total else 0,
+      'skipped_count': total['skipped'] if total else 0,
+      'error_count': total['error'] if total else 0,
+    })
+    return record
+
+  def __pipelines(self, project_ids, ref_name, updated_after=None, latest=False):
+    """Return dict of project id -> records, following the pipeline pages of every project
+
+    With latest only the newest pipeline (of any status) of every project is returned.
+    """
+    query = PIPELINES_QUERY % ('' if latest else 'scope: FINISHED,')
+    variables = {'ids': ['gid://gitlab/Project/{}'.format(project_id) for project_id in project_ids],
+      'ref': ref_name, 'updatedAfter': updated_after, 'first': 1 if latest else PAGE_SIZE, 'after': None}
+    data = self.__query(query, variables)
+
+    retval = {}
+    try:
+      for project in data['projects']['nodes']:
+        connection = project['pipelines']
+        records = [self.__record(project, node) for node in connection['nodes']]
+        # Only projects with more pipelines than fit on a page need further queries
+        while not latest and connection['pageInfo']['hasNextPage']:
+          page = self.__query(query, dict(variables, ids=[project['id']], after=connection['pageInfo']['endCursor']))
+          connection = page['projects']['nodes'][0]['pipelines']
+          records = records + [self.__record(project, node) for node in connection['nodes']]
+        retval[self.__id(project['id'])] = records
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+      # Callers handle GitLabError, a response of another shape is a failed query
+      raise GitLabError('/graphql: unexpected response: {!r}'.format(e)) from e
+    return retval
+
+  def get_pipelines_many(self, projects):
+    """Return finished pipelines of the last 2 weeks as dict of project id -> records
+
+    projects is a list of {'id', 'ref_name'}, projects GitLab didn't return are
+    left out (e.g. missing permissions).
+    """
+    updated_after = (datetime.now(timezone.utc) - timedelta(days=TIMESPAN_DAYS)).isoformat()
+    by_ref = {}
+    for project in projects:
+      by_ref.setdefault(project['ref_name'], []).append(project['id'])
+
+    retval = {}
+    batch_size = min(PAGE_SIZE, settings.GITLAB_GRAPHQL_BATCH_SIZE)
+    for ref_name, project_ids in by_ref.items():
+      for index in range(0, len(project_ids), batch_size):
+        retval.update(self.__pipelines(project_ids[index:index + batch_size], ref_name, updated_after))
+    return retval
+
+  def get_pipelines(self, project_id, ref_name):
+    return self.get_pipelines_many([{'id': project_id, 'ref_name': ref_name}]).get(project_id, [])
+
+  def get_latest_pipeline(self, project_id, ref_name):
+    records = self.__pipelines([project_id], ref_name, latest=True).get(project_id, [])
+    return records[0] if len(records) > 0 else None
+
+# Clients of the app, one per GitLab instance
+__clients = {}
+__clients_lock = threading.Lock()
+
+def get_graphql_client(instance=None):
+  """Return the GraphQL client shared by all users of a GitLab instance"""
+  instance = instance or DEFAULT_INSTANCE
+  with __clients_lock:
+    if instance not in __clients:
+      __clients[instance] = GitLabGraphQL(instance)
+    return __clients[instance]
+
+def close_clients():
+  """Close the connections of all clients, e.g. in a process forked after they were used"""
+  with __clients_lock:
+    [client.session.close() for client in __clients.values()]
@@ -0,0 +1,59 @@
+# Standard library imports
+import importlib
+import threading
+import types
+
+__modules = {}      # name -> LazyModule
+__imported = {}     # name -> module, once imported
+__setups = {}       # name -> callables run with the module once it is imported
+__lock = threading.RLock()
+
+class LazyModule(types.ModuleType):
+  """Stand-in for a module which is imported on first attribute access"""
+
+  def __getattr__(self, attribute):
+    module = load(self.__name__)
+    # Later lookups go straight to the module's attributes
+    self.__dict__.update(module.__dict__)
+    return getattr(module, attribute)
+
+  def __repr__(self):
+    return '<lazy module {!r}>'.format(self.__name__)
+
+def lazy_import(name):
+  """Return a module which is only imported once it is used
+
+  For the heavy analytics dependencies (pandas, numpy, plotly), workers which
+  never build a DataFrame or figure don't pay for them:
+
+    pd = lazy_import('pandas')
+  """
+  with __lock:
+    return __modules.setdefault(name, LazyModule(name))
+
+def when_imported(name, setup):
+  """Call setup with a lazily imported module once it is imported, right away if it already is"""
+  with __lock:
+    if name in __imported:
+      setup(__imported[name])
+    else:
+      __setups.setdefault(name, []).append(setup)
+
+def load(name):
+  """Import a lazily imported module and run its setups"""
+  module = __imported.get(name)
+  if module is not None:
+    return module
+  with __lock:
+    if name not in __imported:
+      module = importlib.import_module(name)
+      for setup in __setups.pop(name, []):
+        setup(module)
+      __imported[name] = module
+    return __imported[name]
+
+def preload():
+  """Import all lazily imported modules, e.g. in a preloading master process to share them with its workers"""
+  with __lock:
+    names = list(__modules)
+  return [load(name) for name in names]
@@ -0,0 +1,301 @@
+# Standard library imports
+import threading
+import time
+
+# Third party imports
+from dateutil.parser import isoparse
+
+# Local application imports
+from modules.lazy import lazy_import
+from modules import retention
+import settings
+
+np = lazy_import('numpy')
+
+DAY = 86400
+# Merge request states as stored in the state column
+STATES = ['opened', 'merged', 'closed', 'locked']
+OPENED, MERGED, CLOSED, LOCKED = range(len(STATES))
+# One row per merge request, 31 bytes
+COLUMNS = [
+  ('project', 'int32'),         # Index of the project's key
+  ('iid', 'int32'),
+  ('state', 'int8'),
+  ('created', 'uint32'),        # Seconds since the epoch
+  ('updated', 'uint32'),
+  ('first_review', 'uint32'),   # 0 until someone else than the author reviewed
+  ('merged', 'uint32'),         # 0 unless merged
+  ('rounds', 'int16'),
+  ('changes', 'int32'),         # Files changed
+]
+ROW_BYTES = 31
+# Upper bounds of the hour buckets of time to first review and time to merge, 5 minutes to about 3 months (30% wide)
+HOUR_EDGES = [round(5 / 60 * 1.3 ** index, 3) for index in range(40)]
+# Review rounds 0 to 9, the last bucket holds 10 and more
+ROUNDS = 11
+# Upper bounds of the size buckets (files changed)
+SIZE_EDGES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+SIZE_LABELS = ['1', '2', '3-4', '5-8', '9-16', '17-32', '33-64', '65-128', '129-256', '257-512', '> 512']
+# Aggregates of a project: counters and histograms, updated with every ingested merge request
+COUNTERS = ['merge_requests', 'opened', 'merged', 'closed', 'reviewed', 'rounds']
+
+class MergeRequestStore():
+  """Merge requests of all projects with incrementally maintained aggregates
+
+  Every merge request is a row of a few numpy columns, projects are stored by
+  the index of their key. The latest version of a merge request replaces the
+  earlier one. Per project counters and
+  histograms (time to first review, time to merge, review rounds, size) are
+  updated with every row, removing the contribution of the replaced version
+  first, so metrics are read without touching the rows. Percentiles are
+  estimated from the histograms. Rows not updated within the retention
+  period are dropped.
+  """
+
+  def __init__(self, retention_days=None):
+    self.retention = (retention_days or settings.MERGE_REQUEST_DAYS) * DAY
+    self.revision = 0
+    # numpy is only imported once there are merge requests
+    self.__columns = None
+    self.__size = 0
+    self.__rows = {}          # (project index, iid) -> row
+    self.__projects = []      # project index -> project key
+    self.__aggregates = {}    # project key -> {'counters', 'review', 'merge', 'rounds', 'size'}
+    self.__watermarks = {}    # project key -> updated_at of the latest ingested merge request
+    self.__lock = threading.Lock()
+
+  def __ensure_columns(self):
+    if self.__columns is None:
+      self.__columns = {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+
+  @staticmethod
+  def __timestamp(value):
+    return int(isoparse(value).timestamp()) if value else 0
+
+  def __project_index(self, project, add=False):
+    """Return the index of a project key in the project column, -1 if it has no merge requests"""
+    if project not in self.__projects:
+      if not add:
+        return -1
+      self.__projects.append(project)
+    return self.__projects.index(project)
+
+  def watermark(self, project):
+    """Return updated_after of the next crawl of a project by key, None before the first one"""
+    with self.__lock:
+      return self.__watermarks.get(project)
+
+  def changed(self, project, merge_requests):
+    """Return the listed merge requests of a project which are not stored in this version yet"""
+    with self.__lock:
+      self.__ensure_columns()
+      index = self.__project_index(project)
+      return [merge_request for merge_request in merge_requests
+        if (index, merge_request['iid']) not in self.__rows
+        or self.__columns['updated'][self.__rows[(index, merge_request['iid'])]] != self.__timestamp(merge_request['updated_at'])]
+
+  def add(self, project, merge_requests, watermark):
+    """Ingest merge requests (see GitLab.get_merge_request_details) of a project and advance its watermark, returns their number"""
+    with self.__lock:
+      self.__ensure_columns()
+      index = self.__project_index(project, add=True)
+      for merge_request in merge_requests:
+        values = {
+          'project': index,
+          'iid': merge_request['iid'],
+          'state': STATES.index(merge_request['state']) if merge_request['state'] in STATES else OPENED,
+          'created': self.__timestamp(merge_request['created_at']),
+          'updated': self.__timestamp(merge_request['updated_at']),
+          'first_review': self.__timestamp(merge_request['first_review_at']),
+          'merged': self.__timestamp(merge_request['merged_at']),
+          'rounds': min(merge_request['review_rounds'], np.iinfo(np.int16).max),
+          'changes': merge_request['changes'],
+        }
+        key = (index, merge_request['iid'])
+        if key in self.__rows:
+          row = self.__rows[key]
+          self.__account(self.__row(row), -1)
+        else:
+          row = self.__append()
+          self.__rows[key] = row
+        for name, value in values.items():
+          self.__columns[name][row] = value
+        self.__account(values, 1)
+      if watermark is not None:
+        self.__watermarks[project] = watermark
+      self.__prune(time.time() - self.retention)
+      self.__limit(index, retention.policy('merge-requests', project))
+      if len(merge_requests) > 0:
+        self.revision = self.revision + 1
+      return len(merge_requests)
+
+  def __append(self):
+    capacity = len(self.__columns['iid'])
+    if self.__size == capacity:
+      capacity = max(2 * capacity, 1024)
+      for name, dtype in COLUMNS:
+        column = np.empty(capacity, dtype)
+        column[:self.__size] = self.__columns[name][:self.__size]
+        self.__columns[name] = column
+    self.__size = self.__size + 1
+    return self.__size - 1
+
+  def __row(self, row):
+    return {name: int(self.__columns[name][row]) for name, _ in COLUMNS}
+
+  @staticmethod
+  def __empty_aggregate():
+    return {
+      'counters': np.zeros(len(COUNTERS), np.int64),
+      'review': np.zeros(len(HOUR_EDGES) + 1, np.int64),
+      'merge': np.zeros(len(HOUR_EDGES) + 1, np.int64),
+      'rounds': np.zeros(ROUNDS, np.int64),
+      'size': np.zeros(len(SIZE_EDGES) + 1, np.int64),
+    }
+
+  def __aggregate(self, project):
+    if project not in self.__aggregates:
+      self.__aggregates[project] = self.__empty_aggregate()
+    return self.__aggregates[project]
+
+  def __account(self, values, sign):
+    """Add (sign 1) or remove (sign -1) the contribution of a merge request to the aggregates of its project"""
+    aggregate = self.__aggregate(self.__projects[values['project']])
+    counters = aggregate['counters']
+    counters[COUNTERS.index('merge_requests')] += sign
+    counters[COUNTERS.index(STATES[values['state']] if values['state'] != LOCKED else 'opened')] += sign
+    if values['first_review'] > 0:
+      counters[COUNTERS.index('reviewed')] += sign
+      aggregate['review'][np.searchsorted(HOUR_EDGES, max(0, values['first_review'] - values['created']) / 3600)] += sign
+    if values['state'] == MERGED and values['merged'] > 0:
+      counters[COUNTERS.index('rounds')] += sign * values['rounds']
+      aggregate['merge'][np.searchsorted(HOUR_EDGES, max(0, values['merged'] - values['created']) / 3600)] += sign
+      aggregate['rounds'][min(values['rounds'], ROUNDS - 1)] += sign
+    if values['changes'] > 0:
+      aggregate['size'][np.searchsorted(SIZE_EDGES, values['changes'])] += sign
+
+  def __prune(self, horizon):
+    """Drop merge requests which were not updated since horizon"""
+    if self.__size == 0 or self.__columns['updated'][:self.__size].min() >= horizon:
+      return
+    self.__keep(self.__columns['updated'][:self.__size] >= horizon)
+
+  def __limit(self, index, limits):
+    """Drop the least recently updated merge requests of a project (by index) beyond its retention policy"""
+    max_rows = retention.max_rows(limits, ROW_BYTES)
+    if limits['max_age_days'] <= 0 and max_rows == 0:
+      return
+    rows = np.flatnonzero(self.__columns['project'][:self.__size] == index)
+    keep = np.ones(self.__size, bool)
+    if limits['max_age_days'] > 0:
+      keep[rows] = self.__columns['updated'][rows] >= time.time() - limits['max_age_days'] * DAY
+      rows = rows[keep[rows]]
+    if max_rows > 0 and len(rows) > max_rows:
+      keep[rows[np.argsort(self.__columns['updated'][rows], kind='stable')[:len(rows) - max_rows]]] = False
+    if not keep.all():
+      self.__keep(keep)
+
+  def __keep(self, keep):
+    """Keep the rows of a mask, the others are removed from the aggregates"""
+    for row in np.flatnonzero(~keep):
+      self.__account(self.__row(row), -1)
+    for name, _ in COLUMNS:
+      kept = self.__columns[name][:self.__size][keep]
+      self.__columns[name][:len(kept)] = kept
+    self.__size = int(keep.sum())
+    self.__index()
+
+  def __index(self):
+    self.__rows = {key: row for row, key in enumerate(zip(self.__columns['project'][:self.__size].tolist(), self.__columns['iid'][:self.__size].tolist()))}
+
+  @staticmethod
+  def __percentile(histogram, share, edges):
+    """Estimate a percentile from a histogram, interpolating within the bucket"""
+    total = histogram.sum()
+    if total == 0:
+      return None
+    cumulative = np.cumsum(histogram)
+    bucket = int(np.searchsorted(cumulative, share * total))
+    lower = edges[bucket - 1] if bucket > 0 else 0.0
+    upper = edges[bucket] if bucket < len(edges) else edges[-1]
+    before = cumulative[bucket - 1] if bucket > 0 else 0
+    return float(lower + (upper - lower) * (share * total - before) / histogram[bucket])
+
+  def __merged(self, project):
+    """Return the aggregates of a project, or the sum of all projects"""
+    if project is not None:
+      return self.__aggregates.get(project) or self.__empty_aggregate()
+    retval = self.__empty_aggregate()
+    for aggregate in self.__aggregates.values():
+      for name, values in aggregate.items():
+        retval[name] += values
+    return retval
+
+  def metrics(self, project=None):
+    """Return the merge request metrics of a project by key (or all projects)"""
+    with self.__lock:
+      self.__ensure_columns()
+      aggregate = self.__merged(project)
+      counters = dict(zip(COUNTERS, aggregate['counters'].tolist()))
+      return {
+        'merge_requests': counters['merge_requests'],
+        'opened': counters['opened'],
+        'merged': counters['merged'],
+        'review_time_median': self.__percentile(aggregate['review'], 0.5, HOUR_EDGES),
+        'review_time_p90': self.__percentile(aggregate['review'], 0.9, HOUR_EDGES),
+        'merge_time_median': self.__percentile(aggregate['merge'], 0.5, HOUR_EDGES),
+        'merge_time_p90': self.__percentile(aggregate['merge'], 0.9, HOUR_EDGES),
+        'review_rounds': counters['rounds'] / counters['merged'] if counters['merged'] > 0 else None,
+        'unreviewed_merges': int(aggregate['rounds'][0]),
+      }
+
+  def size_distribution(self, project=None):
+    """Return the number of merge requests per size bucket as list of (label, count)"""
+    with self.__lock:
+      self.__ensure_columns()
+      return list(zip(SIZE_LABELS, self.__merged(project)['size'].tolist()))
+
+  def footprint(self):
+    """Return the stored merge requests and their bytes per project"""
+    with self.__lock:
+      self.__ensure_columns()
+      projects, counts = np.unique(self.__columns['project'][:self.__size], return_counts=True)
+      return {self.__projects[index]: {'records': int(count), 'bytes': int(count) * ROW_BYTES} for index, count in zip(projects.tolist(), counts)}
+
+  def projects(self):
+    """Return the keys of the projects with merge requests"""
+    with self.__lock:
+      return list(self.__aggregates.keys())
+
+  def stats(self):
+    with self.__lock:
+      self.__ensure_columns()
+      return {
+        'merge_requests': self.__size,
+        'projects': len(self.__aggregates),
+        'bytes': sum(column.nbytes for column in self.__columns.values()),
+      }
+
+  def state(self):
+    """Return the store, e.g. to share it through the cache"""
+    with self.__lock:
+      self.__ensure_columns()
+      return {
+        'revision': self.revision,
+        'columns': {name: self.__columns[name][:self.__size].copy() for name, _ in COLUMNS},
+        'projects': list(self.__projects),
+        'watermarks': dict(self.__watermarks),
+        'aggregates': {project: {name: values.copy() for name, values in aggregate.items()} for project, aggregate in self.__aggregates.items()},
+      }
+
+  def load(self, state):
+    with self.__lock:
+      if state is None:
+        return
+      self.revision = state['revision']
+      self.__columns = {name: state['columns'][name].astype(dtype) for name, dtype in COLUMNS}
+      self.__size = len(self.__columns['iid'])
+      self.__projects = list(state['projects'])
+      self.__watermarks = dict(state['watermarks'])
+      self.__aggregates = state['aggregates']
+      self.__index()
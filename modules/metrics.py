@@ -0,0 +1,104 @@
+# Standard library imports
+import os
+import re
+import time
+
+# Third party imports
+from flask import Response, request
+from prometheus_client import CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+# Local application imports
+import settings
+
+__numeric_segment = re.compile(r'/\d+(?=/|$)')
+__numeric_id = re.compile(r'\d+')
+
+GITLAB_REQUEST_DURATION = Histogram(
+  'gitlab_request_duration_seconds', 'GitLab API request latency',
+  ['endpoint', 'status'])
+GITLAB_PAGES = Counter(
+  'gitlab_pages_fetched_total', 'GitLab API result pages fetched',
+  ['endpoint'])
+
+CACHE_LOOKUPS = Counter(
+  'dataset_cache_lookups_total', 'Dataset cache lookups',
+  ['dataset', 'backend'])
+CACHE_MISSES = Counter(
+  'dataset_cache_misses_total', 'Dataset cache lookups which had to be collected from GitLab',
+  ['dataset', 'backend'])
+
+COLLECTOR_DURATION = Histogram(
+  'collector_run_duration_seconds', 'Duration of a dataset collection',
+  ['dataset'], buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, float('inf')))
+COLLECTOR_CHUNKS = Counter(
+  'collector_chunks_total', 'Collected dataset chunks by result',
+  ['dataset', 'status'])
+
+CALLBACK_DURATION = Histogram(
+  'dash_callback_duration_seconds', 'Dash callback execution time',
+  ['output'])
+CALLBACK_RESPONSE_BYTES = Histogram(
+  'dash_callback_response_bytes', 'Dash callback response payload size',
+  ['output'], buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf')))
+
+def endpoint_label(endpoint):
+  """Reduce a GitLab endpoint to its template, e.g. /projects/:id/pipelines"""
+  return __numeric_segment.sub('/:id', endpoint.split('?', 1)[0])
+
+def output_label(output):
+  """Reduce a callback output to its template, e.g. project-:id-coverage.figure"""
+  return __numeric_id.sub(':id', output)
+
+def observe_gitlab_request(endpoint, status, duration):
+  if settings.METRICS_ENABLED:
+    GITLAB_REQUEST_DURATION.labels(endpoint_label(endpoint), str(status)).observe(duration)
+
+def observe_gitlab_page(endpoint):
+  if settings.METRICS_ENABLED:
+    GITLAB_PAGES.labels(endpoint_label(endpoint)).inc()
+
+def observe_cache_lookup(dataset, backend):
+  if settings.METRICS_ENABLED:
+    CACHE_LOOKUPS.labels(dataset, backend).inc()
+
+def observe_cache_miss(dataset, backend):
+  if settings.METRICS_ENABLED:
+    CACHE_MISSES.labels(dataset, backend).inc()
+
+def observe_collector_run(dataset, duration, statuses):
+  if settings.METRICS_ENABLED:
+    COLLECTOR_DURATION.labels(dataset).observe(duration)
+    for status in statuses:
+      COLLECTOR_CHUNKS.labels(dataset, status).inc()
+
+def __before_request():
+  request.environ['metrics.started'] = time.perf_counter()
+
+def __after_request(response):
+  started = request.environ.get('metrics.started')
+  if started is None or request.path != '/_dash-update-component':
+    return response
+
+  body = request.get_json(silent=True) or {}
+  output = output_label(str(body.get('output', 'unknown')))
+  CALLBACK_DURATION.labels(output).observe(time.perf_counter() - started)
+  if response.content_length is not None:
+    CALLBACK_RESPONSE_BYTES.labels(output).observe(response.content_length)
+  return response
+
+def __metrics():
+  if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    # Aggregate the metrics of all worker processes
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+  return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+def init_app(server):
+  """Register the metrics endpoint and callback instrumentation on the Flask server"""
+  if not settings.METRICS_ENABLED:
+    return
+  server.before_request(__before_request)
+  server.after_request(__after_request)
+  server.add_url_rule(settings.METRICS_PATH, 'metrics', __metrics)
@@ -0,0 +1,194 @@
+# Standard library imports
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import cProfile
+from datetime import datetime
+from functools import wraps
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+# Third party imports
+from flask import Response, g, request, send_file
+
+# Local application imports
+import settings
+
+logger = logging.getLogger(__name__)
+
+__local = threading.local()
+__records = deque(maxlen=settings.PROFILING_HISTORY)
+__records_lock = threading.Lock()
+__disabled = nullcontext()
+
+def __current():
+  return getattr(__local, 'record', None)
+
+@contextmanager
+def __timed_phase(name):
+  """Time a phase exclusive of the phases nested in it, e.g. a figure phase doesn't count the normalize phase within"""
+  record = __current()
+  stack = __local.__dict__.setdefault('stack', [])
+  stack.append(0.0)
+  started = time.perf_counter()
+  try:
+    yield
+  finally:
+    elapsed = time.perf_counter() - started
+    nested = stack.pop()
+    if len(stack) > 0:
+      stack[-1] = stack[-1] + elapsed
+    if record is not None:
+      record['phases'][name] = record['phases'].get(name, 0.0) + elapsed - nested
+
+def phase(name):
+  """Account the wrapped block to a phase of the current callback invocation, without the phases nested in it"""
+  if not settings.PROFILING or __current() is None:
+    return __disabled
+  return __timed_phase(name)
+
+def timed(name):
+  """Decorator accounting a function to a phase of the current callback invocation, e.g. a whole render callback to figure"""
+  def decorator(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+      with phase(name):
+        return func(*args, **kwargs)
+    return wrapper
+  return decorator
+
+def records():
+  with __records_lock:
+    return list(__records)
+
+def summary():
+  """Aggregate the recorded invocations per callback output"""
+  by_output = {}
+  for record in records():
+    by_output.setdefault(record['output'], []).append(record)
+
+  retval = []
+  for output, items in by_output.items():
+    totals = sorted(item['total'] for item in items)
+    row = {
+      'output': output,
+      'count': len(items),
+      'mean_ms': 1000 * sum(totals) / len(totals),
+      'p95_ms': 1000 * totals[min(len(totals) - 1, int(0.95 * len(totals)))],
+      'max_ms': 1000 * totals[-1],
+      'request_bytes': sum(item['request_bytes'] for item in items) / len(items),
+      'response_bytes': sum(item['response_bytes'] for item in items) / len(items),
+    }
+    phases = set(name for item in items for name in item['phases'])
+    for name in phases:
+      row['{}_ms'.format(name)] = 1000 * sum(item['phases'].get(name, 0.0) for item in items) / len(items)
+    retval.append(row)
+  retval.sort(key=lambda row: row['mean_ms'], reverse=True)
+  return retval
+
+def dump(path=None):
+  """Write all recorded invocations to a JSON lines file for offline analysis"""
+  if path is None:
+    path = os.path.join(settings.PROFILING_DIR, 'callbacks-{}.jsonl'.format(datetime.now().strftime('%Y%m%d-%H%M%S')))
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  with open(path, 'w', encoding='utf-8') as f:
+    for record in records():
+      f.write(json.dumps(record) + '\n')
+  return path
+
+def __wrap_callback(func):
+  @wraps(func)
+  def wrapper(*args, **kwargs):
+    with phase('callback'):
+      return func(*args, **kwargs)
+  return wrapper
+
+def __before_request():
+  if request.path != '/_dash-update-component':
+    return
+  body = request.get_json(silent=True) or {}
+  record = {
+    'timestamp': datetime.now().isoformat(),
+    'output': str(body.get('output', 'unknown')),
+    'triggered': body.get('changedPropIds', []),
+    'request_bytes': request.content_length or 0,
+    'response_bytes': 0,
+    'phases': {},
+  }
+  __local.record = record
+  g.profiling_started = time.perf_counter()
+
+  if random.random() < settings.PROFILING_SAMPLE_RATE:
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+def __after_request(response):
+  record = __current()
+  if record is None:
+    return response
+  __local.record = None
+
+  profiler = g.pop('profiler', None)
+  if profiler is not None:
+    profiler.disable()
+
+  record['total'] = time.perf_counter() - g.pop('profiling_started')
+  record['status'] = response.status_code
+  record['response_bytes'] = response.content_length or 0
+  # Everything outside the callback body: dispatch, validation and JSON serialization
+  record['phases']['serialization'] = max(0.0, record['total'] - sum(record['phases'].values()))
+
+  if profiler is not None and record['total'] >= settings.PROFILING_SLOW_THRESHOLD:
+    record['profile'] = __save_profile(profiler, record)
+
+  with __records_lock:
+    __records.append(record)
+  return response
+
+def __save_profile(profiler, record):
+  os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+  name = '{}-{}.prof'.format(datetime.now().strftime('%Y%m%d-%H%M%S-%f'), record['output'].replace('/', '_')[:80])
+  path = os.path.join(settings.PROFILING_DIR, name)
+  profiler.dump_stats(path)
+  logger.info('Slow callback {} ({:.0f} ms), profile written to {}'.format(record['output'], 1000 * record['total'], path))
+  return path
+
+def __stats(path):
+  stream = io.StringIO()
+  pstats.Stats(path, stream=stream).sort_stats('cumulative').print_stats(40)
+  return stream.getvalue()
+
+def __dump_view():
+  return send_file(dump(), mimetype='application/x-ndjson', as_attachment=True)
+
+def __stats_view():
+  path = request.args.get('path', '')
+  if os.path.dirname(os.path.abspath(path)) != os.path.abspath(settings.PROFILING_DIR) or not os.path.exists(path):
+    return Response('Unknown profile', status=404)
+  return Response(__stats(path), mimetype='text/plain')
+
+def init_app(app):
+  """Wrap all Dash callbacks registered from now on and record every callback invocation"""
+  if not settings.PROFILING:
+    return
+  logger.warning('Callback profiling is enabled')
+
+  callback = app.callback
+  @wraps(callback)
+  def profiled_callback(*args, **kwargs):
+    register = callback(*args, **kwargs)
+    def decorator(func):
+      register(__wrap_callback(func))
+      return func
+    return decorator
+  app.callback = profiled_callback
+
+  app.server.before_request(__before_request)
+  app.server.after_request(__after_request)
+  app.server.add_url_rule('/profiling/dump', 'profiling_dump', __dump_view)
+  app.server.add_url_rule('/profiling/stats', 'profiling_stats', __stats_view)
@@ -0,0 +1,84 @@
+# Standard library imports
+import logging
+import math
+import threading
+
+# Local application imports
+from modules.cache import MetadataCache
+from modules.gitlab import DEFAULT_INSTANCE, GitLabError, get_client, instance_config, instances, project_key
+import settings
+
+logger = logging.getLogger(__name__)
+
+__configured = [{'id': project['id'], 'ref_name': project['ref_name'] if 'ref_name' in project else 'master',
+  'instance': project.get('instance', DEFAULT_INSTANCE), 'key': project_key(project['id'], project.get('instance'))}
+  for project in settings.GITLAB_PROJECT_IDS['projects']] if 'projects' in settings.GITLAB_PROJECT_IDS else []
+
+if not settings.GITLAB_PROJECT_DISCOVERY and len(__configured) == 0:
+  raise Exception("No GitLab projects available")
+
+# Datasets and caches are keyed by instance and project id (see project_key)
+for project in __configured:
+  instance_config(project['instance'])
+
+# The discovered list is shared by all workers and refreshed after the discovery interval
+__discovered = MetadataCache(prefix='status-dashboard:projects', timeout=settings.GITLAB_DISCOVERY_INTERVAL)
+__last = {'projects': []}
+__lock = threading.Lock()
+
+def __discover():
+  """Return the projects of the groups of all instances and whether discovery failed on one of them"""
+  ref_names = {project['key']: project['ref_name'] for project in __configured}
+  retval = []
+  failed = False
+  for instance in instances():
+    group_id = instance_config(instance)['group_id']
+    if not group_id:
+      continue
+    try:
+      projects = get_client(instance).get_group_projects(group_id)
+    except GitLabError as e:
+      # Keep showing the last known projects of this instance until GitLab answers again
+      logger.error('Project discovery in group {} of instance {} failed: {}'.format(group_id, instance, e))
+      retval.extend(project for project in __last['projects'] if project['instance'] == instance)
+      failed = True
+      continue
+    logger.info('Discovered {} projects in group {} of instance {}'.format(len(projects), group_id, instance))
+    for project in projects:
+      key = project_key(project['id'], instance)
+      retval.append(dict(project, ref_name=ref_names.get(key, project['ref_name']), instance=instance, key=key))
+  return retval, failed
+
+def get_projects():
+  """Return the projects as list of {'id', 'ref_name', 'instance', 'key'}, configured or discovered from the groups"""
+  if not settings.GITLAB_PROJECT_DISCOVERY:
+    return __configured
+
+  key = 'group-{}'.format(settings.GITLAB_GROUP_ID)
+  projects = __discovered.get(key)
+  if projects is not None:
+    return projects
+
+  with __lock:
+    projects = __discovered.get(key)
+    if projects is None:
+      # Instances which failed are asked again after the discovery interval, not on every call
+      projects, failed = __discover()
+      __discovered.set(key, projects)
+      if not failed:
+        __last['projects'] = projects
+  return projects
+
+def get_project(key):
+  """Return a single project by key (see project_key) or None if it is unknown"""
+  return next((project for project in get_projects() if project['key'] == str(key)), None)
+
+def page_count(page_size=None):
+  page_size = page_size or settings.PROJECTS_PAGE_SIZE
+  return max(1, math.ceil(len(get_projects()) / page_size))
+
+def get_page(page, page_size=None):
+  """Return the projects of a page (starting at 1)"""
+  page_size = page_size or settings.PROJECTS_PAGE_SIZE
+  page = min(max(1, page or 1), page_count(page_size))
+  return get_projects()[(page - 1) * page_size:page * page_size]
@@ -0,0 +1,162 @@
+# Standard library imports
+from datetime import datetime, timezone
+import hashlib
+import json
+import logging
+import threading
+import time
+
+# Third party imports
+from flask import Response, abort, request
+
+# Local application imports
+from modules.cache import get_lock, release_lock
+from modules import compression
+import settings
+
+logger = logging.getLogger(__name__)
+
+MIMETYPES = {'html': 'text/html', 'json': 'application/json'}
+
+__views = {}          # name -> {'render': callable, 'key': callable or None}
+__state = {'server': None, 'cache': None, 'stylesheets': [], 'thread': None}
+__local = {}          # name -> published files last read from the cache by this process
+__local_lock = threading.Lock()
+
+def register(name, render, key=None):
+  """Publish a view as static snapshot
+
+  render returns (html, data), the page and the JSON document of the view.
+  key returns a value which changes with the data of the view (e.g. the
+  freshness of the datasets it is rendered from), the view is only rendered
+  again once it changed. Without key it is rendered on every interval.
+  """
+  __views[name] = {'render': render, 'key': key}
+
+def render_template(template, **context):
+  """Render a Jinja template of the templates folder, outside of a request as well"""
+  return __state['server'].jinja_env.get_template(template).render(
+    app_name=settings.APP_NAME, interval=settings.PUBLISHER_INTERVAL, stylesheets=__state['stylesheets'], **context)
+
+def __digest(data):
+  return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def __file(body, mimetype):
+  """Encode a snapshot file once in every encoding viewers may ask for"""
+  data = body.encode('utf-8')
+  bodies = {'identity': data}
+  if settings.COMPRESSION_ENABLED and len(data) >= settings.COMPRESSION_MIN_SIZE:
+    for encoding in compression.available_encodings():
+      bodies[encoding] = compression.compress(data, encoding)
+  return {'mimetype': mimetype, 'digest': __digest(data), 'bodies': bodies}
+
+def publish(name, force=False):
+  """Render a view unless another worker published it within the interval, returns True if it was rendered
+
+  Views are rendered by one worker at a time, unchanged snapshots keep their
+  ETag and viewers keep validating their copy.
+  """
+  cache = __state['cache']
+  view = __views[name]
+  # Rendering may collect the datasets of a view first
+  lock = get_lock('publisher-{}'.format(name), timeout=settings.REFRESH_BUDGET + 60)
+  if not lock.acquire(blocking=False):
+    return False
+  try:
+    meta = cache.get('published-{}'.format(name)) or {}
+    now = time.time()
+    # Workers run their publisher loops independently, the first one due publishes for all
+    if not force and now - meta.get('published_at', 0) < 0.9 * settings.PUBLISHER_INTERVAL:
+      return False
+
+    key = view['key']() if view['key'] is not None else None
+    if not force and key is not None and key == meta.get('key'):
+      cache.set('published-{}'.format(name), dict(meta, published_at=now), timeout=0)
+      return False
+
+    started = time.perf_counter()
+    page, data = view['render']()
+    # Snapshots with the same data keep their files and ETags, viewers keep their copy
+    etag = __digest(json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+    changed = etag != meta.get('etag')
+    if changed:
+      files = {
+        'html': __file(page, MIMETYPES['html']),
+        'json': __file(json.dumps({'generated_at': datetime.now(timezone.utc).isoformat(), name: data}, default=str), MIMETYPES['json']),
+      }
+      cache.set('published-{}-files'.format(name), {'etag': etag, 'files': files, 'modified': now}, timeout=0)
+    cache.set('published-{}'.format(name), {'published_at': now, 'key': key, 'etag': etag}, timeout=0)
+    logger.info('Published {} snapshot in {:.2f} s ({})'.format(name, time.perf_counter() - started, 'changed' if changed else 'unchanged'))
+    return True
+  finally:
+    release_lock(lock)
+
+def __files(name):
+  """Return the published files of a view, read from the cache once per change"""
+  meta = __state['cache'].get('published-{}'.format(name))
+  if meta is None:
+    return None
+  with __local_lock:
+    local = __local.get(name)
+    if local is None or local['etag'] != meta['etag']:
+      local = __state['cache'].get('published-{}-files'.format(name))
+      if local is None:
+        return None
+      __local[name] = local
+    return local
+
+def __encoding(bodies):
+  for encoding in compression.available_encodings():
+    if encoding in bodies and request.accept_encodings.quality(encoding) > 0:
+      return encoding
+  return 'identity'
+
+def __serve(name, extension):
+  if name not in __views or extension not in MIMETYPES:
+    abort(404)
+  published = __files(name)
+  if published is None:
+    response = Response('Not published yet', status=503, mimetype='text/plain')
+    response.headers['Retry-After'] = str(settings.PUBLISHER_INTERVAL)
+    return response
+
+  file = published['files'][extension]
+  encoding = __encoding(file['bodies'])
+  response = Response(file['bodies'][encoding], mimetype=file['mimetype'])
+  if encoding != 'identity':
+    response.headers['Content-Encoding'] = encoding
+  response.vary.add('Accept-Encoding')
+  # Every encoding is a representation of its own
+  response.set_etag(file['digest'] if encoding == 'identity' else '{}-{}'.format(file['digest'], encoding))
+  response.last_modified = datetime.fromtimestamp(published['modified'], timezone.utc)
+  response.headers['Cache-Control'] = 'public, max-age={}'.format(settings.PUBLISHER_MAX_AGE)
+  return response.make_conditional(request)
+
+def __run():
+  while True:
+    for name in list(__views):
+      try:
+        publish(name)
+      except Exception as e:
+        logger.exception('Publishing {} snapshot failed: {}'.format(name, e))
+    time.sleep(settings.PUBLISHER_INTERVAL / 4)
+
+def start():
+  """Start the publisher loop of this process, once the application is loaded (or the worker forked)"""
+  if not settings.PUBLISHER_ENABLED or __state['thread'] is not None or len(__views) == 0:
+    return None
+  __state['thread'] = threading.Thread(target=__run, name='publisher', daemon=True)
+  __state['thread'].start()
+  return __state['thread']
+
+def init_app(server, cache, stylesheets=None):
+  """Serve the published snapshots, e.g. /published/monitor.html and /published/monitor.json
+
+  The pages link stylesheets, the ones of the Dash app look the same.
+  """
+  __state['server'] = server
+  __state['cache'] = cache
+  __state['stylesheets'] = stylesheets or []
+  if not settings.PUBLISHER_ENABLED:
+    return
+  server.add_url_rule('{}/<name>.<extension>'.format(settings.PUBLISHER_PATH.rstrip('/')), 'published', __serve)
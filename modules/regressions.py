@@ -0,0 +1,186 @@
+# Standard library imports
+import copy
+import math
+import threading
+import uuid
+
+# Third party imports
+from dateutil.parser import isoparse
+
+# Local application imports
+from modules.cache import get_lock, release_lock
+from modules.gitlab import record_project
+import settings
+
+# Smoothing of the recent level (about the last four pipelines) and of the baseline (about the last 40)
+FAST_ALPHA = 0.25
+SLOW_ALPHA = 0.05
+# Step of the baseline quantile estimate in standard deviations
+QUANTILE_STEP = 0.1
+# (metric, pipeline field, direction (1: higher is worse), minimum change, relative change)
+METRICS = [
+  ('duration', 'duration', 1, None, True),
+  ('queue time', 'queued_duration', 1, None, True),
+  ('coverage', 'coverage', -1, 1.0, False),       # Percentage points
+  ('tests', 'total_count', -1, 0.05, True),
+]
+
+class RegressionDetector():
+  """Streaming regression detection of pipeline duration, queue time, coverage and test count
+
+  Every project and ref keeps a few numbers per metric, each finished pipeline
+  updates them in constant time:
+  - an EWMA of the recent pipelines and a slower EWMA with variance as baseline
+  - a rolling quantile of the baseline (p90, p10 where lower is worse),
+    estimated by stochastic approximation and forgetting old pipelines like
+    the slow EWMA
+  A metric regressed when its recent level is beyond the baseline quantile and
+  changed by at least the minimum change. Only successful pipelines count,
+  failed ones stop early.
+  """
+
+  def __init__(self, min_pipelines=None, threshold=None):
+    self.min_pipelines = min_pipelines or settings.REGRESSION_MIN_PIPELINES
+    # Minimum relative change of duration and queue time
+    self.threshold = (threshold or settings.REGRESSION_THRESHOLD) / 100
+    self.__streams = {}       # (project id, ref) -> {'last': (updated_at, id), metric -> statistics}
+    self.__lock = threading.Lock()
+
+  @staticmethod
+  def __new_statistics(value):
+    return {'count': 1, 'fast': value, 'slow': value, 'variance': 0.0, 'quantile': value}
+
+  @staticmethod
+  def __update_statistics(statistics, value, direction):
+    statistics['fast'] = statistics['fast'] + FAST_ALPHA * (value - statistics['fast'])
+    difference = value - statistics['slow']
+    statistics['slow'] = statistics['slow'] + SLOW_ALPHA * difference
+    statistics['variance'] = (1 - SLOW_ALPHA) * (statistics['variance'] + SLOW_ALPHA * difference * difference)
+    # Moves up by (1 - p) steps above the quantile and down by p steps below, settles where p of the values are below
+    share = 0.9 if direction > 0 else 0.1
+    step = QUANTILE_STEP * max(math.sqrt(statistics['variance']), 1e-9)
+    statistics['quantile'] = statistics['quantile'] + step * (share - (1.0 if value < statistics['quantile'] else 0.0))
+    statistics['count'] = statistics['count'] + 1
+
+  def __candidates(self, pipelines):
+    """Successful pipelines which finished after the latest one seen of their project and ref, in order"""
+    retval = []
+    for pipeline in pipelines:
+      if pipeline.get('status') != 'success':
+        continue
+      key = (record_project(pipeline), pipeline.get('ref'))
+      order = (isoparse(pipeline.get('updated_at') or pipeline['created_at']).timestamp(), pipeline['id'])
+      last = self.__streams[key]['last'] if key in self.__streams else None
+      if last is None or order > tuple(last):
+        retval.append((order, key, pipeline))
+    retval.sort(key=lambda candidate: candidate[0])
+    return retval
+
+  def pending(self, pipelines):
+    """Return the number of pipelines update would ingest"""
+    with self.__lock:
+      return len(self.__candidates(pipelines))
+
+  def update(self, pipelines):
+    """Ingest the pipelines which finished after the latest one seen of their project and ref, returns their number"""
+    with self.__lock:
+      candidates = self.__candidates(pipelines)
+      new = 0
+      for order, key, pipeline in candidates:
+        stream = self.__streams.setdefault(key, {'last': None})
+        if stream['last'] is not None and order <= tuple(stream['last']):
+          continue
+        stream['last'] = order
+        for metric, field, direction, _, _ in METRICS:
+          value = pipeline.get(field)
+          # Coverage and tests are 0 if the pipeline didn't report them
+          if value is None or (direction < 0 and float(value) == 0):
+            continue
+          if metric in stream:
+            self.__update_statistics(stream[metric], float(value), direction)
+          else:
+            stream[metric] = self.__new_statistics(float(value))
+        new = new + 1
+      return new
+
+  def __regression(self, metric, direction, minimum, relative, statistics):
+    if statistics is None or statistics['count'] < self.min_pipelines:
+      return None
+    current, baseline = statistics['fast'], statistics['slow']
+    if direction * (current - statistics['quantile']) <= 0:
+      return None
+    change = direction * (current - baseline)
+    if relative:
+      change = change / abs(baseline) if baseline != 0 else 0.0
+    if change < (minimum if minimum is not None else self.threshold):
+      return None
+    return {'metric': metric, 'current': current, 'baseline': baseline, 'change': direction * change, 'relative': relative}
+
+  def regressions(self, project, ref=None):
+    """Return the regressed metrics of a project by key (all refs unless ref is given)"""
+    with self.__lock:
+      streams = [stream for (stream_project, stream_ref), stream in self.__streams.items()
+        if stream_project == project and (ref is None or stream_ref == ref)]
+      return [regression for stream in streams for regression in (
+        self.__regression(metric, direction, minimum, relative, stream.get(metric)) for metric, _, direction, minimum, relative in METRICS)
+        if regression is not None]
+
+  def state(self):
+    """Return the detector state, e.g. to share it through the cache"""
+    with self.__lock:
+      return {'streams': copy.deepcopy(self.__streams)}
+
+  def load(self, state):
+    with self.__lock:
+      if state is not None:
+        self.__streams = state['streams']
+
+def describe(regression):
+  """Short label of a regression, e.g. 'duration +35%' or 'coverage -2.1 pts'"""
+  if regression['relative']:
+    return '{} {:+.0f}%'.format(regression['metric'], 100 * regression['change'])
+  return '{} {:+.1f} pts'.format(regression['metric'], regression['change'])
+
+# The detector of this process, its state is shared with the other workers through the cache
+detector = RegressionDetector()
+__shared = {'revision': None}
+__shared_lock = threading.Lock()
+
+def __reload(cache):
+  # The state is only read again after another worker changed it
+  revision = cache.get('regression-revision')
+  if revision is not None and revision != __shared['revision']:
+    detector.load(cache.get('regression-state'))
+    __shared['revision'] = revision
+  return revision
+
+def get_detector(cache):
+  """Return the detector with the latest shared state"""
+  with __shared_lock:
+    __reload(cache)
+  return detector
+
+def is_seeded(cache):
+  return cache.get('regression-revision') is not None
+
+def feed(cache, pipelines):
+  """Update the shared detector with pipelines, returns the number of new ones
+
+  Workers update the shared state one at a time, pipelines which are already
+  known to this process don't take the lock.
+  """
+  if detector.pending(pipelines) == 0:
+    return 0
+  lock = get_lock('regressions', timeout=60)
+  lock.acquire()
+  try:
+    with __shared_lock:
+      __reload(cache)
+      new = detector.update(pipelines)
+      if new > 0:
+        __shared['revision'] = uuid.uuid4().hex
+        cache.set('regression-state', detector.state(), timeout=0)
+        cache.set('regression-revision', __shared['revision'], timeout=0)
+      return new
+  finally:
+    release_lock(lock)
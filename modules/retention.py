@@ -0,0 +1,138 @@
+# Standard library imports
+from datetime import datetime, timezone
+import json
+import logging
+import math
+
+# Third party imports
+from dateutil.parser import isoparse
+from flask import jsonify
+
+# Local application imports
+import settings
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+LIMITS = ['max_age_days', 'max_records', 'max_bytes']
+# Dashboard datasets and the field their records age by, newest records are kept
+DATASETS = {
+  'pipelines': ['updated_at', 'created_at'],
+  'commits': ['created_at', 'committed_date'],
+  'deployments': ['updated_at', 'created_at'],
+  'milestones': ['updated_at', 'created_at'],
+}
+
+__footprints = {}     # resource -> callable returning {project key: {'records', 'bytes'}}
+__state = {'cache': None}
+
+def policy(resource, project=None):
+  """Return the limits of a resource for a project (by key, see project_key) as dict of limit -> value, 0 is unlimited
+
+  Dataset defaults come from RETENTION_MAX_AGE_DAYS/RETENTION_MAX_RECORDS/
+  RETENTION_MAX_BYTES, the stores (test history, merge requests) have their
+  own global limits. RETENTION_POLICIES overrides them per resource, per
+  project and per resource of a project, in this order.
+  """
+  if resource in DATASETS:
+    retval = {'max_age_days': settings.RETENTION_MAX_AGE_DAYS, 'max_records': settings.RETENTION_MAX_RECORDS, 'max_bytes': settings.RETENTION_MAX_BYTES}
+  else:
+    retval = {limit: 0 for limit in LIMITS}
+  project_policy = settings.RETENTION_POLICIES.get('projects', {}).get(str(project), {}) if project is not None else {}
+  for overrides in (settings.RETENTION_POLICIES.get(resource, {}), project_policy, project_policy.get(resource, {})):
+    retval.update({limit: overrides[limit] for limit in LIMITS if limit in overrides})
+  return retval
+
+def max_rows(limits, row_bytes):
+  """Rows of row_bytes a store may keep within max_records and max_bytes, 0 is unlimited"""
+  bounds = [limits['max_records']] if limits['max_records'] > 0 else []
+  if limits['max_bytes'] > 0:
+    bounds.append(max(1, limits['max_bytes'] // row_bytes))
+  return min(bounds) if len(bounds) > 0 else 0
+
+def __project(chunk):
+  # Datasets are chunked by project key ('42' or 'instance:42'), milestones are a group chunk
+  return chunk if str(chunk).rsplit(':', 1)[-1].isdigit() else None
+
+def __timestamp(record, fields):
+  for field in fields:
+    if record.get(field):
+      return isoparse(record[field]).timestamp()
+  # Records without a time are kept
+  return math.inf
+
+def enforce(resource, chunk, records, now=None):
+  """Return the newest records of a chunk within the limits of its project and its footprint
+
+  The footprint is {'records', 'bytes', 'dropped'}, bytes are the size of
+  the records serialized as JSON. The records are serialized once per chunk,
+  records beyond max_bytes are dropped by their average size.
+  """
+  limits = policy(resource, __project(chunk))
+  horizon = (now or datetime.now(timezone.utc).timestamp()) - limits['max_age_days'] * DAY if limits['max_age_days'] > 0 else -math.inf
+  times = [__timestamp(record, DATASETS[resource]) for record in records]
+  kept = [index for index in sorted(range(len(records)), key=lambda index: times[index], reverse=True) if times[index] >= horizon]
+  if limits['max_records'] > 0:
+    kept = kept[:limits['max_records']]
+  size = len(json.dumps([records[index] for index in kept], separators=(',', ':'), default=str)) if len(kept) > 0 else 0
+  if limits['max_bytes'] > 0 and size > limits['max_bytes']:
+    count = len(kept) * limits['max_bytes'] // size
+    size = size * count // len(kept)
+    kept = kept[:count]
+  kept.sort()
+  return [records[index] for index in kept], {'records': len(kept), 'bytes': size, 'dropped': len(records) - len(kept)}
+
+def enforce_many(resource, records_by_chunk):
+  """Enforce the retention of collected chunks of a dataset, returns the kept records by chunk
+
+  The footprints of the chunks are shared with the other workers for the
+  memory report.
+  """
+  retval = {}
+  footprints = {}
+  for chunk, records in records_by_chunk.items():
+    retval[chunk], footprints[chunk] = enforce(resource, chunk, records)
+    if footprints[chunk]['dropped'] > 0:
+      logger.info('Retention dropped {} of {} {} records of {}'.format(footprints[chunk]['dropped'], len(records), resource, chunk))
+  cache = __state['cache']
+  if cache is not None and len(footprints) > 0:
+    key = 'footprint-{}'.format(resource)
+    current = cache.get(key) or {}
+    current.update(footprints)
+    cache.set(key, current, timeout=86400)
+  return retval
+
+def register(resource, footprint):
+  """Account a store in the memory report, footprint returns {project key: {'records', 'bytes'}}"""
+  __footprints[resource] = footprint
+
+def report():
+  """Return the footprint per resource and project, the projects with the largest footprint first"""
+  cache = __state['cache']
+  resources = []
+  for resource in DATASETS:
+    for chunk, footprint in ((cache.get('footprint-{}'.format(resource)) if cache is not None else None) or {}).items():
+      resources.append(dict(footprint, resource=resource, project=chunk, policy=policy(resource, __project(chunk))))
+  for resource, footprint in __footprints.items():
+    for project, values in footprint().items():
+      resources.append(dict(values, resource=resource, project=str(project), policy=policy(resource, project)))
+
+  projects = {}
+  for row in resources:
+    project = projects.setdefault(row['project'], {'project': row['project'], 'records': 0, 'bytes': 0})
+    project['records'] = project['records'] + row['records']
+    project['bytes'] = project['bytes'] + row['bytes']
+  backend = getattr(cache, 'cache', None)
+  return {
+    'projects': sorted(projects.values(), key=lambda project: project['bytes'], reverse=True),
+    'resources': sorted(resources, key=lambda row: (row['resource'], -row['bytes'])),
+    'cache': backend.stats() if hasattr(backend, 'stats') else None,
+  }
+
+def __report():
+  return jsonify(report())
+
+def init_app(server, cache):
+  """Serve the memory report, e.g. /memory"""
+  __state['cache'] = cache
+  server.add_url_rule(settings.MEMORY_REPORT_PATH, 'memory', __report)
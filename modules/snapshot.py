@@ -0,0 +1,44 @@
+# Standard library imports
+from datetime import datetime
+import gzip
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+def export_snapshot(path, chunks_by_dataset):
+  """Write datasets to a gzip compressed JSON lines file
+
+  The first line is a header, every following line holds one chunk of a dataset.
+  Returns the number of exported records.
+  """
+  count = 0
+  with gzip.open(path, 'wt', encoding='utf-8') as f:
+    header = {'version': SNAPSHOT_VERSION, 'created_at': datetime.utcnow().isoformat()}
+    f.write(json.dumps(header) + '\n')
+    for dataset, chunks in chunks_by_dataset.items():
+      for chunk, records in chunks.items():
+        if records is None:
+          continue
+        line = {'dataset': dataset, 'chunk': chunk, 'records': records}
+        f.write(json.dumps(line, separators=(',', ':'), default=str) + '\n')
+        count = count + len(records)
+  logger.info('Exported {} records to snapshot {}'.format(count, path))
+  return count
+
+def import_snapshot(path):
+  """Read a snapshot file, returns the header and a dict of dataset -> {chunk: records}"""
+  retval = {}
+  with gzip.open(path, 'rt', encoding='utf-8') as f:
+    header = json.loads(f.readline())
+    if header.get('version') != SNAPSHOT_VERSION:
+      raise ValueError('Unsupported snapshot version: {}'.format(header.get('version')))
+    for line in f:
+      if not line.strip():
+        continue
+      entry = json.loads(line)
+      retval.setdefault(entry['dataset'], {})[entry['chunk']] = entry['records']
+  logger.info('Imported snapshot {} created at {}'.format(path, header['created_at']))
+  return header, retval
@@ -0,0 +1,287 @@
+# Standard library imports
+import threading
+import time
+
+# Third party imports
+from dateutil.parser import isoparse
+
+# Local application imports
+from modules.gitlab import FINISHED_STATUSES, record_project
+from modules.lazy import lazy_import
+from modules import retention
+import settings
+
+np = lazy_import('numpy')
+
+DAY = 86400
+# Test case states as stored in the status column
+STATUSES = ['success', 'failed', 'error', 'skipped']
+SUCCESS, FAILED, ERROR, SKIPPED = range(len(STATUSES))
+# One row per test case result, 25 bytes
+COLUMNS = [
+  ('project', 'int32'),       # Index of the project's key
+  ('pipeline', 'int64'),
+  ('case', 'int32'),
+  ('status', 'int8'),
+  ('duration', 'float32'),
+  ('time', 'uint32'),         # Pipeline creation, seconds since the epoch
+]
+ROW_BYTES = 25
+
+class TestHistory():
+  """Pass/fail history of test cases from the test reports of finished pipelines
+
+  Every test case result is a row of a few numpy columns, test case names and
+  project keys are stored once. The store never holds more than max_results rows, the oldest
+  results are dropped first. Reports are only ingested once, pipelines are
+  remembered for the retention period.
+  """
+
+  def __init__(self, max_results=None, retention_days=None):
+    self.max_results = max_results or settings.TEST_HISTORY_MAX_RESULTS
+    self.retention = (retention_days or settings.TEST_HISTORY_RETENTION_DAYS) * DAY
+    self.revision = 0
+    # numpy is only imported once there are results
+    self.__columns = None
+    self.__size = 0
+    self.__cases = {}       # (project, suite, name) -> case index
+    self.__names = []       # case index -> (project, suite, name)
+    self.__projects = []    # project index -> project key
+    self.__pipelines = {}   # (project, pipeline id) -> time of ingested pipelines
+    self.__lock = threading.Lock()
+
+  def __ensure_columns(self):
+    if self.__columns is None:
+      self.__columns = {name: np.empty(0, dtype) for name, dtype in COLUMNS}
+
+  @staticmethod
+  def __timestamp(pipeline):
+    return int(isoparse(pipeline['created_at']).timestamp())
+
+  def __project_index(self, project, add=False):
+    """Return the index of a project key in the project column, -1 if it has no results"""
+    if project not in self.__projects:
+      if not add:
+        return -1
+      self.__projects.append(project)
+    return self.__projects.index(project)
+
+  def missing(self, pipelines):
+    """Return the finished pipelines with tests whose report wasn't ingested yet"""
+    horizon = time.time() - self.retention
+    with self.__lock:
+      return [pipeline for pipeline in pipelines
+        if pipeline['status'] in FINISHED_STATUSES and pipeline.get('total_count', 0) > 0
+        and (record_project(pipeline), pipeline['id']) not in self.__pipelines and self.__timestamp(pipeline) >= horizon]
+
+  def add(self, pipeline, report):
+    """Ingest the test report of a pipeline (None if it has none), returns the number of results"""
+    project = record_project(pipeline)
+    key = (project, pipeline['id'])
+    timestamp = self.__timestamp(pipeline)
+    suites = report['test_suites'] if report is not None else []
+
+    with self.__lock:
+      if key in self.__pipelines:
+        return 0
+      self.__ensure_columns()
+      names, statuses, durations = [], [], []
+      for suite in suites:
+        for case in suite['test_cases']:
+          names.append((project, suite['name'], '{}.{}'.format(case['classname'], case['name']) if case.get('classname') else case['name']))
+          statuses.append(STATUSES.index(case['status']) if case['status'] in STATUSES else SKIPPED)
+          durations.append(case.get('execution_time') or 0.0)
+      limits = retention.policy('test-history', project)
+      project_results = retention.max_rows(limits, ROW_BYTES)
+      max_results = min(self.max_results, project_results or self.max_results)
+      names, statuses, durations = names[-max_results:], statuses[-max_results:], durations[-max_results:]
+      count = len(names)
+
+      # Make room first, dropping rows renumbers the test cases
+      self.__limit(project, limits, project_results - count if project_results > 0 else None)
+      if self.__size + count > self.max_results:
+        # Drop a tenth more than needed, not every report has to move the whole store
+        self.__drop(min(self.__size, self.__size + count - self.max_results + self.max_results // 10))
+      cases = []
+      for name in names:
+        if name not in self.__cases:
+          self.__cases[name] = len(self.__names)
+          self.__names.append(name)
+        cases.append(self.__cases[name])
+
+      self.__append({
+        'project': np.full(count, self.__project_index(project, add=True), np.int32),
+        'pipeline': np.full(count, pipeline['id'], np.int64),
+        'case': np.array(cases, np.int32),
+        'status': np.array(statuses, np.int8),
+        'duration': np.array(durations, np.float32),
+        'time': np.full(count, timestamp, np.uint32),
+      })
+      self.__pipelines[key] = timestamp
+      self.__prune(time.time() - self.retention)
+      self.revision = self.revision + 1
+      return count
+
+  def __append(self, rows):
+    count = len(rows['case'])
+    capacity = len(self.__columns['case'])
+    if self.__size + count > capacity:
+      capacity = min(self.max_results, max(2 * capacity, self.__size + count, 1024))
+      for name, dtype in COLUMNS:
+        column = np.empty(capacity, dtype)
+        column[:self.__size] = self.__columns[name][:self.__size]
+        self.__columns[name] = column
+    for name, values in rows.items():
+      self.__columns[name][self.__size:self.__size + count] = values
+    self.__size = self.__size + count
+
+  def __drop(self, count):
+    """Drop the oldest count rows"""
+    for name, _ in COLUMNS:
+      column = self.__columns[name]
+      column[:self.__size - count] = column[count:self.__size]
+    self.__size = self.__size - count
+    self.__compact_names()
+
+  def __limit(self, project, limits, max_rows):
+    """Drop the results of a project beyond its retention policy, the oldest first, keeping at most max_rows"""
+    if limits['max_age_days'] <= 0 and max_rows is None:
+      return
+    rows = np.flatnonzero(self.__columns['project'][:self.__size] == self.__project_index(project))
+    keep = np.ones(self.__size, bool)
+    if limits['max_age_days'] > 0:
+      keep[rows] = self.__columns['time'][rows] >= time.time() - limits['max_age_days'] * DAY
+      rows = rows[keep[rows]]
+    if max_rows is not None and len(rows) > max_rows:
+      # Rows are appended per pipeline, the first rows of a project are its oldest results
+      keep[rows[:len(rows) - max_rows]] = False
+    if not keep.all():
+      self.__keep(keep)
+
+  def __keep(self, keep):
+    for name, _ in COLUMNS:
+      kept = self.__columns[name][:self.__size][keep]
+      self.__columns[name][:len(kept)] = kept
+    self.__size = int(keep.sum())
+    self.__compact_names()
+
+  def __prune(self, horizon):
+    if self.__size > 0 and self.__columns['time'][:self.__size].min() < horizon:
+      self.__keep(self.__columns['time'][:self.__size] >= horizon)
+    if len(self.__pipelines) > 0 and min(self.__pipelines.values()) < horizon:
+      self.__pipelines = {key: timestamp for key, timestamp in self.__pipelines.items() if timestamp >= horizon}
+
+  def __compact_names(self):
+    """Forget test cases without results once they make up half of the names"""
+    used = np.unique(self.__columns['case'][:self.__size])
+    if len(used) > len(self.__names) // 2:
+      return
+    mapping = np.full(max(1, len(self.__names)), -1, np.int32)
+    mapping[used] = np.arange(len(used), dtype=np.int32)
+    self.__columns['case'][:self.__size] = mapping[self.__columns['case'][:self.__size]]
+    self.__names = [self.__names[index] for index in used]
+    self.__cases = {name: index for index, name in enumerate(self.__names)}
+
+  def __select(self, project):
+    """Return copies of the columns of results which ran (not skipped), optionally of one project"""
+    self.__ensure_columns()
+    mask = self.__columns['status'][:self.__size] != SKIPPED
+    if project is not None:
+      mask = mask & (self.__columns['project'][:self.__size] == self.__project_index(project))
+    return {name: self.__columns[name][:self.__size][mask] for name, _ in COLUMNS}
+
+  def __describe(self, case):
+    project, suite, name = self.__names[case]
+    return {'project': project, 'suite': suite, 'name': name}
+
+  def flaky(self, project=None, limit=20, min_runs=None):
+    """Return the test cases whose result flips most often between consecutive pipelines
+
+    The flip rate is the share of consecutive runs of a test case (ordered by
+    pipeline) with a different outcome, a test which failed once and was fixed
+    afterwards flips once, a flaky test keeps flipping.
+    """
+    min_runs = min_runs or settings.TEST_HISTORY_MIN_RUNS
+    with self.__lock:
+      rows = self.__select(project)
+      names = len(self.__names)
+      order = np.lexsort((rows['pipeline'], rows['time'], rows['case']))
+      cases = rows['case'][order]
+      pipelines = rows['pipeline'][order]
+      failed = (rows['status'][order] == FAILED) | (rows['status'][order] == ERROR)
+
+      flipped = (cases[1:] == cases[:-1]) & (failed[1:] != failed[:-1])
+      flips = np.bincount(cases[1:][flipped], minlength=names)
+      runs = np.bincount(cases, minlength=names)
+      failures = np.bincount(cases, weights=failed, minlength=names).astype(np.int64)
+      rate = np.divide(flips, runs - 1, out=np.zeros(names), where=runs > 1)
+
+      candidates = np.flatnonzero((runs >= min_runs) & (flips > 0))
+      ranked = candidates[np.lexsort((-failures[candidates], -rate[candidates]))][:limit]
+
+      retval = []
+      for case in ranked:
+        # Rows of a test case are ordered by time, the last failing one is the latest failure
+        last = np.flatnonzero((cases == case) & failed)[-1]
+        retval.append(dict(self.__describe(case), runs=int(runs[case]), failures=int(failures[case]), flips=int(flips[case]),
+          flip_rate=100 * float(rate[case]), last_failed_pipeline=int(pipelines[last])))
+      return retval
+
+  def slowest(self, project=None, limit=20):
+    """Return the test cases with the highest mean duration"""
+    with self.__lock:
+      rows = self.__select(project)
+      names = len(self.__names)
+      runs = np.bincount(rows['case'], minlength=names)
+      total = np.bincount(rows['case'], weights=rows['duration'], minlength=names)
+      longest = np.zeros(names, np.float32)
+      np.maximum.at(longest, rows['case'], rows['duration'])
+      mean = np.divide(total, runs, out=np.zeros(names), where=runs > 0)
+
+      ranked = np.argsort(-mean)[:limit]
+      return [dict(self.__describe(case), runs=int(runs[case]), mean_duration=float(mean[case]),
+        max_duration=float(longest[case]), total_duration=float(total[case])) for case in ranked if runs[case] > 0]
+
+  def footprint(self):
+    """Return the stored results and their bytes per project"""
+    with self.__lock:
+      self.__ensure_columns()
+      projects, counts = np.unique(self.__columns['project'][:self.__size], return_counts=True)
+      return {self.__projects[index]: {'records': int(count), 'bytes': int(count) * ROW_BYTES} for index, count in zip(projects.tolist(), counts)}
+
+  def stats(self):
+    with self.__lock:
+      self.__ensure_columns()
+      return {
+        'results': self.__size,
+        'pipelines': len(self.__pipelines),
+        'test_cases': len(self.__names),
+        'bytes': sum(column.nbytes for column in self.__columns.values()),
+      }
+
+  def state(self):
+    """Return the history, e.g. to share it through the cache"""
+    with self.__lock:
+      self.__ensure_columns()
+      return {
+        'revision': self.revision,
+        'columns': {name: self.__columns[name][:self.__size].copy() for name, _ in COLUMNS},
+        'names': list(self.__names),
+        'projects': list(self.__projects),
+        'pipelines': dict(self.__pipelines),
+      }
+
+  def load(self, state):
+    with self.__lock:
+      if state is None:
+        return
+      self.revision = state['revision']
+      self.__columns = {name: state['columns'][name].astype(dtype) for name, dtype in COLUMNS}
+      self.__size = len(self.__columns['case'])
+      self.__names = [tuple(name) for name in state['names']]
+      self.__projects = list(state['projects'])
+      self.__cases = {name: index for index, name in enumerate(self.__names)}
+      self.__pipelines = dict(state['pipelines'])
+      # A smaller budget than the one the state was saved with
+      if self.__size > self.max_results:
+        self.__drop(self.__size - self.max_results)
@@ -0,0 +1,127 @@
+# Local application imports
+from modules.lazy import lazy_import
+import settings
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+
+# Bucket resolutions of time-series figures from fine to coarse, (pandas frequency, seconds)
+RESOLUTIONS = [('1H', 3600), ('6H', 21600), ('1D', 86400), ('7D', 604800)]
+
+def visible_range(relayout):
+  """Return the x range (start, end) of a graph's relayoutData as UTC timestamps, None if autoranged"""
+  if relayout is None:
+    return None
+  if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+    bounds = [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']]
+  elif 'xaxis.range' in relayout:
+    bounds = relayout['xaxis.range']
+  else:
+    return None
+  try:
+    bounds = [pd.Timestamp(bound) for bound in bounds]
+  except (TypeError, ValueError):
+    return None
+  # Plotly sends the range without time zone, figures are drawn in UTC
+  return tuple(bound.tz_localize('UTC') if bound.tzinfo is None else bound.tz_convert('UTC') for bound in bounds)
+
+def changes_range(relayout):
+  """True if a relayoutData event zoomed, panned or autoranged the x axis"""
+  return relayout is not None and any(key.startswith('xaxis.range') or key.startswith('xaxis.autorange') for key in relayout)
+
+def resolution(start, end, raw=True, buckets=None):
+  """Return the pandas frequency of the finest bucket which splits start..end in at most buckets
+
+  None means single records: the range is too short even for the finest
+  bucket (only if raw, counts always need a bucket).
+  """
+  buckets = buckets or settings.FIGURE_BUCKETS
+  seconds = max(0, (end - start).total_seconds())
+  if raw and seconds <= buckets * RESOLUTIONS[0][1]:
+    return None
+  for frequency, size in RESOLUTIONS:
+    if seconds <= buckets * size:
+      return frequency
+  return RESOLUTIONS[-1][0]
+
+def lttb(x, y, threshold):
+  """Return the indices of threshold points picked by Largest-Triangle-Three-Buckets
+
+  The first and last point are kept, every bucket in between contributes the
+  point spanning the largest triangle with the previously picked point and the
+  average of the next bucket, which keeps peaks and the visual shape.
+  """
+  count = len(x)
+  if threshold >= count or threshold < 3:
+    return np.arange(count)
+  edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+  retval = np.empty(threshold, np.int64)
+  retval[0] = 0
+  retval[-1] = count - 1
+  picked = 0
+  for bucket in range(threshold - 2):
+    start, end = edges[bucket], edges[bucket + 1]
+    next_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+    next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+    area = np.abs((x[picked] - next_x) * (y[start:end] - y[picked]) - (x[picked] - x[start:end]) * (next_y - y[picked]))
+    picked = start + int(np.argmax(area))
+    retval[bucket + 1] = picked
+  return retval
+
+def minmax(x, y, threshold):
+  """Return the indices of the first and last point and of the minimum and maximum of the buckets in between"""
+  count = len(x)
+  if threshold >= count or threshold < 4:
+    return np.arange(count)
+  edges = np.linspace(0, count, (threshold - 2) // 2 + 1).astype(np.int64)
+  retval = [0, count - 1]
+  for start, end in zip(edges[:-1], edges[1:]):
+    if end > start:
+      retval.extend([start + int(np.argmin(y[start:end])), start + int(np.argmax(y[start:end]))])
+  return np.unique(retval)
+
+def downsample(x, y, budget=None, method=None):
+  """Return the indices of at most budget points of a series (x numeric and sorted)"""
+  budget = budget or settings.FIGURE_POINT_BUDGET
+  method = method or settings.FIGURE_DOWNSAMPLING
+  if len(x) <= budget:
+    return np.arange(len(x))
+  if method == 'minmax':
+    return minmax(x, y, budget)
+  return lttb(x, y, budget)
+
+def series(times, values=None, start=None, end=None, how='mean', raw=True):
+  """Return x, y of values over start..end at the resolution of the range, within the point budget
+
+  times are UTC timestamps, without values the records are counted. Values are
+  aggregated per bucket (how is a pandas aggregation, e.g. mean or count) or,
+  if the range is short enough, drawn per record. One bucket beyond either end
+  is kept so lines run to the edges.
+  """
+  times = pd.DatetimeIndex(times)
+  start = times.min() if start is None else start
+  end = times.max() if end is None else end
+  if values is None:
+    values, how, raw = np.ones(len(times)), 'count', False
+  frequency = resolution(start, end, raw)
+  margin = pd.Timedelta(frequency or RESOLUTIONS[0][0])
+  data = pd.Series(np.asarray(values, dtype=float), index=times)
+  data = data[(data.index >= start - margin) & (data.index <= end + margin)].dropna().sort_index()
+  if frequency is not None:
+    data = data.groupby(data.index.floor(frequency)).agg(how)
+  if len(data) == 0:
+    return data.index.tz_convert(None), data.values
+
+  index = downsample(data.index.asi8 / 1e9, data.values)
+  # Plotly doesn't read time zones, UTC is passed without
+  return data.index[index].tz_convert(None), data.values[index]
+
+def scatter(**kwargs):
+  """Return a Scatter trace, a WebGL Scattergl above FIGURE_WEBGL_THRESHOLD points"""
+  if len(kwargs.get('x', [])) <= settings.FIGURE_WEBGL_THRESHOLD:
+    return go.Scatter(**kwargs)
+  # WebGL draws straight lines only
+  if kwargs.get('line_shape') == 'spline':
+    kwargs['line_shape'] = 'linear'
+  return go.Scattergl(**kwargs)
@@ -1,35 +1,184 @@
-import os
-import json
-from dotenv import load_dotenv
-
-# Load .env file
-load_dotenv()
-
-# Debug mode
-DEBUG=True if int(os.getenv('DEBUG', 0)) == 1 else False
-FLASK_DEBUG=DEBUG
-
-# Logging level
-LOGLEVEL=os.getenv('LOGLEVEL', 'INFO')
-# Logging format
-LOGFORMAT=os.getenv('LOGFORMAT', '[%(asctime)-s] %(levelname)s in %(module)s: %(message)s')
-
-# Dash application name
-APP_NAME=os.getenv('APP_NAME', 'Status Dashboard')
-# Dash host ip adress
-APP_HOST=os.getenv('APP_HOST', '0.0.0.0')
-# Dash application folder
-APP_ROOT=os.getcwd()
-# Dash server port
-APP_PORT=os.getenv('APP_PORT', 5000)
-# Redis url
-REDIS_URL=os.getenv('REDIS_URL', 'redis://localhost:6379')
-
-# GitLab URL
-GITLAB_API_URL=os.getenv('GITLAB_API_URL', 'https://gitlab.com/api/v4')
-# GitLab token will be used whenever the API is invoked
-GITLAB_TOKEN=os.getenv('GITLAB_TOKEN')
-# GitLab group id
-GITLAB_GROUP_ID=os.getenv('GITLAB_GROUP_ID')
-# GitLab project ids
-GITLAB_PROJECT_IDS=json.loads(os.getenv('GITLAB_PROJECT_IDS'))
\ No newline at end of file
+import os
+import json
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# Debug mode
+DEBUG=True if int(os.getenv('DEBUG', 0)) == 1 else False
+FLASK_DEBUG=DEBUG
+
+# Logging level
+LOGLEVEL=os.getenv('LOGLEVEL', 'INFO')
+# Logging format
+LOGFORMAT=os.getenv('LOGFORMAT', '[%(asctime)-s] %(levelname)s in %(module)s: %(message)s')
+
+# Dash application name
+APP_NAME=os.getenv('APP_NAME', 'Status Dashboard')
+# Dash host ip adress
+APP_HOST=os.getenv('APP_HOST', '0.0.0.0')
+# Dash application folder
+APP_ROOT=os.getcwd()
+# Dash server port
+APP_PORT=os.getenv('APP_PORT', 5000)
+# Pages served by this instance, e.g. 'monitor' for a wallboard without the analytics pages
+APP_PAGES=[page.strip() for page in os.getenv('APP_PAGES', 'dashboard,monitor,overview').split(',') if page.strip()]
+# Gunicorn worker processes and threads per worker (production server)
+WEB_WORKERS=int(os.getenv('WEB_WORKERS', 2))
+WEB_THREADS=int(os.getenv('WEB_THREADS', 8))
+# Load the application in the Gunicorn master, workers share its memory copy-on-write
+WEB_PRELOAD=True if int(os.getenv('WEB_PRELOAD', 0)) == 1 else False
+# Redis url
+REDIS_URL=os.getenv('REDIS_URL', 'redis://localhost:6379')
+# Maximum number of connections in the shared Redis connection pool
+REDIS_MAX_CONNECTIONS=int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+
+# Flask-Caching cache type ('redis', 'SimpleCache', 'FileSystemCache', ...)
+CACHE_TYPE=os.getenv('CACHE_TYPE', 'redis')
+# Dataset cache backend ('redis' = Flask-Caching memoize, 'chunked' = per-project chunks)
+CACHE_BACKEND=os.getenv('CACHE_BACKEND', 'redis')
+# Zlib compression level for chunked cache values
+CACHE_COMPRESS_LEVEL=int(os.getenv('CACHE_COMPRESS_LEVEL', 6))
+# Bytes of the in-process cache (CACHE_TYPE SimpleCache), the least recently used entries are evicted first
+CACHE_MAX_BYTES=int(os.getenv('CACHE_MAX_BYTES', 268435456))
+# Warm the dataset caches in the background on startup
+CACHE_WARM_ON_BOOT=True if int(os.getenv('CACHE_WARM_ON_BOOT', 1)) == 1 else False
+# Snapshot file (gzip JSON lines) used to seed empty caches on startup
+SNAPSHOT_PATH=os.getenv('SNAPSHOT_PATH')
+
+# SQLite file of the history backfill
+BACKFILL_PATH=os.getenv('BACKFILL_PATH', os.path.join(APP_ROOT, 'backfill.sqlite3'))
+# Projects crawled in parallel by the backfill
+BACKFILL_WORKERS=int(os.getenv('BACKFILL_WORKERS', 4))
+# GitLab requests per second of the backfill
+BACKFILL_RATE=float(os.getenv('BACKFILL_RATE', 10))
+# Days per backfill checkpoint
+BACKFILL_WINDOW_DAYS=int(os.getenv('BACKFILL_WINDOW_DAYS', 7))
+
+# Expose Prometheus metrics
+METRICS_ENABLED=True if int(os.getenv('METRICS_ENABLED', 1)) == 1 else False
+# Prometheus metrics route
+METRICS_PATH=os.getenv('METRICS_PATH', '/metrics')
+
+# Compress Dash responses (gzip, brotli if installed)
+COMPRESSION_ENABLED=True if int(os.getenv('COMPRESSION_ENABLED', 1)) == 1 else False
+# Responses smaller than this are sent uncompressed (bytes)
+COMPRESSION_MIN_SIZE=int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+# gzip compression level (1-9)
+COMPRESSION_GZIP_LEVEL=int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+# Brotli quality (0-11)
+COMPRESSION_BROTLI_QUALITY=int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))
+
+# Profile Dash callbacks (timing phases, payload sizes, cProfile samples)
+PROFILING=True if int(os.getenv('PROFILING', 0)) == 1 else False
+# Number of recorded callback invocations
+PROFILING_HISTORY=int(os.getenv('PROFILING_HISTORY', 5000))
+# Share of callback invocations profiled with cProfile
+PROFILING_SAMPLE_RATE=float(os.getenv('PROFILING_SAMPLE_RATE', 0.1))
+# Profiled invocations slower than this are kept (seconds)
+PROFILING_SLOW_THRESHOLD=float(os.getenv('PROFILING_SLOW_THRESHOLD', 0.5))
+# Folder for profiles and dumps
+PROFILING_DIR=os.getenv('PROFILING_DIR', os.path.join(APP_ROOT, 'profiles'))
+
+# GitLab URL
+GITLAB_API_URL=os.getenv('GITLAB_API_URL', 'https://gitlab.com/api/v4')
+# GitLab token will be used whenever the API is invoked
+GITLAB_TOKEN=os.getenv('GITLAB_TOKEN')
+# GitLab group id
+GITLAB_GROUP_ID=os.getenv('GITLAB_GROUP_ID')
+# Further GitLab instances as JSON: {"name": {"api_url", "token", "group_id", "graphql_url", "concurrency", "rate"}}
+GITLAB_INSTANCES=json.loads(os.getenv('GITLAB_INSTANCES', '{}'))
+# Requests in flight per GitLab instance (size of its connection pool)
+GITLAB_CONCURRENCY=int(os.getenv('GITLAB_CONCURRENCY', 4))
+# Requests per second per GitLab instance, 0 is unlimited
+GITLAB_RATE=float(os.getenv('GITLAB_RATE', 0))
+# Seconds GitLab names and version are cached
+GITLAB_METADATA_TIMEOUT=int(os.getenv('GITLAB_METADATA_TIMEOUT', 3600))
+# Source of pipeline data: rest or graphql (batched queries across projects)
+GITLAB_DATA_SOURCE=os.getenv('GITLAB_DATA_SOURCE', 'rest')
+# GitLab GraphQL endpoint, derived from GITLAB_API_URL by default
+GITLAB_GRAPHQL_URL=os.getenv('GITLAB_GRAPHQL_URL')
+# Projects per GraphQL query
+GITLAB_GRAPHQL_BATCH_SIZE=int(os.getenv('GITLAB_GRAPHQL_BATCH_SIZE', 50))
+# Seconds pipeline details are kept in the pipeline store
+PIPELINE_STORE_TIMEOUT=int(os.getenv('PIPELINE_STORE_TIMEOUT', 259200))
+# Pipelines kept in process by every worker
+PIPELINE_STORE_SIZE=int(os.getenv('PIPELINE_STORE_SIZE', 20000))
+# GitLab connect/read timeouts per request (seconds)
+GITLAB_CONNECT_TIMEOUT=float(os.getenv('GITLAB_CONNECT_TIMEOUT', 5))
+GITLAB_READ_TIMEOUT=float(os.getenv('GITLAB_READ_TIMEOUT', 30))
+# Total time budget of a dataset refresh, projects not finished in time are skipped (seconds)
+REFRESH_BUDGET=float(os.getenv('REFRESH_BUDGET', 300))
+# Seconds a partial dataset (some projects failed or timed out) is served before it is collected again
+PARTIAL_RESULT_TIMEOUT=int(os.getenv('PARTIAL_RESULT_TIMEOUT', 120))
+# Total time budget of a monitor card update (seconds)
+MONITOR_BUDGET=float(os.getenv('MONITOR_BUDGET', 30))
+# GitLab project ids (optional with project discovery, configured ref names are kept)
+GITLAB_PROJECT_IDS=json.loads(os.getenv('GITLAB_PROJECT_IDS', '{"projects": []}'))
+# Discover all projects of the group (including subgroups) instead of GITLAB_PROJECT_IDS
+GITLAB_PROJECT_DISCOVERY=True if int(os.getenv('GITLAB_PROJECT_DISCOVERY', 0)) == 1 else False
+# Seconds until the discovered project list is refreshed
+GITLAB_DISCOVERY_INTERVAL=int(os.getenv('GITLAB_DISCOVERY_INTERVAL', 3600))
+# Projects per page on the dashboard and monitor
+PROJECTS_PAGE_SIZE=int(os.getenv('PROJECTS_PAGE_SIZE', 12))
+
+# Environment counted as production deployment for DORA metrics
+DORA_PRODUCTION_ENVIRONMENT=os.getenv('DORA_PRODUCTION_ENVIRONMENT', 'production')
+# Days of DORA events kept (upper bound of the rolling windows)
+DORA_RETENTION_DAYS=int(os.getenv('DORA_RETENTION_DAYS', 90))
+
+# Collect the test reports of finished pipelines for the flaky and slowest tests
+TEST_HISTORY_ENABLED=True if int(os.getenv('TEST_HISTORY_ENABLED', 1)) == 1 else False
+# Test case results kept (25 bytes each), the oldest are dropped first
+TEST_HISTORY_MAX_RESULTS=int(os.getenv('TEST_HISTORY_MAX_RESULTS', 2000000))
+# Days of test case results kept
+TEST_HISTORY_RETENTION_DAYS=int(os.getenv('TEST_HISTORY_RETENTION_DAYS', 90))
+# Runs a test case needs before it is ranked as flaky
+TEST_HISTORY_MIN_RUNS=int(os.getenv('TEST_HISTORY_MIN_RUNS', 5))
+# Seconds between test report syncs, one worker syncs in the background and shares the history
+TEST_HISTORY_SYNC_INTERVAL=int(os.getenv('TEST_HISTORY_SYNC_INTERVAL', 300))
+
+# Buckets across the visible range of time-series figures, zooming in switches to finer buckets down to single pipelines
+FIGURE_BUCKETS=int(os.getenv('FIGURE_BUCKETS', 30))
+# Points per trace of time-series figures, longer series are downsampled
+FIGURE_POINT_BUDGET=int(os.getenv('FIGURE_POINT_BUDGET', 1000))
+# Downsampling of time-series figures: lttb (keeps the shape) or minmax (keeps every extreme)
+FIGURE_DOWNSAMPLING=os.getenv('FIGURE_DOWNSAMPLING', 'lttb')
+# Traces with more points are drawn with WebGL
+FIGURE_WEBGL_THRESHOLD=int(os.getenv('FIGURE_WEBGL_THRESHOLD', 500))
+
+# Seconds between syncs of the sprint burndown, one worker syncs in the background and shares it
+BURNDOWN_SYNC_INTERVAL=int(os.getenv('BURNDOWN_SYNC_INTERVAL', 300))
+
+# Crawl the merge requests of all projects for the merge request analytics
+MERGE_REQUESTS_ENABLED=True if int(os.getenv('MERGE_REQUESTS_ENABLED', 1)) == 1 else False
+# Days of merge requests kept, the first crawl starts this many days back
+MERGE_REQUEST_DAYS=int(os.getenv('MERGE_REQUEST_DAYS', 90))
+# Seconds between merge request syncs, one worker syncs in the background and shares the store
+MERGE_REQUEST_SYNC_INTERVAL=int(os.getenv('MERGE_REQUEST_SYNC_INTERVAL', 600))
+
+# Successful pipelines of a project and ref before regressions are reported
+REGRESSION_MIN_PIPELINES=int(os.getenv('REGRESSION_MIN_PIPELINES', 10))
+# Minimum change of pipeline duration and queue time reported as regression (percent)
+REGRESSION_THRESHOLD=float(os.getenv('REGRESSION_THRESHOLD', 20))
+
+# Publish the monitor and overview as static snapshots for read-only viewers (wallboards)
+PUBLISHER_ENABLED=True if int(os.getenv('PUBLISHER_ENABLED', 0)) == 1 else False
+# Seconds between snapshots, views rendered from the collected datasets are only rendered again after a refresh
+PUBLISHER_INTERVAL=int(os.getenv('PUBLISHER_INTERVAL', 120))
+# Seconds browsers and proxies may serve a snapshot without validating it
+PUBLISHER_MAX_AGE=int(os.getenv('PUBLISHER_MAX_AGE', 60))
+# Route prefix of the snapshots
+PUBLISHER_PATH=os.getenv('PUBLISHER_PATH', '/published')
+# Days of dataset records kept per project (pipelines, commits, deployments, milestone issues) when collected, 0 is unlimited
+RETENTION_MAX_AGE_DAYS=int(os.getenv('RETENTION_MAX_AGE_DAYS', 0))
+# Dataset records kept per project and dataset, the newest are kept
+RETENTION_MAX_RECORDS=int(os.getenv('RETENTION_MAX_RECORDS', 5000))
+# Bytes (serialized) of the records kept per project and dataset
+RETENTION_MAX_BYTES=int(os.getenv('RETENTION_MAX_BYTES', 4194304))
+# Retention per resource, project and resource of a project as JSON, resources are the datasets, test-history and merge-requests
+# e.g. {"pipelines": {"max_age_days": 14}, "projects": {"42": {"max_bytes": 1048576, "test-history": {"max_records": 100000}}}}
+RETENTION_POLICIES=json.loads(os.getenv('RETENTION_POLICIES', '{}'))
+# Route of the memory report (footprint per project and resource, JSON)
+MEMORY_REPORT_PATH=os.getenv('MEMORY_REPORT_PATH', '/memory')
\ No newline at end of file
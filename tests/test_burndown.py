@@ -0,0 +1,114 @@
+# Standard library imports
+from datetime import date
+
+# Third party imports
+import pytest
+
+# Local application imports
+from modules.burndown import Burndown
+
+MILESTONE = {'id': 10, 'title': 'Sprint 1', 'start_date': '2026-01-05', 'due_date': '2026-01-09'}
+SPRINT = {'id': 10}
+OTHER = {'id': 11}
+
+def issue(iid, created_at, weight=None, milestone=SPRINT, state='opened', closed_at=None, updated_at='2026-01-08T12:00:00Z'):
+  return {'project_id': 1, 'iid': iid, 'created_at': created_at, 'updated_at': updated_at, 'weight': weight,
+    'milestone': milestone, 'state': state, 'closed_at': closed_at}
+
+def events(state=(), weight=(), milestone=()):
+  return {'state': list(state), 'weight': list(weight), 'milestone': list(milestone)}
+
+def state_event(id, created_at, state):
+  return {'id': id, 'created_at': created_at, 'state': state}
+
+def weight_event(id, created_at, weight):
+  return {'id': id, 'created_at': created_at, 'weight': weight}
+
+def milestone_event(id, created_at, action, milestone=SPRINT):
+  return {'id': id, 'created_at': created_at, 'action': action, 'milestone': milestone}
+
+@pytest.fixture
+def sprint():
+  retval = Burndown(MILESTONE)
+  # Planned before the sprint with weight 3, closed on its third day
+  assert retval.add(issue(1, '2026-01-01T09:00:00Z', weight=3, state='closed'),
+    events(state=[state_event(1, '2026-01-07T10:00:00Z', 'closed')])) == 1
+  # Created on the second day, estimated and added to the sprint on the third
+  assert retval.add(issue(2, '2026-01-06T09:00:00Z', weight=2),
+    events(weight=[weight_event(5, '2026-01-06T10:00:00Z', 2)], milestone=[milestone_event(7, '2026-01-07T11:00:00Z', 'add')])) == 2
+  return retval
+
+def test_series(sprint):
+  series = sprint.series(today=date(2026, 1, 9))
+  assert series['dates'] == [date(2026, 1, day) for day in range(5, 10)]
+  assert series['scope_weight'] == [3, 3, 5, 5, 5]
+  assert series['done_weight'] == [0, 0, 3, 3, 3]
+  assert series['remaining_weight'] == [3, 3, 2, 2, 2]
+  assert series['ideal_weight'] == pytest.approx([3, 2.25, 1.5, 0.75, 0])
+  assert series['scope_issues'] == [1, 1, 2, 2, 2]
+  assert series['done_issues'] == [0, 0, 1, 1, 1]
+
+def test_series_until_today(sprint):
+  series = sprint.series(today=date(2026, 1, 7))
+  assert series['scope_weight'] == [3, 3, 5, None, None]
+  assert series['remaining_issues'] == [1, 1, 1, None, None]
+
+def test_closed_without_state_events():
+  sprint = Burndown(MILESTONE)
+  sprint.add(issue(3, '2026-01-05T09:00:00Z', weight=1, state='closed', closed_at='2026-01-08T09:00:00Z'), events())
+  assert sprint.series(today=date(2026, 1, 9))['done_weight'] == [0, 0, 0, 1, 1]
+
+def test_left_sprint(sprint):
+  # Moved to the next sprint on the fourth day
+  sprint.add(issue(2, '2026-01-06T09:00:00Z', weight=2, milestone=OTHER, updated_at='2026-01-08T13:00:00Z'), events(
+    weight=[weight_event(5, '2026-01-06T10:00:00Z', 2)],
+    milestone=[milestone_event(7, '2026-01-07T11:00:00Z', 'add'), milestone_event(8, '2026-01-08T09:00:00Z', 'add', OTHER)]))
+  assert sprint.series(today=date(2026, 1, 9))['scope_weight'] == [3, 3, 5, 3, 3]
+  assert sprint.stats() == {'issues': 1, 'tracked': 2}
+
+def test_events_are_folded_once(sprint):
+  before = sprint.series(today=date(2026, 1, 9))
+  assert sprint.add(issue(1, '2026-01-01T09:00:00Z', weight=3, state='closed'),
+    events(state=[state_event(1, '2026-01-07T10:00:00Z', 'closed')])) == 0
+  assert sprint.series(today=date(2026, 1, 9)) == before
+
+def test_pending(sprint):
+  listed = [
+    issue(1, '2026-01-01T09:00:00Z'),
+    issue(2, '2026-01-06T09:00:00Z', updated_at='2026-01-08T13:00:00Z'),
+    issue(3, '2026-01-06T09:00:00Z'),
+    issue(4, '2026-01-06T09:00:00Z', milestone=OTHER),
+  ]
+  # Unchanged and unrelated issues are skipped
+  assert [item['iid'] for item in sprint.pending(listed)] == [2, 3]
+
+def scope(issue, events):
+  sprint = Burndown(MILESTONE)
+  sprint.add(issue, events)
+  series = sprint.series(today=date(2026, 1, 9))
+  return series['scope_issues'], series['scope_weight']
+
+def test_initial_state():
+  # Removed from the sprint on its third day, it was part of it before
+  assert scope(issue(1, '2026-01-01T09:00:00Z', weight=5, milestone=None),
+    events(milestone=[milestone_event(1, '2026-01-07T09:00:00Z', 'remove')])) == ([1, 1, 0, 0, 0], [5, 5, 0, 0, 0])
+  # Added to the sprint on its third day
+  assert scope(issue(1, '2026-01-01T09:00:00Z', weight=5),
+    events(milestone=[milestone_event(1, '2026-01-07T09:00:00Z', 'add')])) == ([0, 0, 1, 1, 1], [0, 0, 5, 5, 5])
+  # Moved between other milestones, it never was part of the sprint
+  assert scope(issue(1, '2026-01-01T09:00:00Z', weight=5, milestone=OTHER),
+    events(milestone=[milestone_event(1, '2026-01-07T09:00:00Z', 'add', OTHER)])) == ([0, 0, 0, 0, 0], [0, 0, 0, 0, 0])
+  # The weight was set on the third day, it started without
+  assert scope(issue(1, '2026-01-01T09:00:00Z', weight=5),
+    events(weight=[weight_event(1, '2026-01-07T09:00:00Z', 5)])) == ([1, 1, 1, 1, 1], [0, 0, 5, 5, 5])
+
+def test_state(sprint):
+  loaded = Burndown(MILESTONE)
+  loaded.load(sprint.state())
+  assert loaded.series(today=date(2026, 1, 9)) == sprint.series(today=date(2026, 1, 9))
+  assert loaded.stats() == sprint.stats()
+
+  # States of another sprint are ignored
+  other = Burndown(dict(MILESTONE, id=11))
+  other.load(sprint.state())
+  assert other.stats() == {'issues': 0, 'tracked': 0}
@@ -0,0 +1,59 @@
+# Standard library imports
+import time
+
+# Local application imports
+from modules.cache import SizedCache
+
+def test_bytes_follow_changes():
+  cache = SizedCache(threshold=100, max_bytes=10000)
+  cache.set('a', 'x' * 100)
+  a = cache.stats()['bytes']
+  cache.set('b', 'y' * 200)
+  b = cache.stats()['bytes'] - a
+  assert b > a > 0
+  # Replacing an entry accounts the new value only
+  cache.set('a', 'x' * 10)
+  a = cache.stats()['bytes'] - b
+  assert 0 < a < b
+  assert not cache.add('b', 'z')
+  assert cache.stats()['bytes'] == a + b
+  assert cache.add('c', 'z')
+  c = cache.stats()['bytes'] - a - b
+  assert cache.delete('a')
+  assert not cache.delete('a')
+  assert cache.stats()['bytes'] == b + c
+  cache.clear()
+  assert cache.stats() == {'entries': 0, 'bytes': 0, 'max_bytes': 10000, 'evictions': 0}
+
+def test_evicts_least_recently_used():
+  cache = SizedCache(threshold=100, max_bytes=1000)
+  for index in range(4):
+    cache.set('k{}'.format(index), 'v' * 200)
+  size = cache.stats()['bytes'] // 4
+  assert 4 * size <= 1000 < 5 * size
+  cache.get('k0')
+  # The fifth entry exceeds the budget, the least recently used one goes
+  cache.set('k4', 'v' * 200)
+  assert [key for key in ['k0', 'k1', 'k2', 'k3', 'k4'] if cache.has(key)] == ['k0', 'k2', 'k3', 'k4']
+  assert cache.stats() == {'entries': 4, 'bytes': 4 * size, 'max_bytes': 1000, 'evictions': 1}
+
+def test_too_large():
+  cache = SizedCache(threshold=100, max_bytes=100)
+  assert not cache.set('huge', 'x' * 1000)
+  assert cache.get('huge') is None
+  assert cache.stats()['bytes'] == 0
+
+def test_expired_entries_go_first():
+  cache = SizedCache(threshold=100, max_bytes=1000)
+  cache.set('forever', 'x' * 200, timeout=0)
+  size = cache.stats()['bytes']
+  cache.set('short', 'y' * 200, timeout=1)
+  cache.set('other', 'z' * 200)
+  cache.get('short')
+  time.sleep(2)
+  cache.set('a', 'v' * 200)
+  cache.set('b', 'v' * 200)
+  # The expired entry is dropped instead of the least recently used one, entries without timeout never expire
+  assert [key for key in ['forever', 'short', 'other', 'a', 'b'] if cache.has(key)] == ['forever', 'other', 'a', 'b']
+  assert cache.stats()['entries'] == 4
+  assert cache.stats()['bytes'] == 4 * size
@@ -0,0 +1,100 @@
+# Standard library imports
+from datetime import datetime, timezone
+import time
+
+# Third party imports
+import pytest
+
+# Local application imports
+from modules.dora import DAY, DoraEngine
+
+NOW = int(time.time())
+
+def at(days):
+  return datetime.fromtimestamp(NOW - days * DAY, timezone.utc).isoformat()
+
+def commit(sha, days, project_id=1):
+  return {'id': sha, 'project_id': project_id, 'committed_date': at(days), 'created_at': at(days)}
+
+def deployment(id, days, sha, environment='production', project_id=1):
+  return {'id': id, 'project_id': project_id, 'created_at': at(days), 'sha': sha, 'environment': {'name': environment}}
+
+def pipeline(id, days, status, project_id=1):
+  return {'id': id, 'project_id': project_id, 'created_at': at(days), 'updated_at': at(days), 'status': status}
+
+@pytest.fixture
+def records():
+  return {
+    'commits': [commit('a', 10), commit('b', 9)],
+    'deployments': [
+      # Deploys both commits, then a deployment without new commits
+      deployment(1, 8, 'b'),
+      deployment(2, 5, 'c'),
+      deployment(3, 5, 'c', environment='staging'),
+    ],
+    'pipelines': [
+      pipeline(1, 7, 'failed'),
+      pipeline(2, 6, 'success'),
+      pipeline(3, 4, 'success'),
+      pipeline(4, 3, 'running'),
+    ],
+  }
+
+def test_metrics(records):
+  engine = DoraEngine(environment='production', retention_days=90)
+  assert engine.update(**records) == 7
+
+  metrics = engine.metrics('1', days=30, now=NOW)
+  assert metrics['deployments'] == 2
+  # The records cover 8 days (since the first deployment), not the whole window
+  assert metrics['deployment_frequency'] == pytest.approx(2 / 8)
+  # Lead times of 2 and 1 days
+  assert metrics['lead_time_hours'] == pytest.approx(36)
+  # The first deployment was followed by a failed pipeline, the second by a successful one
+  assert metrics['change_failure_rate'] == pytest.approx(50)
+  assert metrics['time_to_restore_hours'] == pytest.approx(24)
+
+def test_window(records):
+  engine = DoraEngine(environment='production', retention_days=90)
+  engine.update(**records)
+
+  metrics = engine.metrics('1', days=7, now=NOW)
+  assert metrics['deployments'] == 1
+  assert metrics['deployment_frequency'] == pytest.approx(1 / 7)
+  assert metrics['lead_time_hours'] is None
+  assert metrics['change_failure_rate'] == 0
+  assert metrics['time_to_restore_hours'] == pytest.approx(24)
+
+def test_records_are_processed_once(records):
+  engine = DoraEngine(environment='production', retention_days=90)
+  engine.update(**records)
+  assert engine.update(**records) == 0
+  # The running pipeline is picked up once it finished, it doesn't follow a deployment
+  assert engine.update(pipelines=[pipeline(4, 3, 'failed')]) == 1
+  assert engine.metrics('1', days=30, now=NOW)['change_failure_rate'] == pytest.approx(50)
+
+def test_retention():
+  engine = DoraEngine(environment='production', retention_days=7)
+  assert engine.update(deployments=[deployment(1, 8, 'a'), deployment(2, 2, 'b')]) == 1
+  assert engine.metrics(days=30, now=NOW)['deployments'] == 1
+
+def test_projects_by_instance():
+  engine = DoraEngine(environment='production', retention_days=90)
+  engine.update(deployments=[deployment(1, 2, 'a'), dict(deployment(1, 1, 'a'), instance='ee')])
+  assert sorted(engine.projects()) == ['1', 'ee:1']
+  assert engine.metrics('ee:1', days=30, now=NOW)['deployments'] == 1
+  assert engine.metrics(days=30, now=NOW)['deployments'] == 2
+  assert engine.metrics('2', days=30, now=NOW)['deployments'] == 0
+
+def test_state(records):
+  engine = DoraEngine(environment='production', retention_days=90)
+  engine.update(**records)
+  loaded = DoraEngine(environment='production', retention_days=90)
+  loaded.load(engine.state())
+  assert loaded.metrics('1', now=NOW) == engine.metrics('1', now=NOW)
+  assert loaded.update(**records) == 0
+
+  # States of another production environment are ignored
+  other = DoraEngine(environment='live', retention_days=90)
+  other.load(engine.state())
+  assert other.projects() == []
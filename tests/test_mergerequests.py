@@ -0,0 +1,95 @@
+# Standard library imports
+from datetime import datetime, timezone
+import time
+
+# Third party imports
+import pytest
+
+# Local application imports
+from modules.mergerequests import HOUR_EDGES, ROW_BYTES, SIZE_LABELS, MergeRequestStore
+import settings
+
+NOW = int(time.time())
+
+@pytest.fixture(autouse=True)
+def no_policies(monkeypatch):
+  monkeypatch.setattr(settings, 'RETENTION_POLICIES', {})
+
+def at(hours):
+  return datetime.fromtimestamp(NOW - hours * 3600, timezone.utc).isoformat() if hours is not None else None
+
+def merge_request(iid, state, created, updated, first_review=None, merged=None, rounds=0, changes=1):
+  return {'iid': iid, 'state': state, 'created_at': at(created), 'updated_at': at(updated), 'first_review_at': at(first_review),
+    'merged_at': at(merged), 'review_rounds': rounds, 'changes': changes}
+
+@pytest.fixture
+def store():
+  retval = MergeRequestStore(retention_days=30)
+  retval.add('1', [
+    # Reviewed after 1 hour and merged after 2 hours
+    merge_request(1, 'merged', 10, 8, first_review=9, merged=8, rounds=2, changes=3),
+    merge_request(2, 'opened', 5, 5),
+    # Merged after 1 hour without review
+    merge_request(3, 'merged', 4, 3, merged=3, changes=40),
+  ], at(3))
+  return retval
+
+def test_percentiles():
+  store = MergeRequestStore()
+  store.add('1', [merge_request(1, 'merged', 3000, 1, merged=1), merge_request(2, 'merged', 2900, 1, merged=1),
+    merge_request(3, 'opened', 5, 5)], None)
+  metrics = store.metrics('1')
+  # The last bucket is open, estimates don't go beyond its lower bound
+  assert HOUR_EDGES[-1] < 2899
+  assert metrics['merge_time_median'] == pytest.approx(HOUR_EDGES[-1])
+  assert metrics['merge_time_p90'] == pytest.approx(HOUR_EDGES[-1])
+  # Without reviews there is nothing to estimate
+  assert metrics['review_time_median'] is None
+  assert metrics['review_time_p90'] is None
+
+def test_metrics(store):
+  # 1 hour is in the bucket HOUR_EDGES[9]..HOUR_EDGES[10], 2 hours in HOUR_EDGES[12]..HOUR_EDGES[13]
+  assert HOUR_EDGES[9] < 1 <= HOUR_EDGES[10] and HOUR_EDGES[12] < 2 <= HOUR_EDGES[13]
+  metrics = store.metrics('1')
+  assert (metrics['merge_requests'], metrics['opened'], metrics['merged']) == (3, 1, 2)
+  assert metrics['review_time_median'] == pytest.approx((HOUR_EDGES[9] + HOUR_EDGES[10]) / 2)
+  assert metrics['merge_time_median'] == pytest.approx(HOUR_EDGES[10])
+  assert metrics['merge_time_p90'] == pytest.approx(HOUR_EDGES[12] + 0.8 * (HOUR_EDGES[13] - HOUR_EDGES[12]))
+  assert metrics['review_rounds'] == pytest.approx(1)
+  assert metrics['unreviewed_merges'] == 1
+  assert dict(store.size_distribution('1')) == dict(zip(SIZE_LABELS, [1, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0]))
+
+def test_update_replaces_contribution(store):
+  assert store.add('1', [merge_request(1, 'closed', 10, 2, first_review=9, rounds=2, changes=3)], at(2)) == 1
+  metrics = store.metrics('1')
+  assert (metrics['merge_requests'], metrics['opened'], metrics['merged']) == (3, 1, 1)
+  assert metrics['review_rounds'] == 0
+  assert metrics['merge_time_median'] == pytest.approx((HOUR_EDGES[9] + HOUR_EDGES[10]) / 2)
+  assert store.watermark('1') == at(2)
+
+def test_changed(store):
+  listed = [merge_request(1, 'merged', 10, 8), merge_request(2, 'opened', 5, 1), merge_request(4, 'opened', 1, 1)]
+  assert [merge_request['iid'] for merge_request in store.changed('1', listed)] == [2, 4]
+  assert len(store.changed('ee:1', listed)) == 3
+
+def test_projects(store):
+  store.add('ee:1', [merge_request(1, 'opened', 5, 5)], None)
+  assert sorted(store.projects()) == ['1', 'ee:1']
+  assert store.metrics('ee:1')['merge_requests'] == 1
+  assert store.metrics()['merge_requests'] == 4
+  assert store.watermark('ee:1') is None
+  assert store.footprint() == {'1': {'records': 3, 'bytes': 3 * ROW_BYTES}, 'ee:1': {'records': 1, 'bytes': ROW_BYTES}}
+
+def test_retention():
+  store = MergeRequestStore(retention_days=1)
+  store.add('1', [merge_request(1, 'merged', 50, 48, merged=48), merge_request(2, 'opened', 5, 5)], None)
+  metrics = store.metrics('1')
+  assert (metrics['merge_requests'], metrics['merged']) == (1, 0)
+  assert metrics['merge_time_median'] is None
+
+def test_state(store):
+  loaded = MergeRequestStore(retention_days=30)
+  loaded.load(store.state())
+  assert loaded.metrics('1') == store.metrics('1')
+  assert loaded.watermark('1') == at(3)
+  assert loaded.changed('1', [merge_request(2, 'opened', 5, 5)]) == []
@@ -0,0 +1,66 @@
+# Third party imports
+import pytest
+
+# Local application imports
+from modules import regressions
+
+def pipeline(id, duration=None, coverage=None, status='success', ref='main', **kwargs):
+  return dict({'id': id, 'project_id': 1, 'ref': ref, 'status': status, 'updated_at': '2026-01-01T00:{:02d}:00Z'.format(id),
+    'duration': duration, 'coverage': coverage}, **kwargs)
+
+def test_duration():
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=15)
+  assert detector.update([pipeline(2, duration=200), pipeline(1, duration=100)]) == 2
+  # Recent level 100 + 0.25 * 100, baseline 100 + 0.05 * 100
+  [regression] = detector.regressions('1')
+  assert regression['metric'] == 'duration'
+  assert regression['current'] == pytest.approx(125)
+  assert regression['baseline'] == pytest.approx(105)
+  assert regression['change'] == pytest.approx(20 / 105)
+  assert regressions.describe(regression) == 'duration +19%'
+
+  # A change below the threshold isn't reported
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=20)
+  detector.update([pipeline(1, duration=100), pipeline(2, duration=200)])
+  assert detector.regressions('1') == []
+
+def test_coverage():
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=20)
+  # Pipelines without coverage report 0, they don't count
+  detector.update([pipeline(1, coverage=80), pipeline(2, coverage=0), pipeline(3, coverage=70)])
+  [regression] = detector.regressions('1')
+  assert regression['metric'] == 'coverage'
+  assert regression['current'] == pytest.approx(77.5)
+  assert regression['baseline'] == pytest.approx(79.5)
+  assert regressions.describe(regression) == 'coverage -2.0 pts'
+
+def test_min_pipelines():
+  detector = regressions.RegressionDetector(min_pipelines=3, threshold=15)
+  detector.update([pipeline(1, duration=100), pipeline(2, duration=200)])
+  assert detector.regressions('1') == []
+
+def test_pipelines_are_ingested_once():
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=15)
+  pipelines = [pipeline(1, duration=100), pipeline(2, duration=200), pipeline(3, duration=1000, status='failed')]
+  assert detector.pending(pipelines) == 2
+  assert detector.update(pipelines) == 2
+  assert detector.update(pipelines) == 0
+  # Pipelines which finished before the latest one seen are skipped
+  assert detector.update([pipeline(0, duration=1000)]) == 0
+  assert detector.regressions('1')[0]['current'] == pytest.approx(125)
+
+def test_streams():
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=15)
+  detector.update([pipeline(1, duration=100), pipeline(2, duration=200), pipeline(3, duration=100, ref='stable'),
+    pipeline(4, duration=100, instance='ee'), pipeline(5, duration=200, instance='ee')])
+  assert len(detector.regressions('1', ref='main')) == 1
+  assert detector.regressions('1', ref='stable') == []
+  assert len(detector.regressions('ee:1')) == 1
+
+def test_state():
+  detector = regressions.RegressionDetector(min_pipelines=2, threshold=15)
+  detector.update([pipeline(1, duration=100), pipeline(2, duration=200)])
+  loaded = regressions.RegressionDetector(min_pipelines=2, threshold=15)
+  loaded.load(detector.state())
+  assert loaded.regressions('1') == detector.regressions('1')
+  assert loaded.update([pipeline(2, duration=200)]) == 0
@@ -0,0 +1,92 @@
+# Standard library imports
+from datetime import datetime, timezone
+import json
+import time
+
+# Third party imports
+import flask
+import pytest
+
+# Local application imports
+from modules.cache import SizedCache
+from modules import retention
+import settings
+
+NOW = int(time.time())
+POLICIES = {
+  'pipelines': {'max_records': 3},
+  'projects': {
+    '7': {'max_bytes': 200, 'merge-requests': {'max_records': 2}},
+    'ee:7': {'max_records': 1},
+  },
+}
+
+@pytest.fixture(autouse=True)
+def policies(monkeypatch):
+  monkeypatch.setattr(settings, 'RETENTION_MAX_AGE_DAYS', 0)
+  monkeypatch.setattr(settings, 'RETENTION_MAX_RECORDS', 1000)
+  monkeypatch.setattr(settings, 'RETENTION_MAX_BYTES', 4096)
+  monkeypatch.setattr(settings, 'RETENTION_POLICIES', POLICIES)
+  # Footprints of the datasets are shared through a fresh cache per test
+  retention.init_app(flask.Flask(__name__), SizedCache(threshold=100, max_bytes=100000))
+
+def record(id, days):
+  return {'id': id, 'updated_at': datetime.fromtimestamp(NOW - days * retention.DAY, timezone.utc).isoformat(), 'x': 'a' * 30}
+
+# Records 0 to 9 days old, newest first, all of the same size
+RECORDS = [record(id, id) for id in range(10)]
+RECORD_BYTES = len(json.dumps(RECORDS[0], separators=(',', ':')))
+
+def limits(max_age_days=0, max_records=0, max_bytes=0):
+  return {'max_age_days': max_age_days, 'max_records': max_records, 'max_bytes': max_bytes}
+
+def test_policy():
+  assert retention.policy('commits', '1') == limits(max_records=1000, max_bytes=4096)
+  assert retention.policy('pipelines', '1') == limits(max_records=3, max_bytes=4096)
+  assert retention.policy('pipelines', '7') == limits(max_records=3, max_bytes=200)
+  assert retention.policy('merge-requests', '7') == limits(max_records=2, max_bytes=200)
+  assert retention.policy('merge-requests', '1') == limits()
+  assert retention.policy('commits', 'ee:7') == limits(max_records=1, max_bytes=4096)
+
+def test_max_rows():
+  assert retention.max_rows(limits(), 25) == 0
+  assert retention.max_rows(limits(max_records=100, max_bytes=1000), 25) == 40
+  assert retention.max_rows(limits(max_records=10, max_bytes=1000), 25) == 10
+  assert retention.max_rows(limits(max_bytes=10), 25) == 1
+
+def test_enforce_records():
+  kept, footprint = retention.enforce('pipelines', '1', list(reversed(RECORDS)), now=NOW)
+  # The newest records are kept in their order
+  assert [item['id'] for item in kept] == [2, 1, 0]
+  assert footprint == {'records': 3, 'bytes': 3 * (RECORD_BYTES + 1) + 1, 'dropped': 7}
+
+def test_enforce_age(monkeypatch):
+  monkeypatch.setattr(settings, 'RETENTION_MAX_AGE_DAYS', 4.5)
+  kept, footprint = retention.enforce('deployments', '1', RECORDS + [{'id': 'undated'}], now=NOW)
+  # Records without a time are kept
+  assert [item['id'] for item in kept] == [0, 1, 2, 3, 4, 'undated']
+  assert footprint['dropped'] == 5
+
+def test_enforce_bytes(monkeypatch):
+  monkeypatch.setattr(settings, 'RETENTION_MAX_BYTES', 4 * (RECORD_BYTES + 1))
+  kept, footprint = retention.enforce('deployments', '1', RECORDS, now=NOW)
+  # The chunk is 10 * (RECORD_BYTES + 1) + 1 bytes, 3 records of the average size fit
+  assert [item['id'] for item in kept] == [0, 1, 2]
+  assert footprint == {'records': 3, 'bytes': 3 * (RECORD_BYTES + 1), 'dropped': 7}
+
+def test_enforce_chunks():
+  assert len(retention.enforce('commits', 'ee:7', RECORDS, now=NOW)[0]) == 1
+  # Milestones are a group chunk without project policies
+  assert len(retention.enforce('milestones', 'group', RECORDS, now=NOW)[0]) == 10
+  assert retention.enforce('commits', '1', [], now=NOW)[1] == {'records': 0, 'bytes': 0, 'dropped': 0}
+
+def test_report():
+  retention.enforce_many('pipelines', {'1': RECORDS, '7': RECORDS[:1]})
+  retention.register('merge-requests', lambda: {'7': {'records': 2, 'bytes': 62}})
+  report = retention.report()
+  assert report['projects'] == [
+    {'project': '1', 'records': 3, 'bytes': 3 * (RECORD_BYTES + 1) + 1},
+    {'project': '7', 'records': 3, 'bytes': RECORD_BYTES + 2 + 62},
+  ]
+  assert [(row['resource'], row['project']) for row in report['resources']] == [('merge-requests', '7'), ('pipelines', '1'), ('pipelines', '7')]
+  assert report['resources'][0]['policy'] == limits(max_records=2, max_bytes=200)
@@ -0,0 +1,84 @@
+# Standard library imports
+from datetime import datetime, timezone
+import time
+
+# Third party imports
+import pytest
+
+# Local application imports
+from modules import testhistory
+import settings
+
+NOW = int(time.time())
+# Outcomes of the test cases in pipelines 1 to 6
+OUTCOMES = {
+  'flaky': ['success', 'failed', 'success', 'failed', 'success', 'success'],
+  'fixed': ['failed', 'success', 'success', 'success', 'success', 'success'],
+  'stable': ['success'] * 6,
+  'ignored': ['skipped'] * 6,
+}
+DURATIONS = {'flaky': [1] * 6, 'fixed': [2] * 6, 'stable': [4] * 5 + [10], 'ignored': [0] * 6}
+
+@pytest.fixture(autouse=True)
+def no_policies(monkeypatch):
+  monkeypatch.setattr(settings, 'RETENTION_POLICIES', {})
+
+def pipeline(id, project_id=1, **kwargs):
+  created_at = datetime.fromtimestamp(NOW - (10 - id) * 3600, timezone.utc).isoformat()
+  return dict({'id': id, 'project_id': project_id, 'created_at': created_at, 'status': 'success', 'total_count': 4}, **kwargs)
+
+def report(run):
+  return {'test_suites': [{'name': 'unit', 'test_cases': [
+    {'classname': 'tests', 'name': name, 'status': OUTCOMES[name][run], 'execution_time': DURATIONS[name][run]} for name in OUTCOMES]}]}
+
+@pytest.fixture
+def history():
+  retval = testhistory.TestHistory(max_results=1000, retention_days=30)
+  for run in range(6):
+    assert retval.add(pipeline(run + 1), report(run)) == 4
+  return retval
+
+def test_flaky(history):
+  flaky = history.flaky(min_runs=5)
+  assert [(case['name'], case['runs'], case['failures'], case['flips']) for case in flaky] == [('tests.flaky', 6, 2, 4), ('tests.fixed', 6, 1, 1)]
+  assert flaky[0]['flip_rate'] == pytest.approx(80)
+  assert flaky[0]['last_failed_pipeline'] == 4
+  assert flaky[1]['flip_rate'] == pytest.approx(20)
+  assert history.flaky(min_runs=7) == []
+
+def test_slowest(history):
+  slowest = history.slowest()
+  # Skipped test cases didn't run
+  assert [case['name'] for case in slowest] == ['tests.stable', 'tests.fixed', 'tests.flaky']
+  assert slowest[0]['mean_duration'] == pytest.approx(5)
+  assert slowest[0]['max_duration'] == pytest.approx(10)
+  assert slowest[0]['total_duration'] == pytest.approx(30)
+
+def test_missing(history):
+  pipelines = [pipeline(1), pipeline(7), pipeline(8, status='running'), pipeline(9, total_count=0), pipeline(1, project_id=2)]
+  assert [(item['project_id'], item['id']) for item in history.missing(pipelines)] == [(1, 7), (2, 1)]
+  # Reports are only ingested once
+  assert history.add(pipeline(1), report(0)) == 0
+
+def test_max_results():
+  history = testhistory.TestHistory(max_results=10, retention_days=30)
+  for run in range(3):
+    history.add(pipeline(run + 1), report(run))
+  # The third report drops the 3 oldest results, 2 to make room and a tenth of the budget
+  assert history.stats()['results'] == 9
+  assert history.stats()['pipelines'] == 3
+
+def test_projects_by_instance(history):
+  history.add(pipeline(1, instance='ee'), report(0))
+  assert history.footprint() == {'1': {'records': 24, 'bytes': 24 * testhistory.ROW_BYTES}, 'ee:1': {'records': 4, 'bytes': 4 * testhistory.ROW_BYTES}}
+  assert [case['runs'] for case in history.slowest('ee:1')] == [1, 1, 1]
+  assert history.slowest('2') == []
+
+def test_state(history):
+  loaded = testhistory.TestHistory(max_results=1000, retention_days=30)
+  loaded.load(history.state())
+  assert loaded.flaky(min_runs=5) == history.flaky(min_runs=5)
+  # Loaded columns are as long as the results, the bytes of the capacity differ
+  assert loaded.stats()['results'] == history.stats()['results'] == 24
+  assert loaded.stats()['test_cases'] == history.stats()['test_cases'] == 4
+  assert loaded.missing([pipeline(1)]) == []
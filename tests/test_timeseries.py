@@ -0,0 +1,74 @@
+# Third party imports
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local application imports
+from modules import timeseries
+import settings
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+  monkeypatch.setattr(settings, 'FIGURE_BUCKETS', 30)
+  monkeypatch.setattr(settings, 'FIGURE_POINT_BUDGET', 1000)
+
+def test_lttb_keeps_peaks():
+  x = np.arange(7, dtype=float)
+  y = np.array([0, 1, 5, 0, 0, -4, 0], dtype=float)
+  # Buckets [1, 2] and [3, 4, 5] between the first and last point
+  assert timeseries.lttb(x, y, 4).tolist() == [0, 2, 5, 6]
+
+def test_lttb_short_series():
+  x = np.arange(5, dtype=float)
+  assert timeseries.lttb(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+  assert timeseries.lttb(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+
+def test_minmax():
+  x = np.arange(10, dtype=float)
+  y = np.array([3, 1, 4, 1, 5, 9, 2, 6, 5, 3], dtype=float)
+  # Buckets [0, 5) and [5, 10) keep their first minimum and maximum
+  assert timeseries.minmax(x, y, 6).tolist() == [0, 1, 4, 5, 6, 9]
+  assert timeseries.minmax(x, y, 3).tolist() == list(range(10))
+
+def test_downsample():
+  x = np.arange(10, dtype=float)
+  y = np.array([3, 1, 4, 1, 5, 9, 2, 6, 5, 3], dtype=float)
+  assert timeseries.downsample(x, y, budget=20).tolist() == list(range(10))
+  assert timeseries.downsample(x, y, budget=6, method='minmax').tolist() == [0, 1, 4, 5, 6, 9]
+  assert len(timeseries.downsample(x, y, budget=6, method='lttb')) == 6
+
+def test_resolution():
+  start = pd.Timestamp('2026-01-01', tz='UTC')
+  assert timeseries.resolution(start, start + pd.Timedelta(hours=10)) is None
+  assert timeseries.resolution(start, start + pd.Timedelta(hours=10), raw=False) == '1H'
+  assert timeseries.resolution(start, start + pd.Timedelta(days=5)) == '6H'
+  assert timeseries.resolution(start, start + pd.Timedelta(days=20)) == '1D'
+  assert timeseries.resolution(start, start + pd.Timedelta(days=1000)) == '7D'
+
+def test_series_counts():
+  times = pd.to_datetime(['2026-01-01 00:00', '2026-01-01 00:30', '2026-01-01 01:10', '2026-01-01 05:00'], utc=True)
+  x, y = timeseries.series(times)
+  assert list(x) == list(pd.to_datetime(['2026-01-01 00:00', '2026-01-01 01:00', '2026-01-01 05:00']))
+  assert y.tolist() == [2, 1, 1]
+
+def test_series_raw():
+  times = pd.to_datetime(['2026-01-01 02:00', '2026-01-01 00:00', '2026-01-01 01:00'], utc=True)
+  x, y = timeseries.series(times, [3, 1, None])
+  # Short ranges are drawn per record, sorted and without gaps
+  assert list(x) == list(pd.to_datetime(['2026-01-01 00:00', '2026-01-01 02:00']))
+  assert y.tolist() == [1, 3]
+
+def test_series_visible_range():
+  times = pd.date_range('2026-01-01', periods=100, freq='D', tz='UTC')
+  x, y = timeseries.series(times, np.arange(100), start=times[50], end=times[59])
+  # Daily buckets and one bucket beyond either end
+  assert y.tolist() == list(range(49, 61))
+  assert x[0] == pd.Timestamp('2026-02-19')
+
+def test_visible_range():
+  start, end = timeseries.visible_range({'xaxis.range[0]': '2026-01-01 00:00', 'xaxis.range[1]': '2026-01-02'})
+  assert (start, end) == (pd.Timestamp('2026-01-01', tz='UTC'), pd.Timestamp('2026-01-02', tz='UTC'))
+  assert timeseries.visible_range({'xaxis.autorange': True}) is None
+  assert timeseries.visible_range({'xaxis.range': ['garbage', 'range']}) is None
+  assert timeseries.changes_range({'xaxis.autorange': True})
+  assert not timeseries.changes_range({'yaxis.range[0]': 0})